@@ -5,10 +5,18 @@ PC-BASIC - GW-BASIC/BASICA/Cartridge BASIC compatible interpreter
 This file is released under the GNU GPL version 3 or later.
 """
 
-# compatibility pre-init: ensures package __path__ is absolute
-from . import compat
+# start timing before anything else is imported
+from .timing import startup_timer
 
-from .basic import __version__
-from .basic import NAME, VERSION, AUTHOR, COPYRIGHT
-from .basic import Session, SessionAsync, codepage, font
-from .main import main, script_entry_point_guard
+with startup_timer.phase(u'import compat'):
+    # compatibility pre-init: ensures package __path__ is absolute
+    from . import compat
+
+with startup_timer.phase(u'import interpreter'):
+    from .basic import __version__
+    from .basic import NAME, VERSION, AUTHOR, COPYRIGHT
+    from .basic import Session, SessionAsync, SessionTemplate, codepage, font
+    from .basic import SessionHost, SessionServer
+
+with startup_timer.phase(u'import front end'):
+    from .main import main, script_entry_point_guard
@@ -6,7 +6,9 @@ This file is released under the GNU GPL version 3 or later.
 """
 
 from .data import NAME, VERSION, LONG_VERSION, AUTHOR, COPYRIGHT
-from .api import Session, SessionAsync, codepage, font
+from .api import Session, SessionAsync, SessionTemplate, codepage, font
+from .host import SessionHost
+from .server import SessionServer
 from .base.error import *
 from .base import signals, scancode, eascii
 
@@ -28,6 +28,7 @@ class Session(object):
         """Set up session object."""
         self._kwargs = kwargs
         self._impl = None
+        self._checkpointer = None
 
     def __enter__(self):
         """Context guard."""
@@ -43,11 +44,19 @@ class Session(object):
     def __getstate__(self):
         """Pickle the session."""
         pickle_dict = self.__dict__.copy()
+        pickle_dict['_checkpointer'] = None
         return pickle_dict
 
     def __setstate__(self, pickle_dict):
         """Unpickle and resume the session."""
         self.__dict__.update(pickle_dict)
+        self._checkpointer = None
+
+    def _get_immutables(self):
+        """Get objects that are not changed after initialisation, including the settings they came from."""
+        return self._impl.get_immutables() + [
+            self._kwargs[_key] for _key in ('codepage', 'font') if self._kwargs.get(_key)
+        ]
 
     def start(self):
         """Start the session."""
@@ -164,9 +173,29 @@ class Session(object):
         with self._impl.io_streams.activate():
             self._impl.interact()
 
-    def suspend(self, session_filename):
+    def suspend(self, session_filename, compress=True):
         """Save session object to file."""
-        state.save_session(self, session_filename)
+        if self._checkpointer:
+            # don't append further checkpoints to a file we may overwrite
+            self._checkpointer.reset()
+        state.save_session(self, session_filename, compress)
+
+    def checkpoint(self, session_filename, interval=0):
+        """
+        Save changes since the last checkpoint to file; the file is written in the background.
+        If interval is nonzero, save further checkpoints every interval seconds while running.
+        """
+        self.start()
+        if self._checkpointer and self._checkpointer.state_file != session_filename:
+            self._checkpointer.wait()
+            self._checkpointer = None
+        if not self._checkpointer:
+            self._checkpointer = state.Checkpointer(
+                self, session_filename, get_shared=self._get_immutables
+            )
+        self._checkpointer.interval = interval
+        self._impl.interpreter.checkpoint = self._checkpointer.poll if interval else None
+        self._checkpointer.checkpoint()
 
     @classmethod
     def resume(self, session_filename):
@@ -175,6 +204,8 @@ class Session(object):
 
     def close(self):
         """Close the session."""
+        if self._checkpointer:
+            self._checkpointer.wait()
         if self._impl:
             self._impl.close()
 
@@ -189,6 +220,15 @@ class Session(object):
         self.start()
         self._impl.interpreter.step = step_function
 
+    def set_limits(self, statements=None, wall_time=None, cpu_time=None, memory=None, error_num=None):
+        """
+        Limit the number of statements, the wall and processor time in seconds and the bytes of
+        memory used by each command run; None means no limit.
+        Exceeding a limit causes a break that can be continued, or BASIC error error_num if given.
+        """
+        self.start()
+        self._impl.interpreter.quotas.set_limits(statements, wall_time, cpu_time, memory, error_num)
+
 
 class SessionAsync(Session):
     def start(self):
@@ -250,6 +290,14 @@ class SessionAsync(Session):
         await self.start_async()
         return super().set_hook(step_function)
 
+    async def checkpoint(self, *args, **kwargs):
+        await self.start_async()
+        return super().checkpoint(*args, **kwargs)
+
+    async def set_limits(self, *args, **kwargs):
+        await self.start_async()
+        return super().set_limits(*args, **kwargs)
+
     async def execute(self, command, as_type=None):
         await self.start_async()
         if as_type is None:
@@ -276,6 +324,22 @@ class SessionAsync(Session):
             await self._impl.interact()
 
 
+class SessionTemplate(object):
+    """Pre-initialised session from which new sessions can be created cheaply."""
+
+    def __init__(self, session):
+        """Capture the current state of a session."""
+        session.start()
+        if not session._impl:
+            raise ValueError('Session must be started before it can be used as a template')
+        # new sessions share fonts, codepage and keyword tables with the template
+        self._template = state.Template(session, session._get_immutables())
+
+    def new_session(self):
+        """Create a new session in the state of the template session."""
+        return self._template.copy()
+
+
 class SessionInfo(object):
     """Retrieve information about current session."""
 
@@ -304,6 +368,14 @@ class SessionInfo(object):
         """Get a marked-up hex dump of the program."""
         return repr(self._impl.program)
 
+    def get_limits(self):
+        """Get the limits on each command run."""
+        return self._impl.interpreter.quotas.limits
+
+    def get_usage(self):
+        """Get the statements, wall and processor time and memory used by the latest command run."""
+        return self._impl.interpreter.quotas.get_usage()
+
     def get_current_code(self, as_type=bytes):
         """Obtain statement being executed."""
         if self._impl.interpreter.run_mode:
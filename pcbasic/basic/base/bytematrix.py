@@ -10,6 +10,7 @@ import operator
 from binascii import hexlify, unhexlify
 
 from ...compat import zip, int2byte, xrange, iterbytes, iterchar
+from .outofband import OutOfBand
 
 
 class ByteMatrix(object):
@@ -47,6 +48,22 @@ class ByteMatrix(object):
             self, "',\n    '".join(hexreps)
         )
 
+    def __reduce__(self):
+        """Pickle as a single contiguous buffer, out-of-band if the protocol supports it."""
+        return self.from_buffer, (
+            self._height, self._width, OutOfBand(bytearray().join(self._rows))
+        )
+
+    @classmethod
+    def from_buffer(cls, height, width, buffer):
+        """Create a byte matrix from a contiguous row-major buffer."""
+        if not height or not width:
+            return cls(height, width)
+        return cls._create_from_rows([
+            bytearray(buffer[_offset:_offset+width])
+            for _offset in xrange(0, height*width, width)
+        ])
+
     def __getitem__(self, index):
         """Extract items by [y, x] indexing or slicing or 1D index."""
         y, x = index
@@ -0,0 +1,28 @@
+"""
+PC-BASIC - outofband.py
+Byte buffers that are pickled out-of-band
+
+(c) 2013--2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+try:
+    from pickle import PickleBuffer
+except ImportError: # pragma: no cover
+    PickleBuffer = None
+
+
+class OutOfBand(object):
+    """Wrapper to pickle a bytes-like object out-of-band; unpickles as bytearray."""
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        """Wrap a bytes-like object."""
+        self._data = data
+
+    def __reduce_ex__(self, protocol):
+        """Pickle out-of-band if the protocol supports it."""
+        if PickleBuffer and protocol >= 5:
+            return bytearray, (PickleBuffer(self._data),)
+        return bytearray, (bytes(self._data),)
@@ -6,25 +6,63 @@ Time and date utilities
 This file is released under the GNU GPL version 3 or later.
 """
 
+import time
 import datetime
 
 from .base import error
 from . import values
 
 
+# resolution of TIMER in seconds
+TIMER_TICK = 0.05
+
+
+class TimeSource(object):
+    """Time as seen by the session; real time, or virtual time that skips over waits."""
+
+    def __init__(self, virtual=False):
+        """Initialise time source."""
+        self.virtual = virtual
+        # seconds skipped in virtual time
+        self._skipped = 0.
+
+    def monotonic(self):
+        """Seconds on a monotonic clock."""
+        return time.monotonic() + self._skipped
+
+    def now(self):
+        """Current date and time."""
+        return datetime.datetime.now() + datetime.timedelta(seconds=self._skipped)
+
+    def skip(self, seconds):
+        """Account for a wait; return the time to wait in real time."""
+        if not self.virtual:
+            return seconds
+        self._skipped += seconds
+        return 0
+
+
 class Clock(object):
 
-    def __init__(self, values):
+    def __init__(self, values, time_source):
         """Initialise clock."""
         # datetime offset for duration of the run
         # (so that we don't need permission to touch the system clock)
         # given in seconds
         self._values = values
+        self._time = time_source
         self.time_offset = datetime.timedelta()
 
+    def __setstate__(self, pickle_dict):
+        """Unpickle."""
+        self.__dict__.update(pickle_dict)
+        if '_time' not in pickle_dict:
+            # stored by an older version, which always ran in real time
+            self._time = TimeSource()
+
     def get_time_ms(self):
         """Get milliseconds since midnight."""
-        now = datetime.datetime.now() + self.time_offset
+        now = self._time.now() + self.time_offset
         midnight = datetime.datetime(now.year, now.month, now.day)
         diff = now-midnight
         seconds = diff.seconds
@@ -35,6 +73,9 @@ class Clock(object):
         """TIMER: get clock ticks since midnight."""
         list(args)
         # precision of GWBASIC TIMER is about 1/20 of a second
+        # in virtual time, reading the clock counts as waiting for it to tick
+        # so that delay loops don't run in real time
+        self._time.skip(TIMER_TICK)
         timer = float(self.get_time_ms()//50) / 20.
         return self._values.new_single().from_value(timer)
 
@@ -43,7 +84,7 @@ class Clock(object):
         timestr = values.next_string(args)
         list(args)
         # allowed formats:  hh   hh:mm   hh:mm:ss  where hh 0-23, mm 0-59, ss 0-59
-        now = datetime.datetime.now() + self.time_offset
+        now = self._time.now() + self.time_offset
         strlist = timestr.replace(b'.', b':').split(b':')
         if len(strlist) == 1:
             strlist = strlist[0].split(b'.')
@@ -66,7 +107,7 @@ class Clock(object):
         # allowed formats:
         # mm/dd/yy  or mm-dd-yy  mm 0--12 dd 0--31 yy 80--00--77
         # mm/dd/yyyy  or mm-dd-yyyy  yyyy 1980--2099
-        now = datetime.datetime.now() + self.time_offset
+        now = self._time.now() + self.time_offset
         strlist = datestr.replace(b'/', b'-').split(b'-')
         if len(strlist) != 3:
             raise error.BASICError(error.IFC)
@@ -97,11 +138,12 @@ class Clock(object):
     def time_fn_(self, args):
         """Get (offset) system time."""
         list(args)
-        time = (datetime.datetime.now() + self.time_offset).strftime('%H:%M:%S')
-        return self._values.new_string().from_str(time.encode('ascii'))
+        self._time.skip(TIMER_TICK)
+        timestr = (self._time.now() + self.time_offset).strftime('%H:%M:%S')
+        return self._values.new_string().from_str(timestr.encode('ascii'))
 
     def date_fn_(self, args):
         """Get (offset) system date."""
         list(args)
-        date = (datetime.datetime.now() + self.time_offset).strftime('%m-%d-%Y')
+        date = (self._time.now() + self.time_offset).strftime('%m-%d-%Y')
         return self._values.new_string().from_str(date.encode('ascii'))
@@ -8,11 +8,22 @@ This file is released under the GNU GPL version 3 or later.
 
 import os
 import io
+import re
 import math
+import mmap
 import struct
 import logging
+import bisect
+from array import array
 from chunk import Chunk
 
+if False:
+    # packagers take note, numpy is used if available
+    import numpy
+
+# numpy is only imported when a tape image is first decoded; False if not available
+numpy = None
+
 from ...compat import int2byte, iterchar, zip
 
 from ..base import error
@@ -28,6 +39,24 @@ TOKEN_TO_TYPE = {
 
 TYPE_TO_TOKEN = dict(reversed(item) for item in TOKEN_TO_TYPE.items())
 
+# runs of equal signal level in a decoded WAV image
+_LEVEL_RUNS = re.compile(b'(.)\\1*', re.DOTALL)
+# half-pulse type for lengths out of range; others are 0 for short and 1 for long
+_BAD_HALF = 2
+# half-pulse types of the bits in a byte to binary digits
+_BIT_DIGITS = bytes.maketrans(b'\0\1', b'01')
+
+
+def _import_numpy():
+    """Import numpy if available; return whether it is."""
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+    return bool(numpy)
+
 
 #################################################################################
 # Exceptions
@@ -333,13 +362,8 @@ class CassetteStream(object):
         """Write a 256-byte block to tape."""
         # fill out short blocks with last byte
         data += data[-1:]*(256-len(data))
-        for b in iterchar(data):
-            self.bitstream.write_byte(ord(b))
-        crc_word = crc(data)
         # crc is written big-endian
-        lo, hi = (ord(_b) for _b in iterchar(struct.pack('<H', crc_word)))
-        self.bitstream.write_byte(hi)
-        self.bitstream.write_byte(lo)
+        self.bitstream.write_bytes(data + struct.pack('>H', crc(data)))
 
     def _fill_record_buffer(self):
         """Read to fill the tape buffer."""
@@ -444,8 +468,7 @@ class TapeBitStream(object):
         """Write some noise to give the reader something to get started."""
         # We just need some bits here
         # however on a new CAS file this works like a magic-sequence...
-        for b in bytearray(self.intro):
-            self.write_byte(b)
+        self.write_bytes(self.intro)
         # Write seven bits, so that we are byte-aligned after the sync bit
         # (after the 256-byte pilot). Makes CAS-files easier to read in hex.
         for _ in range(7):
@@ -475,8 +498,7 @@ class TapeBitStream(object):
 
     def write_leader(self):
         """Write the leader / pilot tone."""
-        for _ in range(256):
-            self.write_byte(0xff)
+        self.write_bytes(b'\xff' * 256)
         self.write_bit(0)
         self.write_byte(0x16)
 
@@ -497,6 +519,11 @@ class TapeBitStream(object):
         for bit in bits:
             self.write_bit(bit)
 
+    def write_bytes(self, data):
+        """Write a sequence of bytes to tape image."""
+        for byte in bytearray(data):
+            self.write_byte(byte)
+
     def close(self):
         """Eject tape."""
         pass
@@ -616,6 +643,28 @@ class CASBitStream(TapeBitStream):
             self.mask = 0x80
         self.current_byte = int2byte(ord(self.current_byte) | (bit*self.mask))
 
+    def write_bytes(self, data):
+        """Write a sequence of bytes to tape."""
+        if not data:
+            return
+        nbits = 8 * len(data)
+        bits = int.from_bytes(data, 'big')
+        # number of bits that fit in the current byte, after the last one written
+        free = self.mask.bit_length() - 1
+        if nbits <= free:
+            self.current_byte = int2byte(ord(self.current_byte) | (bits << (free - nbits)))
+            self.mask >>= nbits
+            return
+        # fill up and write the current byte, then all complete bytes but the last one
+        nbits -= free
+        head = ord(self.current_byte) | (bits >> nbits)
+        # the last byte, complete or not, stays in the current byte like in write_bit
+        last = nbits % 8 or 8
+        whole = (bits & ((1 << nbits) - 1)) >> last
+        self.cas.write(int2byte(head) + whole.to_bytes((nbits - last) // 8, 'big'))
+        self.current_byte = int2byte((bits & ((1 << last) - 1)) << (8 - last))
+        self.mask = 1 << (8 - last)
+
     def flush(self):
         """Write remaining bits to tape."""
         if self.operating_mode == 'w':
@@ -749,7 +798,6 @@ class WAVBitStream(TapeBitStream):
                 raise EndOfTape()
             self.operating_mode = 'r'
         self.wav_pos = 0
-        self.buf_len = 1024
         # convert 8-bit and 16-bit values to ints
         if self.sampwidth == 1:
             self.sub_threshold = 0
@@ -767,10 +815,15 @@ class WAVBitStream(TapeBitStream):
         self.length_cut = 2*self.halflength_cut
         # 2048 halves = 1024 pulses = 512 1-bits = 64 bytes of leader
         self.min_leader_halves = 2048
-        # initialise generators
-        self.filter = passthrough()
-        self.filter.send(None)
-        self.read_half = self._gen_read_halfpulse()
+        # waveforms for each bit and byte value, built when first written
+        self._bit_waves = None
+        self._byte_waves = None
+        # end positions of the half-pulses on the tape, decoded when first read
+        self._half_ends = None
+        # half-pulse types: short, long or out of range
+        self._half_types = b''
+        # index of the next half-pulse to read
+        self._half_index = 0
         # write fluff at start if this is a new file
         if self.operating_mode == 'w':
             self.write_intro()
@@ -793,6 +846,9 @@ class WAVBitStream(TapeBitStream):
 
     def switch_mode(self, mode):
         """Switch tape to reading or writing mode."""
+        if mode == 'w' and self.operating_mode == 'r':
+            # continue writing where we stopped reading
+            self.wav.seek(self.start + self.wav_pos * self.nchannels * self.sampwidth)
         self.operating_mode = mode
 
     def counter(self):
@@ -802,22 +858,31 @@ class WAVBitStream(TapeBitStream):
     def wind(self, loc):
         """Set position of tape in seconds."""
         self.wav_pos = int(loc * self.framerate)
-        self.wav.seek(self.wav_pos)
+        self.wav.seek(self.start + self.wav_pos * self.nchannels * self.sampwidth)
+        if self._half_ends is not None:
+            self._half_index = bisect.bisect_right(self._half_ends, self.wav_pos)
 
     def read_bit(self):
         """Read the next bit."""
-        try:
-            length_up, length_dn = next(self.read_half), next(self.read_half)
-        except StopIteration:
-            self.read_half = self._gen_read_halfpulse()
-            raise EndOfTape()
-        if (length_up > self.halflength_max or length_dn > self.halflength_max or
-                length_up < self.halflength_min or length_dn < self.halflength_min):
+        index_up, index_dn = self._next_halfpulse(), self._next_halfpulse()
+        type_up, type_dn = self._half_types[index_up], self._half_types[index_dn]
+        if type_up == _BAD_HALF or type_dn == _BAD_HALF:
             return None
-        elif length_up >= self.halflength_cut:
-            return 1
-        else:
-            return 0
+        return type_up
+
+    def read_byte(self, skip_start=False):
+        """Read a byte from the tape."""
+        if self._half_ends is None:
+            self._decode()
+        index = self._half_index
+        types = self._half_types[index:index+16]
+        if len(types) < 16 or _BAD_HALF in types:
+            # end of tape or pulse error: find out where
+            return TapeBitStream.read_byte(self, skip_start)
+        self._half_index = index + 16
+        self.wav_pos = self._half_ends[index+15]
+        # the bit is given by the type of the up half-pulse
+        return int(types[::2].translate(_BIT_DIGITS), 2)
 
     def close(self):
         """Close WAV-file."""
@@ -831,49 +896,106 @@ class WAVBitStream(TapeBitStream):
         self.wav.write(struct.pack('<4sL', b'data', end_pos-self.start))
         self.wav.close()
 
-    def _fill_buffer(self):
-        """Fill buffer with frames and pre-process."""
-        frame_buf = []
-        frames = self.wav.read(self.buf_len*self.nchannels*self.sampwidth)
-        if not frames:
-            raise EndOfTape
-        # convert MSBs to int (data stored little endian)
-        # note that we simply throw away all the less significant bytes
-        frames = (ord(_c) for _c in iterchar(frames[self.sampwidth-1::self.sampwidth]))
+    def _read_halfpulse(self):
+        """Read a half-pulse and return its length."""
+        index = self._next_halfpulse()
+        return self._half_ends[index] - (self._half_ends[index-1] if index else 0)
+
+    def _next_halfpulse(self):
+        """Move on to the next half-pulse and return its index."""
+        if self._half_ends is None:
+            self._decode()
+        index = self._half_index
+        if index >= len(self._half_ends):
+            raise EndOfTape()
+        self._half_index = index + 1
+        self.wav_pos = self._half_ends[index]
+        return index
+
+    def _decode(self):
+        """Decode the whole tape image to half-pulse end positions."""
+        self.wav.flush()
+        framesize = self.nchannels * self.sampwidth
+        with mmap.mmap(self.wav.fileno(), 0, access=mmap.ACCESS_READ) as wav_map:
+            nframes = max(0, len(wav_map) - self.start) // framesize
+            # convert MSBs to int (data stored little endian)
+            # note that we simply throw away all the less significant bytes
+            msbs = wav_map[
+                self.start + self.sampwidth - 1 : self.start + nframes * framesize : self.sampwidth
+            ]
+        if _import_numpy():
+            ends = self._find_halfpulses_numpy(msbs)
+            lengths = numpy.diff(ends, prepend=0)
+            types = numpy.where(
+                (lengths > self.halflength_max) | (lengths < self.halflength_min),
+                _BAD_HALF, lengths >= self.halflength_cut
+            )
+            self._half_types = types.astype(numpy.uint8).tobytes()
+            self._half_ends = array('l', ends.astype('l').tobytes())
+        else:
+            self._half_ends = self._find_halfpulses(msbs)
+            self._half_types = bytes(bytearray(
+                self._get_half_type(_end - _start)
+                for _start, _end in zip([0] + self._half_ends[:-1].tolist(), self._half_ends)
+            ))
+        self._half_index = bisect.bisect_right(self._half_ends, self.wav_pos)
+
+    def _get_half_type(self, length):
+        """Classify a half-pulse by its length."""
+        if length > self.halflength_max or length < self.halflength_min:
+            return _BAD_HALF
+        return int(length >= self.halflength_cut)
+
+    def _find_halfpulses_numpy(self, msbs):
+        """Find half-pulse ends from the sample MSBs, using NumPy."""
         # sum frames over channels
-        frames = map(sum, zip(*[iter(frames)]*self.nchannels))
-        frames = [
-            _x-self.subtractor if _x >= self.sub_threshold else _x
-            for _x in frames
-        ]
-        return self.filter.send(frames)
-
-    def _gen_read_halfpulse(self):
-        """Generator to read a half-pulse and yield its length."""
-        length = 0
-        frame = 1
-        prezero = 1
-        pos_in_frame = 0
-        frame_buf = []
-        while True:
-            try:
-                sample = frame_buf[pos_in_frame]
-                pos_in_frame += 1
-            except IndexError:
-                frame_buf = self._fill_buffer()
-                pos_in_frame = 0
-                continue
-            length += 1
-            last, frame = frame, (sample > self.zero_threshold) + (sample >= -self.zero_threshold) - 1
-            if last != frame and (last != 0 or frame == prezero):
-                if frame == 0 and last != 0:
-                    prezero = last
-                self.wav_pos += length
-                yield length
-                length = 0
+        frames = numpy.frombuffer(msbs, dtype=numpy.uint8).astype(numpy.int32)
+        frames = frames.reshape(-1, self.nchannels).sum(axis=1)
+        frames[frames >= self.sub_threshold] -= self.subtractor
+        # sign of the signal, with a margin around zero
+        levels = (
+            (frames > self.zero_threshold).astype(numpy.int8)
+            + (frames >= -self.zero_threshold) - 1
+        )
+        # the signal is taken to start positive
+        previous = numpy.concatenate(([1], levels))[:-1]
+        changes = numpy.flatnonzero(levels != previous)
+        last, current = previous[changes], levels[changes]
+        # a half-pulse ends at every change except when the signal leaves zero on the other side
+        before_zero = numpy.concatenate(([1], last))[:-1]
+        return changes[(last != 0) | (current == before_zero)] + 1
+
+    def _find_halfpulses(self, msbs):
+        """Find half-pulse ends from the sample MSBs."""
+        # map the summed frames to the sign of the signal plus one, with a margin around zero
+        codes = bytearray()
+        for frame in range(256 * self.nchannels):
+            if frame >= self.sub_threshold:
+                frame -= self.subtractor
+            codes.append((frame > self.zero_threshold) + (frame >= -self.zero_threshold))
+        if self.nchannels == 1:
+            levels = msbs.translate(bytes(codes))
+        else:
+            # sum frames over channels
+            channels = [array('B', msbs[_c::self.nchannels]) for _c in range(self.nchannels)]
+            levels = bytes(bytearray(codes[sum(_frame)] for _frame in zip(*channels)))
+        ends = array('l')
+        # the signal is taken to start positive, which is the first run of the prefixed string
+        # the start of each further run of equal levels may end a half-pulse
+        runs = _LEVEL_RUNS.finditer(b'\2' + levels)
+        next(runs)
+        before_zero, last = None, 2
+        for run in runs:
+            current = ord(run.group(1))
+            # a half-pulse ends at every change except when the signal leaves zero on the other side
+            if last != 1 or current == before_zero:
+                ends.append(run.start())
+            before_zero, last = last, current
+        return ends
 
     def write_pause(self, milliseconds):
         """Write a pause of given length to the tape."""
+        self._half_ends = None
         length = int(milliseconds * self.framerate / 1000)
         zero = {1: b'\x7f', 2: b'\x00\x00'}
         self.wav.write(zero[self.sampwidth] * self.nchannels * length)
@@ -881,14 +1003,40 @@ class WAVBitStream(TapeBitStream):
 
     def write_bit(self, bit):
         """Write a bit to tape."""
-        half_length = self.halflength[bit]
-        down = {1: b'\x00', 2: b'\x00\x80'}
-        up = {1: b'\xff', 2: b'\xff\x7f'}
-        self.wav.write(
-            down[self.sampwidth] * self.nchannels * half_length +
-            up[self.sampwidth] * self.nchannels * half_length
-        )
-        self.wav_pos += 2 * half_length
+        if self._bit_waves is None:
+            self._build_waves()
+        self._half_ends = None
+        self.wav.write(self._bit_waves[bit])
+        self.wav_pos += 2 * self.halflength[bit]
+
+    def write_byte(self, byte):
+        """Write a byte to tape."""
+        self.write_bytes(int2byte(byte))
+
+    def write_bytes(self, data):
+        """Write a sequence of bytes to tape in one go."""
+        if self._byte_waves is None:
+            self._build_waves()
+        self._half_ends = None
+        data = bytearray(data)
+        self.wav.write(b''.join([self._byte_waves[_b] for _b in data]))
+        self.wav_pos += sum(self._byte_lengths[_b] for _b in data)
+
+    def _build_waves(self):
+        """Build the waveforms for each bit and byte value."""
+        down = {1: b'\x00', 2: b'\x00\x80'}[self.sampwidth] * self.nchannels
+        up = {1: b'\xff', 2: b'\xff\x7f'}[self.sampwidth] * self.nchannels
+        self._bit_waves = [
+            down * self.halflength[_bit] + up * self.halflength[_bit] for _bit in (0, 1)
+        ]
+        self._byte_waves = [
+            b''.join(self._bit_waves[(_byte >> (7-_i)) & 1] for _i in range(8))
+            for _byte in range(256)
+        ]
+        self._byte_lengths = [
+            sum(2 * self.halflength[(_byte >> (7-_i)) & 1] for _i in range(8))
+            for _byte in range(256)
+        ]
 
     def _read_wav_header(self):
         """Read RIFF WAV header."""
@@ -965,11 +1113,11 @@ class WAVBitStream(TapeBitStream):
                 pulse = (0,0)
                 while True:
                     last = pulse
-                    half = next(self.read_half)
+                    half = self._read_halfpulse()
                     if not self._is_leader_halfpulse(half):
                         if counter > self.min_leader_halves:
                             #  zero bit; try to sync
-                            half = next(self.read_half)
+                            half = self._read_halfpulse()
                         break
                     counter += 1
                 # sync bit 0 has been read, check sync byte
@@ -991,8 +1139,7 @@ class WAVBitStream(TapeBitStream):
                             '%s Error in sync byte after %d pulses: %s',
                             timestamp(self.counter()), counter, e
                         )
-        except (EndOfTape, StopIteration):
-            self.read_half = self._gen_read_halfpulse()
+        except EndOfTape:
             return False
 
 ##############################################################################
@@ -1022,9 +1169,3 @@ def hms(seconds):
 def timestamp(counter):
     """Time stamp."""
     return b'[%d:%02d:%02d] ' % hms(counter)
-
-def passthrough():
-    """Passthrough filter."""
-    x = []
-    while True:
-        x = yield x
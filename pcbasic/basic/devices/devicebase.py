@@ -234,6 +234,14 @@ class RawFile(object):
 # TAB x09 is not whitespace for input#. NUL \x00 and LF \x0a are.
 INPUT_WHITESPACE = b' \0\n'
 
+# nonprinting characters including tabs are not counted for WIDTH
+NONPRINTING = bytes(bytearray(range(32)))
+
+
+def count_printable(s):
+    """Number of characters in s that count towards the width."""
+    return len(s.translate(None, NONPRINTING))
+
 
 class DeviceSettings(object):
     """Device-level width and column settings."""
@@ -325,35 +333,32 @@ class TextFileBase(RawFile):
         """Write the string s to the file, taking care of width settings."""
         assert isinstance(s, bytes)
         # only break lines at the start of a new string. width 255 means unlimited width
-        s_width = 0
-        newline = False
         # find width of first line in s
-        for c in iterchar(s):
-            if c in (b'\r', b'\n'):
-                newline = True
-                break
-            if c >= b' ':
-                # nonprinting characters including tabs are not counted for WIDTH
-                s_width += 1
+        breaks = [_pos for _pos in (s.find(b'\r'), s.find(b'\n')) if _pos >= 0]
+        newline = bool(breaks)
+        s_width = count_printable(s[:min(breaks)] if breaks else s)
         if (
                 can_break and self.width != 255 and self.col != 1 and
                 self.col-1 + s_width > self.width and not newline
             ):
             self.write_line()
             self.col = 1
-        for c in iterchar(s):
-            # don't replace CR or LF with CRLF when writing to files
-            if c == b'\r':
-                self._fhandle.write(c)
-                self.col = 1
-            else:
-                self._fhandle.write(c)
-                # nonprinting characters including tabs are not counted for WIDTH
-                if c >= b' ':
-                    self.col += 1
-                    # col-1 is a byte that wraps
-                    if self.col == 257:
-                        self.col = 1
+        # don't replace CR or LF with CRLF when writing to files
+        self._write_raw(s)
+        self._advance_col(s)
+
+    def _write_raw(self, s):
+        """Write bytes to the underlying stream."""
+        self._fhandle.write(s)
+
+    def _advance_col(self, s):
+        """Update the column position for bytes written."""
+        last_cr = s.rfind(b'\r')
+        if last_cr >= 0:
+            self.col = 1
+            s = s[last_cr+1:]
+        # col-1 is a byte that wraps
+        self.col = (self.col - 1 + count_printable(s)) % 256 + 1
 
     def write_line(self, s=b''):
         """Write string and follow with device-standard line break."""
@@ -394,7 +399,7 @@ class InputMixin(object):
 
     def input_entry(self, typechar, allow_past_end, suppress_unquoted_linefeed=True):
         """Read a number or string entry for INPUT """
-        word, blanks = b'', b''
+        word, blanks = bytearray(), bytearray()
         # fix readahead buffer (self.next_char)
         last = self._skip_whitespace(INPUT_WHITESPACE)
         # read first non-whitespace char
@@ -431,8 +436,9 @@ class InputMixin(object):
                 if typechar == values.STR:
                     blanks += c
             else:
-                word += blanks + c
-                blanks = b''
+                word += blanks
+                word += c
+                del blanks[:]
             if len(word) + len(blanks) >= 255:
                 break
             if not quoted:
@@ -447,7 +453,7 @@ class InputMixin(object):
             if self.peek(1) in b',\r':
                 c = self.read_one()
         # file position is at one past the separator char
-        return word, c
+        return bytes(word), c
 
 
 #################################################################################
@@ -13,6 +13,7 @@ import os
 import re
 import io
 import sys
+import stat
 import errno
 import ntpath
 import logging
@@ -26,7 +27,7 @@ from ..base.tokens import ALPHANUMERIC
 from ..codepage import CONTROL
 from .. import values
 from . import devicebase
-from .diskfiles import BinaryFile, TextFile, RandomFile, Locks
+from .diskfiles import BinaryFile, TextFile, RandomFile, MappedRandomFile, Locks
 
 
 # GW-BASIC FILE CONTROL BLOCK structure:
@@ -176,7 +177,7 @@ def dos_is_legal_name(dos_name):
             ((set(trunk) | set(ext)) <= ALLOWABLE_CHARS)
         )
 
-def dos_to_native_name(native_path, dosname, isdir):
+def dos_to_native_name(native_path, dosname, isdir, name_cache=None):
     """Find a matching native file name for a given normalised DOS name."""
     try:
         uni_name = dosname.decode('ascii')
@@ -187,26 +188,15 @@ def dos_to_native_name(native_path, dosname, isdir):
     if istype(native_path, uni_name, isdir):
         return uni_name
     # otherwise try in lexicographic order
-    try:
-        all_names = os.listdir(native_path)
-    except EnvironmentError:
-        # report no match if listdir fails
-        return None
-    for f in sorted(all_names):
-        # we won't match non-ascii anyway
-        try:
-            ascii_name = f.encode('ascii')
-        except UnicodeEncodeError:
-            continue
-        # don't match long names or non-legal dos names
-        if dos_is_legal_name(ascii_name):
-            try_name = dos_normalise_name(ascii_name)
-            if try_name == dosname and istype(native_path, f, isdir):
-                return f
+    if name_cache is None:
+        name_cache = DOSNameCache()
+    for f in name_cache.get_matches(native_path, dosname):
+        if istype(native_path, f, isdir):
+            return f
     return None
 
-def dos_name_matches(name, mask):
-    """Whether native name element matches DOS wildcard mask."""
+def dos_mask_matcher(mask):
+    """Compile DOS wildcard mask into a function matching native name elements."""
     # convert wildcard mask to regexp
     regexp = b'\\A'
     for c in iterchar(mask.upper()):
@@ -219,7 +209,65 @@ def dos_name_matches(name, mask):
             regexp += re.escape(c)
     regexp += b'\\Z'
     cregexp = re.compile(regexp)
-    return cregexp.match(name.upper()) is not None
+    return lambda name: cregexp.match(name.upper()) is not None
+
+def dos_name_matches(name, mask):
+    """Whether native name element matches DOS wildcard mask."""
+    return dos_mask_matcher(mask)(name)
+
+
+class DOSNameCache(object):
+    """Normalised DOS names of native directory entries, validated by directory mtime."""
+
+    def __init__(self):
+        """Initialise an empty cache."""
+        # native directory path: (mtime, {normalised dos name: [native names]})
+        self._dirs = {}
+
+    def __getstate__(self):
+        """Pickle the cache without its contents; directories are scanned again when needed."""
+        return {'_dirs': {}}
+
+    def get_matches(self, native_path, dosname):
+        """Native names in a directory that normalise to a DOS name, in lexicographic order."""
+        native_path = os.path.abspath(native_path)
+        try:
+            mtime = os.stat(native_path).st_mtime
+        except (EnvironmentError, TypeError, ValueError):
+            # report no match if the directory can't be read
+            self._dirs.pop(native_path, None)
+            return []
+        try:
+            cached_mtime, names = self._dirs[native_path]
+        except KeyError:
+            cached_mtime, names = None, None
+        if cached_mtime != mtime:
+            try:
+                names = self._scan(native_path)
+            except EnvironmentError:
+                self._dirs.pop(native_path, None)
+                return []
+            self._dirs[native_path] = mtime, names
+        return names.get(dosname, [])
+
+    def invalidate(self, native_path):
+        """Forget the names in a directory, after we've changed its contents."""
+        self._dirs.pop(os.path.abspath(native_path), None)
+
+    @staticmethod
+    def _scan(native_path):
+        """Map normalised DOS names to native names for all entries in a directory."""
+        names = {}
+        for f in sorted(os.listdir(native_path)):
+            # we won't match non-ascii anyway
+            try:
+                ascii_name = f.encode('ascii')
+            except UnicodeEncodeError:
+                continue
+            # don't match long names or non-legal dos names
+            if dos_is_legal_name(ascii_name):
+                names.setdefault(dos_normalise_name(ascii_name), []).append(f)
+        return names
 
 
 ##############################################################################
@@ -230,7 +278,7 @@ class DiskDevice(object):
 
     allowed_modes = b'IOR'
 
-    def __init__(self, letter, path, cwd, codepage, text_mode, soft_linefeed):
+    def __init__(self, letter, path, cwd, codepage, text_mode, soft_linefeed, mmap_files=False):
         """Initialise a disk device."""
         assert isinstance(cwd, text_type), type(cwd)
         # DOS drive letter
@@ -245,6 +293,8 @@ class DiskDevice(object):
             self._native_cwd = cwd
         # locks are drive-specific
         self._locks = Locks()
+        # normalised names of native directory entries
+        self._name_cache = DOSNameCache()
         # text file settings
         # use a BOM on input and output, but not append
         if not text_mode:
@@ -253,6 +303,8 @@ class DiskDevice(object):
             text_mode = 'utf-8-sig'
         self._text_mode = text_mode
         self._soft_linefeed = soft_linefeed
+        # access random files through memory maps
+        self._mmap_files = mmap_files
 
     def close(self):
         """Close disk device."""
@@ -267,6 +319,14 @@ class DiskDevice(object):
         """Determine if a filetype and mode refer to a text file."""
         return filetype in (b'A', b'D') and mode in (b'O', b'A', b'I')
 
+    @staticmethod
+    def _is_mappable(fhandle):
+        """Determine if a stream is a regular file that can be memory-mapped."""
+        try:
+            return stat.S_ISREG(os.fstat(fhandle.fileno()).st_mode)
+        except (EnvironmentError, AttributeError, ValueError, io.UnsupportedOperation):
+            return False
+
     def _create_file_object(
             self, fhandle, filetype, mode, number=0,
             field=None, reclen=128, seg=0, offset=0, length=0
@@ -302,17 +362,20 @@ class DiskDevice(object):
                 fhandle = self._codepage.wrap_output_stream(fhandle, preserve=CONTROL+(b'\x1A',))
             else: #if mode == b'I':
                 # if the input stream is unicode: encode codepage bytes
-                # replace newlines with \r in text mode
-                fhandle = self._codepage.wrap_input_stream(
-                    fhandle, replace_newlines=not self._soft_linefeed
-                )
+                fhandle = self._codepage.wrap_input_stream(fhandle)
             # ascii program file; or data file for input, output, append
-            return TextFile(fhandle, filetype, number, mode, self._locks)
+            # replace newlines with \r in text mode
+            return TextFile(
+                fhandle, filetype, number, mode, self._locks,
+                replace_newlines=(mode == b'I' and not self._soft_linefeed)
+            )
         elif filetype in (b'B', b'P', b'M'):
             # binary [B]LOAD, [B]SAVE
             return BinaryFile(fhandle, filetype, number, mode, seg, offset, length, self._locks)
         elif filetype == b'D' and mode == b'R':
             # data file for random
+            if self._mmap_files and self._is_mappable(fhandle):
+                return MappedRandomFile(fhandle, number, field, reclen, self._locks)
             return RandomFile(fhandle, number, field, reclen, self._locks)
         else:
             # incorrect file type requested
@@ -362,6 +425,8 @@ class DiskDevice(object):
         try:
             # create file if in RANDOM or APPEND mode and doesn't exist yet
             # OUTPUT mode files are created anyway since they're opened with wb
+            if mode != b'I':
+                self._name_cache.invalidate(os.path.dirname(native_name))
             if ((mode == b'A' or mode == b'R') and not os.path.exists(native_name)):
                 io.open(native_name, 'wb').close()
             if mode == b'A':
@@ -452,11 +517,15 @@ class DiskDevice(object):
 
     def mkdir(self, dos_path):
         """Create directory at given BASIC path."""
-        safe(os.mkdir, self._get_native_abspath(dos_path, defext=b'', isdir=True, create=True))
+        native_path = self._get_native_abspath(dos_path, defext=b'', isdir=True, create=True)
+        self._name_cache.invalidate(os.path.dirname(native_path))
+        safe(os.mkdir, native_path)
 
     def rmdir(self, dos_path):
         """Remove directory at given BASIC path."""
-        safe(os.rmdir, self._get_native_abspath(dos_path, defext=b'', isdir=True, create=False))
+        native_path = self._get_native_abspath(dos_path, defext=b'', isdir=True, create=False)
+        self._name_cache.invalidate(os.path.dirname(native_path))
+        safe(os.rmdir, native_path)
 
     def kill(self, dos_pathmask):
         """Remove regular files that match given BASIC path and mask."""
@@ -464,6 +533,7 @@ class DiskDevice(object):
         _, files = self._get_dirs_files(native_dir)
         # filter according to mask
         trunkmask, extmask = dos_splitext(dos_mask)
+        trunk_matches, ext_matches = dos_mask_matcher(trunkmask), dos_mask_matcher(extmask)
         dos_to_native = {
             self._get_dos_display_name(native_dir, _native_name): _native_name
             for _native_name in files
@@ -471,7 +541,7 @@ class DiskDevice(object):
         to_kill_dos = []
         for dos_name in dos_to_native:
             trunk, ext = dos_splitext(dos_name)
-            if dos_name_matches(trunk, trunkmask) and dos_name_matches(ext, extmask):
+            if trunk_matches(trunk) and ext_matches(ext):
                 to_kill_dos.append(dos_name)
         to_kill = [
             # NOTE that this depends on display names NOT being legal names for overlong names
@@ -488,6 +558,7 @@ class DiskDevice(object):
         for dos_path in to_kill_dos:
             # don't delete open files
             self.require_file_not_open(dos_path)
+        self._name_cache.invalidate(native_dir)
         for native_path in to_kill:
             safe(os.remove, native_path)
 
@@ -501,6 +572,8 @@ class DiskDevice(object):
         )
         if os.path.exists(new_native_path):
             raise error.BASICError(error.FILE_ALREADY_EXISTS)
+        self._name_cache.invalidate(os.path.dirname(old_native_path))
+        self._name_cache.invalidate(os.path.dirname(new_native_path))
         safe(os.rename, old_native_path, new_native_path)
 
     def _split_pathmask(self, dos_pathmask):
@@ -628,7 +701,7 @@ class DiskDevice(object):
         # check for non-legal characters & spaces (but clip off overlong names)
         if not dos_is_legal_name(norm_name):
             raise error.BASICError(error.BAD_FILE_NAME)
-        fullname = dos_to_native_name(native_path, norm_name, isdir)
+        fullname = dos_to_native_name(native_path, norm_name, isdir, self._name_cache)
         if fullname:
             return fullname
         # not found
@@ -667,11 +740,12 @@ class DiskDevice(object):
         """Apply case-insensitive filename filter to display names."""
         dos_mask = dos_mask or b'*.*'
         trunkmask, extmask = dos_splitext(dos_mask)
+        trunk_matches, ext_matches = dos_mask_matcher(trunkmask), dos_mask_matcher(extmask)
         all_files = (self._get_dos_display_name(native_dirpath, name) for name in native_names)
         split = [dos_splitext(dos_name) for dos_name in all_files]
         return sorted(
             (trunk, ext) for (trunk, ext) in split
-            if dos_name_matches(trunk, trunkmask) and dos_name_matches(ext, extmask)
+            if trunk_matches(trunk) and ext_matches(ext)
         )
 
 
@@ -760,10 +834,12 @@ class NameWrapper(object):
 class InternalDiskDevice(DiskDevice):
     """Internal disk device for special operations."""
 
-    def __init__(self, letter, path, cwd, codepage, text_mode, soft_linefeed):
+    def __init__(self, letter, path, cwd, codepage, text_mode, soft_linefeed, mmap_files=False):
         """Initialise internal disk."""
         self._bound_files = {}
-        DiskDevice.__init__(self, letter, path, cwd, codepage, text_mode, soft_linefeed)
+        DiskDevice.__init__(
+            self, letter, path, cwd, codepage, text_mode, soft_linefeed, mmap_files
+        )
 
     def bind(self, file_name_or_object, name=None):
         """Bind a native file name or object to an internal name."""
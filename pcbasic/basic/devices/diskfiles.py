@@ -6,7 +6,11 @@ Disk Files
 This file is released under the GNU GPL version 3 or later.
 """
 
+import os
+import re
+import mmap
 import struct
+import bisect
 import ntpath
 from contextlib import contextmanager
 
@@ -14,9 +18,25 @@ from ...compat import iteritems, iterchar
 
 from ..base.bytestream import ByteStream
 from ..base import error
+from .. import values
 from .devicebase import RawFile, TextFileBase, InputMixin, safe_io, TYPE_TO_MAGIC
 
 
+# number of bytes to read ahead on text files
+READ_BLOCK_SIZE = 4096
+# number of bytes to collect before writing out to text files
+WRITE_BUFFER_SIZE = 4096
+# number of bytes to scan for an INPUT# entry: the longest entry plus separators and whitespace
+INPUT_SCAN_SIZE = 512
+
+# INPUT# entries are read from the buffer with these; anything else goes through InputMixin
+_SPACES = re.compile(b' *')
+_STRING_END = re.compile(b'[,\r]')
+_NUMBER_END = re.compile(b'[ ,\r]')
+# NUL, LF and EOF characters need the character-by-character rules
+_INPUT_SPECIAL = re.compile(b'[\0\n\x1a]')
+
+
 # binary file interface: file interface +
 #   seg
 #   offset
@@ -69,7 +89,7 @@ class BinaryFile(RawFile):
 class TextFile(TextFileBase, InputMixin):
     """Text file on disk device."""
 
-    def __init__(self, fhandle, filetype, number, mode, locks):
+    def __init__(self, fhandle, filetype, number, mode, locks, replace_newlines=False):
         """Initialise text file object."""
         TextFileBase.__init__(self, fhandle, filetype, mode)
         self._locks = locks
@@ -78,36 +98,216 @@ class TextFile(TextFileBase, InputMixin):
         if self.mode == b'A':
             with safe_io():
                 self._fhandle.seek(0, 2)
+        # read buffer; bytes from _pos onwards have not been read yet
+        self._buffer = bytearray()
+        self._pos = 0
+        # read ahead in blocks on regular files, but don't block on pipes or consoles
+        try:
+            seekable = fhandle.seekable()
+        except (AttributeError, EnvironmentError, ValueError):
+            seekable = False
+        self._block_size = READ_BLOCK_SIZE if seekable else 1
+        # collect output to regular files; None means write through
+        self._write_buffer = bytearray() if seekable else None
+        # convert LF and CR LF line endings to CR
+        self._replace_newlines = replace_newlines
+        self._last_raw = b''
+        # buffer offsets just after a CR whose following LF was absorbed
+        self._absorbed = []
+
+    def __getstate__(self):
+        """Pickle."""
+        # make sure the file on disk is complete, so that we can reopen it on resume
+        self.flush()
+        with safe_io():
+            self._fhandle.flush()
+        return self.__dict__
 
     def close(self):
         """Close text file."""
         if self.mode in (b'O', b'A'):
+            self.flush()
             # write EOF char
             with safe_io():
                 self._fhandle.write(b'\x1a')
         TextFileBase.close(self)
         self._locks.close_file(self._number)
 
+    def flush(self):
+        """Write out buffered output."""
+        if self._write_buffer:
+            with safe_io():
+                self._fhandle.write(bytes(self._write_buffer))
+            del self._write_buffer[:]
+
+    def _fill(self, num):
+        """Make sure num bytes are buffered; fewer only at end of file."""
+        missing = num - len(self._buffer) + self._pos
+        if missing <= 0:
+            return
+        if self._pos:
+            del self._buffer[:self._pos]
+            self._absorbed = [_ofs - self._pos for _ofs in self._absorbed if _ofs > self._pos]
+            self._pos = 0
+        with safe_io():
+            while missing > 0:
+                raw = self._fhandle.read(max(missing, self._block_size))
+                if not raw:
+                    break
+                if self._replace_newlines:
+                    raw = self._convert_newlines(raw)
+                self._buffer.extend(raw)
+                missing -= len(raw)
+
+    def _convert_newlines(self, raw):
+        """Replace LF and CR LF with CR, keeping track of absorbed LFs."""
+        last, self._last_raw = self._last_raw, raw[-1:]
+        if b'\n' not in raw:
+            return raw
+        start = len(self._buffer)
+        if last == b'\r' and raw[:1] == b'\n':
+            self._absorbed.append(start)
+            raw = raw[1:]
+        crlf = raw.find(b'\r\n')
+        if crlf >= 0:
+            parts = raw.split(b'\r\n')
+            for part in parts[:-1]:
+                start += len(part) + 1
+                self._absorbed.append(start)
+            raw = b'\r'.join(parts)
+        return raw.replace(b'\n', b'\r')
+
+    def _buffered(self):
+        """Number of bytes in the underlying stream that have been read ahead."""
+        return (
+            len(self._buffer) - self._pos
+            + len(self._absorbed) - bisect.bisect_right(self._absorbed, self._pos)
+        )
+
+    def peek(self, num):
+        """Return next num characters to be read; never returns more, fewer only at EOF."""
+        self._fill(num)
+        return bytes(self._buffer[self._pos:self._pos+num])
+
     def read(self, n):
         """Read num characters."""
         self._locks.try_access(self._number, b'R')
-        return TextFileBase.read(self, n)
+        return self._read(n)
+
+    def _read(self, num):
+        """Read num characters from the buffer, stopping at EOF character."""
+        self._fill(num)
+        end = min(self._pos + num, len(self._buffer))
+        # check for \x1A - EOF char will actually stop further reading
+        eof = self._buffer.find(b'\x1a', self._pos, end)
+        if eof >= 0:
+            end = eof
+        output = bytes(self._buffer[self._pos:end])
+        self._pos = end
+        if len(output) <= 1:
+            self._previous = self._current
+        else:
+            self._previous = output[-2:]
+        self._current = output[-1:]
+        return output
 
     def read_one(self):
         """Read one character, replacing CR LF with CR."""
-        c = self.read(1)
-        if not c:
-            return c
+        c = self._read(1)
         # report CRLF as CR
         # but LFCR, LFCRLF, LFCRLFCR etc pass unmodified
         if (c == b'\r' and self._previous != b'\n') and self.peek(1) == b'\n':
-            last, char = self._previous, self._current
-            self.read(1)
-            self._previous, self._current = last, char
+            self._pos += 1
         return c
 
+    def input_entry(self, typechar, allow_past_end, suppress_unquoted_linefeed=True):
+        """Read a number or string entry for INPUT """
+        self._locks.try_access(self._number, b'R')
+        if self._block_size > 1:
+            entry = self._input_entry_buffered(typechar)
+            if entry is not None:
+                return entry
+        return InputMixin.input_entry(
+            self, typechar, allow_past_end, suppress_unquoted_linefeed
+        )
+
+    def _input_entry_buffered(self, typechar):
+        """\
+            Find an INPUT# entry and its separator in the read buffer.
+            Returns None, without reading anything, if the entry involves NUL, LF, EOF,
+            the end of the buffer or the 255-character limit.
+        """
+        self._fill(INPUT_SCAN_SIZE)
+        buf, end = self._buffer, len(self._buffer)
+        start = _SPACES.match(buf, self._pos).end()
+        if start >= end:
+            return None
+        if typechar == values.STR and buf[start:start+1] == b'"':
+            stop = buf.find(b'"', start+1, end)
+            word, sep = buf[start+1:stop], b'"'
+        else:
+            match = (_STRING_END if typechar == values.STR else _NUMBER_END).search(buf, start, end)
+            stop = match.start() if match else -1
+            word, sep = buf[start:stop], bytes(buf[stop:stop+1])
+            if typechar == values.STR:
+                # trailing whitespace is dropped, internal whitespace kept
+                word = word.rstrip(b' ')
+        # the CR of a CR LF must not be the last byte in the buffer
+        if stop < 0 or stop - start >= 255 or stop + 1 >= end:
+            return None
+        pos = stop + 1
+        if sep in (b'"', b' '):
+            # skip whitespace after a closing quote or number; a comma or CR is the separator
+            pos = _SPACES.match(buf, pos).end()
+            if pos + 1 >= end:
+                return None
+            if buf[pos:pos+1] in (b',', b'\r'):
+                sep = bytes(buf[pos:pos+1])
+                pos += 1
+        if _INPUT_SPECIAL.search(buf, self._pos, pos):
+            return None
+        previous = buf[pos-2:pos-1] if pos-2 >= self._pos else self._current
+        self._previous, self._current = bytes(previous), bytes(buf[pos-1:pos])
+        self._pos = pos
+        if sep == b'\r' and previous != b'\n' and buf[pos:pos+1] == b'\n':
+            # CR LF is reported as CR
+            self._pos += 1
+        return bytes(word), sep
+
     def read_line(self):
         """Read line from text file, break on CR or CRLF (not LF)."""
+        self._locks.try_access(self._number, b'R')
+        if self._block_size == 1:
+            return self._read_line_by_char()
+        # longest line plus separator plus LF in CR LF
+        self._fill(257)
+        buf, start = self._buffer, self._pos
+        end = min(start + 255, len(buf))
+        eof = buf.find(b'\x1a', start, end)
+        if eof >= 0:
+            end = eof
+        # break on CR, CRLF but allow LF, LFCR to pass
+        cr = buf.find(b'\r', start, end)
+        while cr >= 0 and (buf[cr-1:cr] if cr > start else self._current) == b'\n':
+            cr = buf.find(b'\r', cr+1, end)
+        if cr >= 0:
+            line = bytes(buf[start:cr])
+            self._previous, self._current = line[-1:] or self._current, b'\r'
+            self._pos = cr + 1
+            if buf[cr+1:cr+2] == b'\n':
+                self._pos += 1
+            return line, b'\r'
+        line = bytes(buf[start:end])
+        self._pos = end
+        if len(line) == 255:
+            self._previous, self._current = line[-2:-1], line[-1:]
+            return line, (b'\r' if buf[end:end+1] == b'\r' else None)
+        # end of file
+        self._previous, self._current = line[-1:] or self._current, b''
+        return line, b''
+
+    def _read_line_by_char(self):
+        """Read line from unbuffered text file, break on CR or CRLF (not LF)."""
         s = []
         while True:
             c = self.read_one()
@@ -125,20 +325,31 @@ class TextFile(TextFileBase, InputMixin):
         self._locks.try_access(self._number, b'W')
         TextFileBase.write(self, s, can_break)
 
+    def _write_raw(self, s):
+        """Write bytes to the buffer, or to the file if unbuffered."""
+        if self._write_buffer is None:
+            self._fhandle.write(s)
+        else:
+            self._write_buffer += s
+            if len(self._write_buffer) >= WRITE_BUFFER_SIZE:
+                self.flush()
+
     def write_line(self, s=b''):
         """Write string and newline to file."""
         self.write(s + b'\r\n')
 
     def loc(self):
         """Get file pointer (LOC)."""
+        self.flush()
         with safe_io():
             if self.mode == b'I':
-                tell = self._fhandle.tell() - len(self._readahead)
+                tell = self._fhandle.tell() - self._buffered()
                 return max(1, (127+tell) // 128)
             return self._fhandle.tell() // 128
 
     def lof(self):
         """Get length of file (LOF)."""
+        self.flush()
         with safe_io():
             current = self._fhandle.tell()
             self._fhandle.seek(0, 2)
@@ -166,6 +377,9 @@ class FieldFile(TextFile):
         TextFile.__init__(self, ByteStream(field.view_buffer()), b'D', None, b'I', Locks())
         self._field = field
         self._reclen = reclen
+        # the field buffer can change under us, so don't read ahead or collect output
+        self._block_size = 1
+        self._write_buffer = None
 
     @contextmanager
     def use_mode(self, mode):
@@ -195,15 +409,15 @@ class FieldFile(TextFile):
             self._fhandle.flush()
             self.mode = b'I'
         elif new_mode == b'O' and self.mode == b'I':
-            self._fhandle.seek(-len(self._readahead), 1)
-            self._readahead = []
+            self._fhandle.seek(-self._buffered(), 1)
+            self._buffer, self._pos = bytearray(), 0
             self._previous, self._current = b'', b''
             self.mode = b'O'
 
     def _check_overflow(self):
         """Check for FIELD OVERFLOW."""
         # FIELD overflow happens if last byte in record has been read or written
-        if self._fhandle.tell() - len(self._readahead) >= self._reclen:
+        if self._fhandle.tell() - self._buffered() >= self._reclen:
             raise error.BASICError(error.FIELD_OVERFLOW)
 
     def set_buffer(self, contents):
@@ -229,6 +443,16 @@ class FieldFile(TextFile):
             # can't modify size of memoryview
             raise error.BASICError(error.FIELD_OVERFLOW)
 
+    def _write_raw(self, s):
+        """Write bytes to the field, up to its end."""
+        room = len(self._field.view_buffer()) - self._fhandle.tell()
+        if len(s) > room:
+            # fill up the field before overflowing
+            self._fhandle.write(s[:room])
+            self._advance_col(s[:room])
+            raise ValueError("Can't change size of buffer.")
+        self._fhandle.write(s)
+
 
 class RandomFile(RawFile):
     """Random-access file on disk device."""
@@ -312,27 +536,33 @@ class RandomFile(RawFile):
         self._set_record_pos(pos)
         # exceptionally, GET is allowed if the file holding the lock is open for OUTPUT
         self._locks.try_record_access(self._number, self._recpos+1, self._recpos+1, b'R')
-        if self.eof():
-            contents = b'\0' * self.reclen
-        else:
-            with safe_io():
-                contents = self._fhandle.read(self.reclen)
         # take contents and pad with NULL to required size
-        self._field_file.set_buffer(contents)
+        self._field_file.set_buffer(self._read_record())
         self._recpos += 1
 
     def put(self, pos):
         """Write a record."""
         self._set_record_pos(pos)
         self._locks.try_record_access(self._number, self._recpos+1, self._recpos+1, b'W')
+        self._write_record(bytes(self._field_file.get_buffer()))
+        self._recpos += 1
+
+    def _read_record(self):
+        """Read the record at the file pointer."""
+        if self.eof():
+            return b'\0' * self.reclen
+        with safe_io():
+            return self._fhandle.read(self.reclen)
+
+    def _write_record(self, record):
+        """Write a record at the file pointer."""
         current_length = self.lof()
         with safe_io():
             if self._recpos > current_length:
                 self._fhandle.seek(0, 2)
                 numrecs = self._recpos - current_length
                 self._fhandle.write(b'\0' * numrecs * self.reclen)
-            self._fhandle.write(bytes(self._field_file.get_buffer()))
-        self._recpos += 1
+            self._fhandle.write(record)
 
     def _set_record_pos(self, pos):
         """Move record pointer to new position."""
@@ -364,17 +594,151 @@ class RandomFile(RawFile):
         self._locks.release_record_lock(self._number, start, stop)
 
 
+class MappedRandomFile(RandomFile):
+    """Random-access file on disk device, with records accessed through a memory map."""
+
+    def __init__(self, fhandle, number, field, reclen, locks):
+        """Initialise memory-mapped random-access file."""
+        RandomFile.__init__(self, fhandle, number, field, reclen, locks)
+        # shared mapping of the file, extended when the file grows
+        # other mappings of the same file see our writes immediately
+        self._map = None
+        # file pointer; follows the stream position of unmapped random files
+        self._offset = 0
+
+    def __getstate__(self):
+        """Pickle."""
+        pickledict = self.__dict__.copy()
+        # can't pickle mmap objects
+        pickledict['_map'] = None
+        return pickledict
+
+    def close(self):
+        """Close memory-mapped random-access file."""
+        self._unmap()
+        RandomFile.close(self)
+
+    def _set_record_pos(self, pos):
+        """Move record pointer to new position."""
+        if pos is not None:
+            # first record is number 1
+            self._recpos = pos - 1
+            self._offset = self._recpos * self.reclen
+
+    def lof(self):
+        """Get length of file, in bytes, for LOF."""
+        with safe_io():
+            return os.fstat(self._fhandle.fileno()).st_size
+
+    def _unmap(self):
+        """Release the memory map."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _remap(self):
+        """Extend the memory map if the file has grown."""
+        length = self.lof()
+        if length > self._mapped_length():
+            self._unmap()
+            with safe_io():
+                self._map = mmap.mmap(self._fhandle.fileno(), 0)
+
+    def _mapped_length(self):
+        """Length of the file as currently mapped."""
+        return len(self._map) if self._map is not None else 0
+
+    def _read_record(self):
+        """Read the record at the file pointer."""
+        if self._mapped_length() < max(self._offset + self.reclen, self._recpos * self.reclen):
+            self._remap()
+        # the mapping now covers the record or the whole file
+        if self._recpos * self.reclen > self._mapped_length():
+            return b'\0' * self.reclen
+        contents = self._map[self._offset:self._offset+self.reclen] if self._map is not None else b''
+        self._offset += len(contents)
+        return contents
+
+    def _write_record(self, record):
+        """Write a record at the file pointer."""
+        end = self._offset + len(record)
+        if end <= self._mapped_length() and self._recpos <= self._mapped_length():
+            self._map[self._offset:end] = record
+            self._offset = end
+        else:
+            # extending the file: write through the stream, map later if needed
+            with safe_io():
+                self._fhandle.seek(self._offset)
+            RandomFile._write_record(self, record)
+            # keep the file up to date for the mappings
+            with safe_io():
+                self._fhandle.flush()
+                self._offset = self._fhandle.tell()
+
+
 ###############################################################################
 # Locks
 
 
+class RecordLocks(object):
+    """Set of record ranges locked by a file, indexed for overlap queries."""
+
+    def __init__(self):
+        """Initialise empty lock set."""
+        self._ranges = set()
+        # range starts in ascending order
+        self._starts = []
+        # running maximum of range stops, in the same order
+        self._max_stops = []
+
+    def __bool__(self):
+        """Any locks held."""
+        return bool(self._ranges)
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, lock_range):
+        """Lock held on exactly this range."""
+        return lock_range in self._ranges
+
+    def add(self, lock_range):
+        """Lock a (start, stop) range of records; (None, None) locks the whole file."""
+        self._ranges.add(lock_range)
+        self._rebuild()
+
+    def remove(self, lock_range):
+        """Release the lock on exactly this range, raise KeyError if not held."""
+        self._ranges.remove(lock_range)
+        self._rebuild()
+
+    def _rebuild(self):
+        """Rebuild the index after a lock or unlock."""
+        ranges = sorted(_r for _r in self._ranges if _r != (None, None))
+        self._starts = [_start for _start, _ in ranges]
+        self._max_stops = []
+        max_stop = None
+        for _, stop in ranges:
+            max_stop = stop if max_stop is None else max(max_stop, stop)
+            self._max_stops.append(max_stop)
+
+    def _covers(self, record):
+        """Any locked range contains the record."""
+        index = bisect.bisect_right(self._starts, record)
+        return index > 0 and self._max_stops[index-1] >= record
+
+    def blocks(self, start, stop):
+        """A lock conflicts with access to the range of records."""
+        # as in GW-BASIC, only the ends of the range are checked against the locks
+        return (None, None) in self._ranges or self._covers(start) or self._covers(stop)
+
+
 class LockingParameters(object):
     """Record of a file's locking parameters."""
 
     def __init__(self, dos_name, mode, lock_type, access):
         """Build a record."""
         self.name = ntpath.basename(dos_name).upper()
-        self.lock_set = set()
+        self.lock_set = RecordLocks()
         self.lock_type = lock_type
         self.access = access
         self.mode = mode
@@ -390,9 +754,13 @@ class Locks(object):
 
     def list_open(self, name, exclude_number=None):
         """Retrieve a list of files open on the same disk device."""
+        return self._list_open_by_name(ntpath.basename(name).upper(), exclude_number)
+
+    def _list_open_by_name(self, name, exclude_number=None):
+        """Retrieve a list of files open under a normalised name."""
         return [
             f for number, f in iteritems(self._locking_parameters)
-            if f.name == ntpath.basename(name).upper() and number != exclude_number
+            if f.name == name and number != exclude_number
         ]
 
     def open_file(self, name, number, mode, lock_type, access):
@@ -449,7 +817,7 @@ class Locks(object):
         if this_file.access and not (set(access) & set(this_file.access)):
             raise error.BASICError(error.PATH_FILE_ACCESS_ERROR)
         # access in violation of other's LOCK declation in OPEN: path/file access error
-        others = self.list_open(this_file.name, number)
+        others = self._list_open_by_name(this_file.name, number)
         for f in others:
             if (f.lock_type and f.lock_type != b'SHARED' and (set(f.lock_type) & set(access))):
                 raise error.BASICError(error.PATH_FILE_ACCESS_ERROR)
@@ -463,25 +831,19 @@ class Locks(object):
         """Attempt to access a record."""
         this_file = self._locking_parameters[number]
         other_locks = [
-            f.lock_set for f in self.list_open(this_file.name, number if allow_self else None)
+            f.lock_set
+            for f in self._list_open_by_name(this_file.name, number if allow_self else None)
             # access parameter only exists to allow reading a record on locked OUTPUT file
             if not (f.mode in b'OA' and read_only)
         ]
-        other_lock_set = set.union(*other_locks) if other_locks else set()
         # access in violation of other's LOCK#: permission denied
         # whole-file access sought
         if stop is None and start is None:
-            if other_lock_set:
+            if any(other_locks):
                 raise error.BASICError(error.PERMISSION_DENIED)
-        else:
-            # range access sought
-            for start_1, stop_1 in other_lock_set:
-                if (
-                        stop_1 is None and start_1 is None
-                        or (start >= start_1 and start <= stop_1)
-                        or (stop >= start_1 and stop <= stop_1)
-                    ):
-                    raise error.BASICError(error.PERMISSION_DENIED)
+        # range access sought
+        elif any(_locks.blocks(start, stop) for _locks in other_locks):
+            raise error.BASICError(error.PERMISSION_DENIED)
 
     def acquire_record_lock(self, number, start, stop):
         """Acquire a lock on a range of records."""
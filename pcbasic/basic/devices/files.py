@@ -43,7 +43,7 @@ class Files(object):
             self, values, memory, queues, keyboard, display, console,
             max_files, max_reclen, serial_buffer_size,
             device_params, current_device,
-            codepage, text_mode, soft_linefeed
+            codepage, text_mode, soft_linefeed, mmap_files=False
     ):
         """Initialise files."""
         # for wait() in files_
@@ -56,7 +56,7 @@ class Files(object):
         self._init_devices(
             values, queues, display, console, keyboard,
             device_params, current_device,
-            serial_buffer_size, codepage, text_mode, soft_linefeed
+            serial_buffer_size, codepage, text_mode, soft_linefeed, mmap_files
         )
 
     ###########################################################################
@@ -126,7 +126,7 @@ class Files(object):
     def _init_devices(
             self, values, queues, display, console, keyboard,
             device_params, current_device,
-            serial_in_size, codepage, text_mode, soft_linefeed
+            serial_in_size, codepage, text_mode, soft_linefeed, mmap_files
     ):
         """Initialise devices."""
         device_params = self._normalise_params(device_params)
@@ -155,7 +155,9 @@ class Files(object):
         self.kybd_file = self._devices[b'KYBD:'].device_file
         self.lpt1_file = self._devices[b'LPT1:'].device_file
         # disks
-        self._init_disk_devices(device_params, current_device, codepage, text_mode, soft_linefeed)
+        self._init_disk_devices(
+            device_params, current_device, codepage, text_mode, soft_linefeed, mmap_files
+        )
 
     def _normalise_current_device(self, current_device, device_params):
         """Normalise current device specification."""
@@ -626,7 +628,7 @@ class Files(object):
 
     def _init_disk_devices(
             self, device_params, current_device,
-            codepage, text_mode, soft_linefeed
+            codepage, text_mode, soft_linefeed, mmap_files
     ):
         """Initialise disk devices."""
         # if Z not specified, mount to cwd by default (override by specifying 'Z': None)
@@ -651,7 +653,7 @@ class Files(object):
             # treat device @: separately - internal disk must exist but may remain unmounted
             disk_class = disk.InternalDiskDevice if letter == b'@' else disk.DiskDevice
             self._devices[letter + b':'] = disk_class(
-                letter, path, cwd, codepage, text_mode, soft_linefeed
+                letter, path, cwd, codepage, text_mode, soft_linefeed, mmap_files
             )
         # current_device value is normalised
         self._current_device = current_device
@@ -766,12 +768,12 @@ class FilesAsync(Files):
     def _init_devices(
             self, values, queues, display, console, keyboard,
             device_params, current_device,
-            serial_in_size, codepage, text_mode, soft_linefeed
+            serial_in_size, codepage, text_mode, soft_linefeed, mmap_files
     ):
         super()._init_devices(
             values, queues, display, console, keyboard,
             device_params, current_device,
-            serial_in_size, codepage, text_mode, soft_linefeed
+            serial_in_size, codepage, text_mode, soft_linefeed, mmap_files
         )
         self._devices[b'KYBD:'] = devicebase.KYBDDeviceAsync(keyboard, display)
 
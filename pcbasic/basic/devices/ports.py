@@ -18,16 +18,13 @@ from ...compat import console, stdio
 
 from .devicebase import safe_io
 
-try:
+if False:
+    # packagers take note, we need this import to be bundled
     import serial
-    # use the old VERSION constant as __version__ not defined in v2
-    if serial.VERSION < '3':
-        raise ImportError('PySerial version %s found but >= 3.0.0 required.' % serial.VERSION)
-    from serial import serialutil
-    logging_msg = ''
-except Exception as e:
-    serial = None
-    logging_msg = str(e)
+
+# pyserial is only imported when a COM port is first attached; False if not available
+serial = None
+logging_msg = ''
 
 from ..base import error
 from .. import values
@@ -35,6 +32,23 @@ from .devicebase import Device, DeviceSettings, TextFileBase, RealTimeInputMixin
 from .devicebase import parse_protocol_string
 
 
+def _import_serial():
+    """Import pyserial if available; return whether it is."""
+    global serial, logging_msg
+    if serial is None:
+        try:
+            import serial
+            # use the old VERSION constant as __version__ not defined in v2
+            if serial.VERSION < '3':
+                raise ImportError(
+                    'PySerial version %s found but >= 3.0.0 required.' % serial.VERSION
+                )
+        except Exception as e:
+            serial = False
+            logging_msg = str(e)
+    return bool(serial)
+
+
 ###############################################################################
 # COM ports
 
@@ -172,7 +186,7 @@ class COMDevice(Device):
             elif addr == u'STDIO' or (not addr and val.upper() == u'STDIO'):
                 return SerialStdIO(val.upper() == u'CRLF')
             else:
-                if not serial:
+                if not _import_serial():
                     logging.warning(
                         u'Could not attach %s to COM device. Module `serial` not available: %s',
                         spec, logging_msg
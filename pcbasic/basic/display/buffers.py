@@ -9,12 +9,16 @@ This file is released under the GNU GPL version 3 or later.
 import logging
 from contextlib import contextmanager
 
-from ...compat import PY2, zip, int2byte, iterchar, text_type
+from ...compat import PY2, zip, int2byte, text_type
 from ...compat import iter_chunks
 from ..base import signals
 from ..base.bytematrix import ByteMatrix
+from ..base.outofband import OutOfBand
 
 
+# single-byte characters, to unpack rows without creating new objects
+_BYTE_CHARS = [int2byte(_c) for _c in range(256)]
+
 class _TextRow(object):
     """Buffer for a single row of the screen."""
 
@@ -29,6 +33,22 @@ class _TextRow(object):
         # line continues on next row (either LF or word wrap happened)
         self.wrap = False
 
+    def __getstate__(self):
+        """Pickle the row with characters and attributes packed into bytes."""
+        pickle_dict = self.__dict__.copy()
+        chars = b''.join(self.chars)
+        if len(chars) == len(self.chars):
+            pickle_dict['chars'] = chars
+        pickle_dict['attrs'] = bytes(bytearray(self.attrs))
+        return pickle_dict
+
+    def __setstate__(self, pickle_dict):
+        """Unpickle the row."""
+        self.__dict__.update(pickle_dict)
+        if isinstance(self.chars, bytes):
+            self.chars = list(map(_BYTE_CHARS.__getitem__, bytearray(self.chars)))
+        self.attrs = list(bytearray(self.attrs))
+
 
 class _PixelAccess(object):
     """
@@ -41,6 +61,17 @@ class _PixelAccess(object):
         self._video_buffer = video_buffer
         self._pixels = video_buffer._pixels
 
+    def __getstate__(self):
+        """Pickle the wrapper; the pixel buffer is stored with the VideoBuffer."""
+        return {'_video_buffer': self._video_buffer}
+
+    def __getattr__(self, attr):
+        """Link to the pixel buffer after unpickling."""
+        if attr != '_pixels':
+            raise AttributeError(attr)
+        self._pixels = self._video_buffer._pixels
+        return self._pixels
+
     @property
     def width(self):
         """Width in pixels."""
@@ -72,7 +103,7 @@ class VideoBuffer(object):
 
     def __init__(
             self, queues, pixel_height, pixel_width, height, width,
-            colourmap, attr, font, codepage, do_fullwidth
+            colourmap, attr, font, codepage, do_fullwidth, lazy_pixels=False
         ):
         """Initialise the screen buffer to given dimensions."""
         self._rows = [_TextRow(attr, width) for _ in range(height)]
@@ -88,6 +119,9 @@ class VideoBuffer(object):
         self._pixels = ByteMatrix(pixel_height, pixel_width)
         # with set_attr that calls submit_pixels
         self._pixel_access = _PixelAccess(self)
+        # in text mode, text need not be drawn to pixels until they are requested
+        self._lazy_pixels = lazy_pixels
+        self._pixels_stale = False
         # needed for signals only
         self._queues = queues
         # dirty rectangle collection
@@ -96,6 +130,59 @@ class VideoBuffer(object):
         self._locked = False
         self._visible = False
 
+    def __getstate__(self):
+        """Pickle the buffer; pixels that are only drawn from text on request are not stored."""
+        pickle_dict = self.__dict__.copy()
+        if self._lazy_pixels:
+            pickle_dict['_pixels'] = (self._pixels.height, self._pixels.width)
+            pickle_dict['_pixels_stale'] = True
+        # store the text as out-of-band buffers, so that unchanged pages are not written again
+        chars = b''.join(_c for _row in self._rows for _c in _row.chars)
+        if len(chars) != self._width * self._height:
+            chars = [_row.chars for _row in self._rows]
+        else:
+            chars = OutOfBand(chars)
+        attrs = bytearray(_attr for _row in self._rows for _attr in _row.attrs)
+        pickle_dict['_rows'] = (
+            chars, OutOfBand(attrs), [(_row.length, _row.wrap) for _row in self._rows]
+        )
+        text = [_seq for _row in self._dbcs_text for _seq in _row]
+        pickle_dict['_dbcs_text'] = (
+            OutOfBand(u''.join(text).encode('utf-32-le')), OutOfBand(bytearray(map(len, text)))
+        )
+        return pickle_dict
+
+    def __setstate__(self, pickle_dict):
+        """Unpickle the buffer."""
+        self.__dict__.update(pickle_dict)
+        if not isinstance(self._pixels, ByteMatrix):
+            self._pixels = ByteMatrix(*self._pixels)
+        # older versions stored a list of rows
+        if isinstance(self._rows, tuple):
+            self._unpack_text(*(self._rows + self._dbcs_text))
+
+    def _unpack_text(self, chars, attrs, rows, text, lengths):
+        """Rebuild the text rows from the stored buffers."""
+        width = self._width
+        if not isinstance(chars, list):
+            chars = [
+                list(map(_BYTE_CHARS.__getitem__, chars[_start:_start+width]))
+                for _start in range(0, len(chars), width)
+            ]
+        self._rows = []
+        for row, (row_chars, (length, wrap)) in enumerate(zip(chars, rows)):
+            text_row = _TextRow.__new__(_TextRow)
+            text_row.chars = row_chars
+            text_row.attrs = list(attrs[row*width:(row+1)*width])
+            text_row.length, text_row.wrap = length, wrap
+            self._rows.append(text_row)
+        text = bytes(text).decode('utf-32-le')
+        seqs, start = [], 0
+        for length in lengths:
+            seqs.append(text[start:start+length])
+            start += length
+        self._dbcs_text = [seqs[_start:_start+width] for _start in range(0, len(seqs), width)]
+
     def set_visible(self, visible):
         """Set the vpage flag."""
         if self._visible != visible:
@@ -103,9 +190,22 @@ class VideoBuffer(object):
             if visible:
                 self.resubmit()
 
+    def set_lazy_pixels(self, lazy_pixels):
+        """Only draw text to pixels when requested (text modes with text-only interface)."""
+        self._lazy_pixels = lazy_pixels
+        if not lazy_pixels:
+            self._draw_stale_pixels()
+
+    def _draw_stale_pixels(self):
+        """Draw all text to the pixel buffer if it is out of date."""
+        if self._pixels_stale:
+            self._pixels_stale = False
+            self._draw_text(1, 1, self._height, self._width)
+
     @property
     def pixels(self):
         """Pixel-buffer access."""
+        self._draw_stale_pixels()
         return self._pixel_access
 
     def __repr__(self):
@@ -227,7 +327,10 @@ class VideoBuffer(object):
             dst_row.length = src_row.length
             dst_row.wrap = src_row.wrap
         self._dbcs_text[:] = src._dbcs_text
-        self._pixels[:, :] = src._pixels
+        if self._lazy_pixels:
+            self._pixels_stale = True
+        else:
+            self._pixels[:, :] = src.pixels[:, :]
         self._pixel_access = _PixelAccess(self)
         # resubmit to interface
         self.resubmit()
@@ -344,8 +447,10 @@ class VideoBuffer(object):
             attrs = [_row.attrs[left-1:right] for _row in self._rows[top-1:bottom]]
             x0, y0 = self.text_to_pixel_pos(top, left)
             x1, y1 = self.text_to_pixel_pos(bottom+1, right+1)
+            # text-only interfaces don't use the sprite
+            sprite = None if self._lazy_pixels else self._pixels[y0:y1, x0:x1]
             self._queues.video.put(signals.Event(
-                signals.VIDEO_UPDATE, (top, left, text, attrs, y0, x0, self._pixels[y0:y1, x0:x1])
+                signals.VIDEO_UPDATE, (top, left, text, attrs, y0, x0, sprite)
             ))
 
     ###########################################################################
@@ -381,7 +486,10 @@ class VideoBuffer(object):
         """Update dbcs, write all dirty text rectangles to pixels and submit."""
         for row in sorted(self._dirty_left):
             start, stop = self._refresh_dbcs(row, self._dirty_left[row], self._dirty_right[row])
-            self._draw_text(row, start, row, stop)
+            if self._lazy_pixels:
+                self._pixels_stale = True
+            else:
+                self._draw_text(row, start, row, stop)
             self._submit(row, start, row, stop)
         self._dirty_left = {}
         self._dirty_right = {}
@@ -422,9 +530,12 @@ class VideoBuffer(object):
             start, 1, stop, self._width, attr, adjust_end=True, clear_wrap=True
         )
         # clear pixels
-        x0, y0, x1, y1 = self.text_to_pixel_area(start, 1, stop, self._width)
         _, back, _, _ = self._colourmap.split_attr(attr)
-        self._pixels[y0:y1+1, x0:x1+1] = back
+        if self._lazy_pixels:
+            self._pixels_stale = True
+        else:
+            x0, y0, x1, y1 = self.text_to_pixel_area(start, 1, stop, self._width)
+            self._pixels[y0:y1+1, x0:x1+1] = back
         # submit dirty rects before clear
         self.force_submit()
         # this should only be called on the active page
@@ -490,11 +601,17 @@ class VideoBuffer(object):
         self._dbcs_text[from_row-1:to_row-1] = self._dbcs_text[from_row:to_row]
         self._dbcs_text[to_row-1] = [u' '] * self._width
         # update pixel buffer
+        if self._lazy_pixels:
+            self._pixels_stale = True
+            return
         sx0, sy0, sx1, sy1 = self.text_to_pixel_area(
             from_row+1, 1, to_row, self._width
         )
         tx0, ty0 = self.text_to_pixel_pos(from_row, 1)
         self._pixels.move(sy0, sy1+1, sx0, sx1+1, ty0, tx0)
+        # clear the new empty row, as the interface does
+        x0, y0, x1, y1 = self.text_to_pixel_area(to_row, 1, to_row, self._width)
+        self._pixels[y0:y1+1, x0:x1+1] = back
 
     def scroll_down(self, from_row, to_row, attr):
         """Scroll down by one line, between from_row and to_row, filling empty row with attr."""
@@ -519,8 +636,14 @@ class VideoBuffer(object):
         self._dbcs_text[from_row:to_row] = self._dbcs_text[from_row-1:to_row-1]
         self._dbcs_text[from_row-1] = [u' '] * self._width
         # update pixel buffer
+        if self._lazy_pixels:
+            self._pixels_stale = True
+            return
         sx0, sy0, sx1, sy1 = self.text_to_pixel_area(
             from_row, 1, to_row-1, self._width
         )
         tx0, ty0 = self.text_to_pixel_pos(from_row+1, 1)
         self._pixels.move(sy0, sy1+1, sx0, sx1+1, ty0, tx0)
+        # clear the new empty row, as the interface does
+        x0, y0, x1, y1 = self.text_to_pixel_area(from_row, 1, from_row, self._width)
+        self._pixels[y0:y1+1, x0:x1+1] = back
@@ -57,6 +57,8 @@ class Display(object):
         self.attr = self.mode.attr
         # border attribute
         self._border_attr = 0
+        # text is drawn to pixels in text modes only if the interface displays pixels
+        self._pixel_output = False
         # prepare fonts
         self._fonts = {}
         if fonts:
@@ -225,6 +227,7 @@ class Display(object):
                 self.mode.height, self.mode.width,
                 self.colourmap, self.attr, font, self._codepage,
                 do_fullwidth=(self.mode.is_text_mode and self.mode.font_height >= 14),
+                lazy_pixels=(self.mode.is_text_mode and not self._pixel_output),
             )
             for _pagenum in range(self.mode.num_pages)
         ]
@@ -286,6 +289,12 @@ class Display(object):
         # apparently pcjr always drops to text when this is not a no-op
         self.screen(0, 0, 0, 0, force_reset=True)
 
+    def set_pixel_output(self, pixel_output):
+        """Set whether the interface displays pixels or only text."""
+        self._pixel_output = pixel_output
+        for page in self.pages:
+            page.set_lazy_pixels(self.mode.is_text_mode and not pixel_output)
+
     def rebuild(self):
         """Completely resubmit the screen to the interface."""
         # set the screen mode
@@ -334,6 +343,16 @@ class Display(object):
         else:
             self.colourmap.get_colour_info_byte()
 
+    def get_immutables(self):
+        """Get data that are not changed after initialisation."""
+        # the 8-pixel memory font can be changed through POKE, the other fonts are fixed
+        immutables = self._bios_font_8.get_immutables()
+        immutables.extend(self.memory_font.get_shared_glyphs())
+        for font in self._fonts.values():
+            if font is not self.memory_font:
+                immutables.extend(font.get_immutables())
+        return immutables
+
     @property
     def memory_font(self):
         """8-bit memory font (half in ROM, half in RAM and loadable)."""
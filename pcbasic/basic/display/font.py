@@ -9,6 +9,7 @@ This file is released under the GNU GPL version 3 or later.
 import os
 import logging
 import binascii
+from collections import OrderedDict
 
 from ...compat import iteritems, int2byte, zip
 
@@ -24,6 +25,11 @@ _CARRY_COL_9_BYTES = tuple(range(0xb0, 0xdf+1))
 # ascii codepoints for which to repeat row 8 in row 9 (box drawing)
 _CARRY_ROW_9_BYTES = tuple(range(0xb0, 0xdf+1))
 
+# maximum number of rendered glyphs to keep in the atlas
+_ATLAS_SIZE = 4096
+# maximum number of glyphs to keep for each cell size
+_GLYPH_CACHE_SIZE = 2048
+
 
 class Font(object):
     """Single-height bitfont."""
@@ -44,10 +50,29 @@ class Font(object):
                     'No font dictionary specified and no %d-pixel default available.' % (height,)
                 )
         self._fontdict = fontdict
-        self._glyphs = {}
+        # glyph sets for each (width, height) cell size used so far
+        # least recently used glyphs are dropped and rebuilt from the font dict if needed again
+        self._glyph_sets = {}
+        self._glyphs = self._glyph_sets.setdefault((self._width, self._height), OrderedDict())
+        # rendered glyphs, keyed by char, fullwidth, attribute and cell size
+        self._atlas = OrderedDict()
         self._carry_row_9_chars = [self._byte_to_char(_b) for _b in _CARRY_ROW_9_BYTES]
         self._carry_col_9_chars = [self._byte_to_char(_b) for _b in _CARRY_COL_9_BYTES]
 
+    def __getstate__(self):
+        """Pickle the font; glyphs and sprites are not stored as they are rebuilt when needed."""
+        pickle_dict = self.__dict__.copy()
+        for key in ('_glyph_sets', '_glyphs', '_atlas'):
+            del pickle_dict[key]
+        return pickle_dict
+
+    def __setstate__(self, pickle_dict):
+        """Unpickle the font."""
+        self.__dict__.update(pickle_dict)
+        self._glyph_sets = {}
+        self._glyphs = self._glyph_sets.setdefault((self._width, self._height), OrderedDict())
+        self._atlas = OrderedDict()
+
     @property
     def width(self):
         return self._width
@@ -56,6 +81,17 @@ class Font(object):
     def height(self):
         return self._height
 
+    def get_immutables(self):
+        """Get the glyph data; it can be shared between sessions if the font is not changed."""
+        return [self._fontdict]
+
+    def get_shared_glyphs(self):
+        """Get glyph storage that is not affected when glyphs are changed, if any."""
+        try:
+            return self._fontdict.get_shared()
+        except AttributeError:
+            return []
+
     def copy(self):
         """Make a deep copy."""
         copy = self.__class__(self._height, self._fontdict.copy(), self._codepage)
@@ -67,9 +103,13 @@ class Font(object):
         if self._width != width or self._height != height:
             self._width = width
             self._height = height
-            # build the basic 256 codepage characters
-            for _c in range(256):
-                self._build_glyph(self._byte_to_char(_c), fullwidth=False)
+            try:
+                self._glyphs = self._glyph_sets[(width, height)]
+            except KeyError:
+                self._glyphs = self._glyph_sets[(width, height)] = OrderedDict()
+                # build the basic 256 codepage characters
+                for _c in range(256):
+                    self._build_glyph(self._byte_to_char(_c), fullwidth=False)
         return self
 
     def get_byte(self, byte, offset):
@@ -82,6 +122,11 @@ class Font(object):
         char = self._byte_to_char(byte)
         old = self._fontdict[char]
         self._fontdict[char] = old[:offset%8] + int2byte(byte_value) + old[offset%8+1:]
+        # glyphs for other cell sizes will be rebuilt when needed
+        for glyphs in self._glyph_sets.values():
+            if glyphs is not self._glyphs:
+                glyphs.pop(char, None)
+        # rebuilding replaces the glyph object, which invalidates its atlas entries
         if char in self._glyphs:
             self._build_glyph(char, fullwidth=False)
 
@@ -92,10 +137,12 @@ class Font(object):
     def _get_glyph(self, char, fullwidth):
         """Retrieve a glyph, building if needed."""
         try:
-            return self._glyphs[char]
+            glyph = self._glyphs[char]
         except KeyError:
             self._build_glyph(char, fullwidth)
             return self._glyphs[char]
+        self._glyphs.move_to_end(char)
+        return glyph
 
     def _build_glyph(self, char, fullwidth):
         """Build a glyph for the given unicode character."""
@@ -124,14 +171,41 @@ class Font(object):
         if req_width > glyph.width:
             glyph = _extend_width(glyph, char in self._carry_col_9_chars)
         self._glyphs[char] = glyph
-
-    def render_text(self, unicode_list, attr, back, underline):
-        """Return a sprite, width and height for given row of text."""
-        sprite = self.get_glyphs(unicode_list).render(back, attr)
+        self._glyphs.move_to_end(char)
+        if len(self._glyphs) > _GLYPH_CACHE_SIZE:
+            self._glyphs.popitem(last=False)
+
+    def _get_sprite(self, char, fullwidth, attr, back, underline):
+        """Retrieve a rendered glyph from the atlas, rendering if needed."""
+        glyph = self._get_glyph(char, fullwidth)
+        key = (char, fullwidth, attr, back, underline, self._width, self._height)
+        try:
+            source, sprite = self._atlas[key]
+        except KeyError:
+            pass
+        else:
+            # entries rendered from a since rebuilt glyph are stale
+            if source is glyph:
+                self._atlas.move_to_end(key)
+                return sprite
+        sprite = glyph.render(back, attr)
         if underline:
             sprite[-1:, :] = attr
+        self._atlas[key] = glyph, sprite
+        if len(self._atlas) > _ATLAS_SIZE:
+            self._atlas.popitem(last=False)
         return sprite
 
+    def render_text(self, unicode_list, attr, back, underline):
+        """Return a sprite, width and height for given row of text."""
+        # last character can't be fullwidth as it's not trailed by u''
+        fw_list = (not _next for _next in unicode_list[1:] + [True])
+        # hstack copies the cached sprites, so they can't be changed through the result
+        return bytematrix.hstack(
+            self._get_sprite(_c, _fw, attr, back, underline)
+            for _c, _fw in zip(unicode_list, fw_list) if _c
+        )
+
     def get_glyphs(self, unicode_list):
         """
         Retrieve a row of text as a single matrix [y][x].
@@ -8,15 +8,19 @@ This file is released under the GNU GPL version 3 or later.
 import asyncio
 import inspect
 import time
+import threading
 from queue import Queue
+from collections import deque
 
 from ..compat import queue
 
 from .base import error
 from .base import scancode
 from .base import signals
+from .base import bytematrix
 from .base.eascii import as_bytes as ea
 from .base.eascii import as_unicode as uea
+from .clock import TimeSource
 
 # F12 emulator home-key
 # also f12+b -> ctrl+break
@@ -88,6 +92,278 @@ class NullQueue(object):
         pass
 
 
+# video signals that change the meaning of earlier signals' screen positions
+_VIDEO_BARRIERS = (signals.VIDEO_SET_MODE, signals.VIDEO_SCROLL, signals.VIDEO_CLEAR_ROWS)
+
+
+class VideoQueue(object):
+    """
+    Video queue that coalesces signals superseded before the interface gets to them.
+    Screen updates covered by a later update are dropped and adjacent updates on the same rows
+    are merged; only the latest cursor move is kept. Clearing rows and mode changes are never
+    reordered or merged. Consecutive scrolls of the same region are merged into one scroll by
+    several rows, which video plugins perform in one go; the updates queued in between are moved
+    along with the scroll.
+    If maxsize is given, put() waits for the interface to retrieve signals when the queue is full.
+    """
+
+    def __init__(self, maxsize=0):
+        """Initialise the queue."""
+        self.maxsize = maxsize
+        # queued signals; superseded signals are replaced with None until they are retrieved
+        self._signals = deque()
+        self._count = 0
+        # positions count all signals ever queued, so that they stay valid when signals are retrieved
+        # position of the oldest signal in the deque
+        self._head = 0
+        # position of the first signal after the last barrier; only later signals can be coalesced
+        self._segment_start = 0
+        # positions of the updates in the segment, by top row
+        self._update_rows = {}
+        self._last_update = None
+        self._last_cursor = None
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def qsize(self):
+        """Number of queued signals."""
+        return self._count
+
+    def empty(self):
+        return not self._count
+
+    def full(self):
+        return 0 < self.maxsize <= self._count
+
+    def put(self, item, block=True, timeout=None):
+        """Queue a signal, coalescing with queued signals where possible."""
+        with self._not_empty:
+            if self.full():
+                if not block or not self._not_empty.wait_for(lambda: not self.full(), timeout):
+                    raise queue.Full()
+            if item.event_type == signals.VIDEO_UPDATE:
+                self._put_update(item)
+            elif item.event_type == signals.VIDEO_MOVE_CURSOR:
+                self._remove(self._last_cursor)
+                self._last_cursor = self._append(item)
+            elif item.event_type == signals.VIDEO_SCROLL and self._merge_scroll(item):
+                pass
+            else:
+                self._append(item)
+                if item.event_type in _VIDEO_BARRIERS:
+                    self._start_segment()
+            self._not_empty.notify_all()
+
+    def put_nowait(self, item):
+        self.put(item, False)
+
+    def get(self, block=True, timeout=None):
+        """Retrieve the oldest queued signal."""
+        with self._not_empty:
+            if block and not self._count:
+                self._not_empty.wait_for(lambda: self._count, timeout)
+            if not self._count:
+                raise queue.Empty()
+            signal = None
+            while signal is None:
+                signal = self._signals.popleft()
+                self._head += 1
+            self._count -= 1
+            self._not_empty.notify_all()
+            return signal
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def get_frame(self):
+        """Retrieve all queued signals as one consolidated frame."""
+        with self._not_empty:
+            frame = [_signal for _signal in self._signals if _signal is not None]
+            self._head += len(self._signals)
+            self._signals.clear()
+            self._count = 0
+            self._start_segment()
+            self._not_empty.notify_all()
+        return frame
+
+    def task_done(self):
+        pass
+
+    def join(self):
+        pass
+
+    def _get_at(self, position):
+        """Signal at the given position, or None if it has been retrieved or superseded."""
+        if position is None or position < max(self._head, self._segment_start):
+            return None
+        return self._signals[position - self._head]
+
+    def _append(self, item):
+        """Queue a signal and return its position."""
+        self._signals.append(item)
+        self._count += 1
+        return self._head + len(self._signals) - 1
+
+    def _remove(self, position):
+        """Drop a superseded signal."""
+        if self._get_at(position) is not None:
+            self._signals[position - self._head] = None
+            self._count -= 1
+
+    def _start_segment(self):
+        """Start a new segment after a barrier."""
+        self._segment_start = self._head + len(self._signals)
+        self._update_rows = {}
+        self._last_update = None
+        self._last_cursor = None
+
+    def _put_update(self, item):
+        """Queue a screen update, dropping or merging updates it supersedes."""
+        top, _, text = item.params[:3]
+        if not text or not text[0]:
+            self._append(item)
+            return
+        # any update covered by this one starts on one of its rows
+        for row in range(top, top + len(text)):
+            positions = self._update_rows.get(row)
+            if positions:
+                for position in positions:
+                    old = self._get_at(position)
+                    if old is not None and _covers(item, old):
+                        self._remove(position)
+                self._update_rows[row] = [
+                    _pos for _pos in positions if self._get_at(_pos) is not None
+                ]
+        # merge into the last queued update; its position is kept as later signals don't
+        # change the screen contents
+        last = self._get_at(self._last_update)
+        if last is not None:
+            merged = _merge_updates(last, item)
+            if merged:
+                self._signals[self._last_update - self._head] = merged
+                return
+        self._last_update = self._append(item)
+        self._update_rows.setdefault(top, []).append(self._last_update)
+
+    def _merge_scroll(self, item):
+        """Merge a scroll into the last barrier if it scrolled the same region the same way."""
+        barrier = self._segment_start - 1
+        last = self._signals[barrier - self._head] if barrier >= self._head else None
+        if (
+                last is None or last.event_type != signals.VIDEO_SCROLL
+                or last.params[1:] != item.params[1:] or last.params[0] * item.params[0] < 0
+            ):
+            return False
+        direction, from_row, to_row, _ = item.params
+        segment = list(self._signals)[self._segment_start - self._head:]
+        shifted = [_shift_signal(_signal, direction, from_row, to_row) for _signal in segment]
+        if False in shifted:
+            return False
+        # scrolling by more rows than the region holds just clears it
+        rows = min(abs(last.params[0] + direction), to_row - from_row + 1)
+        self._signals[barrier - self._head] = signals.Event(
+            signals.VIDEO_SCROLL, (rows if direction > 0 else -rows,) + last.params[1:]
+        )
+        # requeue the segment, dropping signals scrolled out of view
+        for signal in segment:
+            self._signals.pop()
+            self._count -= signal is not None
+        last_update, last_cursor = self._last_update, self._last_cursor
+        self._start_segment()
+        for signal in shifted:
+            if signal is None:
+                self._signals.append(None)
+                continue
+            position = self._append(signal)
+            if signal.event_type == signals.VIDEO_UPDATE and signal.params[2] and signal.params[2][0]:
+                self._update_rows.setdefault(signal.params[0], []).append(position)
+        # the signals at these positions are gone if they were scrolled out of view
+        self._last_update, self._last_cursor = last_update, last_cursor
+        return True
+
+
+def _shift_signal(signal, direction, from_row, to_row):
+    """
+    Move a queued signal along with a scroll by one row.
+    Return None if it is scrolled out of view and False if it can't be moved.
+    """
+    if signal is None:
+        return None
+    if signal.event_type == signals.VIDEO_MOVE_CURSOR:
+        row = signal.params[0]
+        if not from_row <= row <= to_row:
+            return signal
+        if not from_row <= row + direction <= to_row:
+            return False
+        return signals.Event(signal.event_type, (row + direction,) + signal.params[1:])
+    if signal.event_type != signals.VIDEO_UPDATE:
+        return signal
+    top, left, text, attrs, y0, x0, sprite = signal.params
+    bottom = top + len(text) - 1
+    if bottom < from_row or top > to_row:
+        return signal
+    if top < from_row or bottom > to_row:
+        return False
+    if top + direction < from_row or bottom + direction > to_row:
+        # scrolled out of view; updates that are only partly out of view are not moved
+        return None if len(text) == 1 else False
+    if sprite is not None:
+        cell_height = sprite.height // len(text)
+    elif top > 1:
+        cell_height = y0 // (top - 1)
+    else:
+        return False
+    return signals.Event(
+        signals.VIDEO_UPDATE,
+        (top + direction, left, text, attrs, y0 + direction * cell_height, x0, sprite)
+    )
+
+
+def _covers(new, old):
+    """Update signal new overwrites all of signal old."""
+    if old.event_type != signals.VIDEO_UPDATE:
+        return False
+    top, left, text = new.params[:3]
+    old_top, old_left, old_text = old.params[:3]
+    return (
+        top <= old_top and old_top + len(old_text) <= top + len(text)
+        and left <= old_left and old_left + len(old_text[0]) <= left + len(text[0])
+    )
+
+def _merge_updates(old, new):
+    """Merge two updates of the same rows and adjacent or overlapping columns, or return None."""
+    old_top, old_left, old_text, old_attrs, old_y0, old_x0, old_sprite = old.params
+    top, left, text, attrs, y0, x0, sprite = new.params
+    old_right, right = old_left + len(old_text[0]) - 1, left + len(text[0]) - 1
+    if (
+            old_top != top or len(old_text) != len(text)
+            or old_right < left - 1 or right < old_left - 1
+            or (old_sprite is None) != (sprite is None)
+        ):
+        return None
+    # columns of the old update on either side of the new one
+    head, tail = max(0, left - old_left), max(0, old_right - right)
+    text = [
+        _old[:head] + _new + _old[len(_old)-tail:]
+        for _old, _new in zip(old_text, text)
+    ]
+    attrs = [
+        _old[:head] + _new + _old[len(_old)-tail:]
+        for _old, _new in zip(old_attrs, attrs)
+    ]
+    if sprite is not None:
+        if old_sprite.height != sprite.height:
+            return None
+        cell_width = sprite.width // (right - left + 1)
+        sprite = bytematrix.hstack((
+            old_sprite[:, :head*cell_width],
+            sprite,
+            old_sprite[:, old_sprite.width-tail*cell_width:],
+        ))
+    return signals.Event(
+        signals.VIDEO_UPDATE, (top, min(left, old_left), text, attrs, y0, min(x0, old_x0), sprite)
+    )
+
+
 class EventQueues(object):
     """Manage interface queues."""
 
@@ -96,8 +372,10 @@ class EventQueues(object):
 
     # max_audio_qsize = 20
 
-    def __init__(self, ctrl_c_is_break, inputs=None, video=None, audio=None):
+    def __init__(self, ctrl_c_is_break, inputs=None, video=None, audio=None, time_source=None):
         """Initialise; default is NullQueues."""
+        # real or virtual time to wait on
+        self._time = time_source or TimeSource()
         # input signal handlers
         self._handlers = []
         # basic event handlers
@@ -133,6 +411,9 @@ class EventQueues(object):
     def __setstate__(self, pickle_dict):
         """Set to null queues on unpickling."""
         self.__dict__.update(pickle_dict)
+        if '_time' not in pickle_dict:
+            # stored by an older version, which always ran in real time
+            self._time = TimeSource()
         self.set()
 
     def add_handler(self, handler):
@@ -143,9 +424,14 @@ class EventQueues(object):
         """Set the handlers for BASIC events."""
         self._basic_handlers = tuple(event_check_input)
 
+    def get_cpu_time(self):
+        """Processor time used by the interpreter thread."""
+        return time.thread_time()
+
     def wait(self):
         """Wait and check events."""
-        time.sleep(self.tick)
+        # in virtual time, sleep(0) still releases the GIL to the input threads
+        time.sleep(self._time.skip(self.tick))
         self.check_events()
 
     def check_events(self):
@@ -172,7 +458,8 @@ class EventQueues(object):
         # or if it held the GIL for a full cycle
         # wait to for the queue to drain if it excceds a threshold value
         # this allows the interface to catch up with video updates
-        if self.video.qsize() > self.max_video_qsize:
+        # a bounded VideoQueue throttles the interpreter in put() instead
+        if not isinstance(self.video, VideoQueue) and self.video.qsize() > self.max_video_qsize:
             while self.video.qsize():
                 time.sleep(self.tick)
         self._check_input()
@@ -261,6 +548,37 @@ class EventQueues(object):
 
 
 class EventQueuesAsync(EventQueues):
+    """Manage interface queues in an asyncio event loop."""
+
+    def __init__(self, ctrl_c_is_break, inputs=None, video=None, audio=None, time_source=None):
+        """Initialise; default is NullQueues."""
+        # statements to run, and seconds to run for, before yielding to other tasks
+        self._slice_statements = 1
+        self._slice_seconds = None
+        self._slice_count = 0
+        self._slice_start = 0.
+        # a nonblocking keyboard read has asked for a wait at the next statement
+        self._wait_pending = False
+        # set when keystrokes are inserted without passing through the input queue
+        self._wakeup = asyncio.Event()
+        # accounting of statements run and processor time used
+        self.statements = 0
+        self.cpu_time = 0.
+        self._clock_start = None
+        super().__init__(ctrl_c_is_break, inputs, video, audio, time_source)
+
+    def __getstate__(self):
+        """Don't pickle queues or asyncio primitives."""
+        pickle_dict = super().__getstate__()
+        pickle_dict['_wakeup'] = None
+        pickle_dict['_clock_start'] = None
+        return pickle_dict
+
+    def __setstate__(self, pickle_dict):
+        """Set to null queues on unpickling."""
+        super().__setstate__(pickle_dict)
+        self._wakeup = asyncio.Event()
+
     def set(self, inputs=None, video=None, audio=None):
         """Set; default is NullQueues."""
         super().set(inputs, video, audio)
@@ -277,11 +595,90 @@ class EventQueuesAsync(EventQueues):
             self.inputs.put_wait = self.inputs.put
             self.inputs.put = self.inputs.put_nowait
 
+    def set_slice(self, statements=1, seconds=None):
+        """Set the number of statements and/or seconds to run before yielding to other tasks."""
+        self._slice_statements = max(1, statements or 1)
+        self._slice_seconds = seconds
+        self._slice_count = 0
+        self._slice_start = time.perf_counter()
+
+    def start_clock(self):
+        """Start accounting processor time to this session."""
+        self._clock_start = time.thread_time()
+
+    @property
+    def clock_running(self):
+        """Processor time is being accounted to this session."""
+        return self._clock_start is not None
+
+    def stop_clock(self):
+        """Stop accounting processor time to this session."""
+        if self._clock_start is not None:
+            self.cpu_time += time.thread_time() - self._clock_start
+            self._clock_start = None
+
+    def get_cpu_time(self):
+        """Processor time accounted to this session."""
+        if self._clock_start is None:
+            return self.cpu_time
+        return self.cpu_time + time.thread_time() - self._clock_start
+
+    def wake(self):
+        """Wake up from waiting for input."""
+        self._wakeup.set()
+
+    def defer_wait(self):
+        """Wait for a tick or for input at the start of the next statement."""
+        self._wait_pending = True
+
+    async def _suspend(self, awaitable):
+        """Yield to other tasks until awaitable completes; processor time is not accounted."""
+        running = self._clock_start is not None
+        self.stop_clock()
+        try:
+            return await awaitable
+        finally:
+            if running:
+                self.start_clock()
+            # start a new time slice
+            self._slice_count = 0
+            if self._slice_seconds:
+                self._slice_start = time.perf_counter()
+
+    async def _sleep(self, delay):
+        """Sleep, yielding to other tasks."""
+        await self._suspend(asyncio.sleep(delay))
+
     async def wait(self):
         """Wait and check events."""
-        await asyncio.sleep(self.tick)
+        await self._sleep(self._time.skip(self.tick))
         await self.check_events()
 
+    async def wait_input(self, timeout=None):
+        """Sleep until input arrives or timeout expires, then check events."""
+        if not isinstance(self.inputs, asyncio.Queue):
+            await self._sleep(self._time.skip(self.tick if timeout is None else timeout))
+            await self._process_events()
+            return
+        if timeout is not None:
+            timeout = self._time.skip(timeout)
+        self._wakeup.clear()
+        getter = asyncio.ensure_future(self.inputs.get())
+        waker = asyncio.ensure_future(self._wakeup.wait())
+        try:
+            await self._suspend(asyncio.wait(
+                (getter, waker), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            ))
+        finally:
+            waker.cancel()
+            # cancelling a pending get leaves the item on the queue
+            if not getter.done():
+                getter.cancel()
+        if getter.done() and not getter.cancelled():
+            self.inputs.task_done()
+            await self._handle_input(getter.result())
+        await self._process_events()
+
     async def check_events(self):
         """Main event cycle."""
         # sleep(0) is needed for responsiveness, e.g. event trapping in programs with tight loops
@@ -289,11 +686,29 @@ class EventQueuesAsync(EventQueues):
         # this also allows the screen to update between statements
         # it does slow the interpreter down by about 20% in FOR loops
         # note that we always have an input queue, either for the interface of for iostreams
-        await asyncio.sleep(0)
+        await self._sleep(0)
+        await self._process_events()
+
+    async def check_statement_events(self):
+        """Event cycle at the start of a statement; yield only once the time slice is used up."""
+        self.statements += 1
+        self._slice_count += 1
+        if self._wait_pending:
+            # INKEY$ was polled; sleep a tick, but wake up on input
+            self._wait_pending = False
+            await self.wait_input(self.tick)
+            return
+        if self._slice_count >= self._slice_statements or (
+                self._slice_seconds and time.perf_counter() - self._slice_start >= self._slice_seconds
+            ):
+            await self._sleep(0)
+        await self._process_events()
 
-        if self.video.qsize() > self.max_video_qsize:
+    async def _process_events(self):
+        """Wait for the video queue to drain and handle input events."""
+        if not isinstance(self.video, VideoQueue) and self.video.qsize() > self.max_video_qsize:
             while self.video.qsize():
-                await asyncio.sleep(self.tick)
+                await self._sleep(self.tick)
         await self._check_input()
 
     async def _check_input(self):
@@ -304,7 +719,7 @@ class EventQueuesAsync(EventQueues):
                 signal = self.inputs.get_nowait()
             except asyncio.QueueEmpty:
                 if self._pause:
-                    await asyncio.sleep(self.tick)
+                    await self._sleep(self.tick)
                     continue
                 else:
                     # we still need to handle basic events: not all are inputs
@@ -312,18 +727,22 @@ class EventQueuesAsync(EventQueues):
                         e.check_input(signals.Event(None))
                     break
             self.inputs.task_done()
-            # effect replacements
-            self._replace_inputs(signal)
-            # handle input events
-            for handle_input in (
-                    [self._handle_non_trappable_interrupts] +
-                    [e.check_input for e in self._basic_handlers] +
-                    [self._handle_trappable_interrupts] +
-                    [e.check_input for e in self._handlers]
-            ):
-                res = handle_input(signal)
-                if inspect.iscoroutine(res):
-                    res = await res
-
-                if res:
-                    break
+            await self._handle_input(signal)
+
+    async def _handle_input(self, signal):
+        """Handle an input event."""
+        # effect replacements
+        self._replace_inputs(signal)
+        # handle input events
+        for handle_input in (
+                [self._handle_non_trappable_interrupts] +
+                [e.check_input for e in self._basic_handlers] +
+                [self._handle_trappable_interrupts] +
+                [e.check_input for e in self._handlers]
+        ):
+            res = handle_input(signal)
+            if inspect.iscoroutine(res):
+                res = await res
+
+            if res:
+                break
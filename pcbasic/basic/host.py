@@ -0,0 +1,84 @@
+"""
+PC-BASIC - host.py
+Run many asynchronous sessions in one event loop
+
+(c) 2013--2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+from collections import namedtuple
+
+from .api import SessionAsync
+
+
+# statements run and processor time used by a hosted session
+Usage = namedtuple('Usage', ('statements', 'cpu_time'))
+
+
+class SessionHost(object):
+    """Run asynchronous sessions side by side, with cooperative time slicing."""
+
+    def __init__(self, statements=100, seconds=None):
+        """Set the default time slice: statements and/or seconds to run before yielding."""
+        self._statements = statements
+        self._seconds = seconds
+        self._sessions = []
+
+    def __enter__(self):
+        """Context guard."""
+        return self
+
+    def __exit__(self, ex_type, ex_val, tb):
+        """Context guard."""
+        self.close()
+
+    @property
+    def sessions(self):
+        """Sessions on this host."""
+        return tuple(self._sessions)
+
+    async def add_session(self, session=None, statements=None, seconds=None, **kwargs):
+        """Start a session on this host; keyword arguments are used to create a new session."""
+        if session is None:
+            # don't let hosted sessions fight over the standard streams
+            kwargs.setdefault('input_streams', None)
+            kwargs.setdefault('output_streams', None)
+            session = SessionAsync(**kwargs)
+        await session.start_async()
+        session._impl.queues.set_slice(
+            statements or self._statements, seconds if seconds is not None else self._seconds
+        )
+        self._sessions.append(session)
+        return session
+
+    def remove_session(self, session):
+        """Remove a session from this host and close it."""
+        self._sessions.remove(session)
+        session.close()
+
+    def close(self):
+        """Close all sessions."""
+        while self._sessions:
+            self.remove_session(self._sessions[-1])
+
+    async def run(self, session, coroutine):
+        """Run a session operation, accounting the processor time it uses to the session."""
+        queues = session._impl.queues
+        queues.start_clock()
+        try:
+            return await coroutine
+        finally:
+            queues.stop_clock()
+
+    async def execute(self, session, command, as_type=None):
+        """Execute a BASIC statement in a session."""
+        return await self.run(session, session.execute(command, as_type))
+
+    async def interact(self, session):
+        """Run an interactive session."""
+        return await self.run(session, session.interact())
+
+    def get_usage(self, session):
+        """Get the number of statements run and processor time used by a session."""
+        queues = session._impl.queues
+        return Usage(queues.statements, queues.cpu_time)
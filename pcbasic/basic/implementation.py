@@ -53,13 +53,13 @@ class Implementation(object):
             codepage=None, box_protect=True, font=None, text_width=80,
             video=u'cga', monitor=u'rgb',
             devices=None, current_device=u'Z:',
-            textfile_encoding=None, soft_linefeed=False,
+            textfile_encoding=None, soft_linefeed=False, mmap_files=False,
             check_keybuffer_full=True, ctrl_c_is_break=True,
             hide_listing=None, hide_protected=False,
             peek_values=None, allow_code_poke=False, rebuild_offsets=True,
             max_memory=65534, reserved_memory=3429, video_memory=262144,
             serial_buffer_size=128, max_reclen=128, max_files=3,
-            extension=()
+            extension=(), virtual_clock=False
     ):
         """Initialise the interpreter session."""
         ######################################################################
@@ -90,9 +90,9 @@ class Implementation(object):
         self.scalars = self.memory.scalars
         self.arrays = self.memory.arrays
         # prepare tokeniser
-        token_keyword = tk.TokenKeywordDict(syntax)
-        self.tokeniser = converter.Tokeniser(self.values, token_keyword)
-        self.lister = converter.Lister(self.values, token_keyword)
+        self._token_keyword = tk.TokenKeywordDict(syntax)
+        self.tokeniser = converter.Tokeniser(self.values, self._token_keyword)
+        self.lister = converter.Lister(self.values, self._token_keyword)
         # initialise the program
         bytecode = codestream.TokenisedStream(self.memory.code_start)
         self.program = program.Program(
@@ -107,15 +107,19 @@ class Implementation(object):
         ######################################################################
         # prepare codepage
         self.codepage = cp.Codepage(codepage, box_protect)
+        # real time, or virtual time that skips waits
+        self.time_source = clock.TimeSource(virtual_clock)
         # set up input event handler
         # no interface yet; use dummy queues
-        self.queues = eventcycle.EventQueues(ctrl_c_is_break, inputs=queue.Queue())
+        self.queues = eventcycle.EventQueues(
+            ctrl_c_is_break, inputs=queue.Queue(), time_source=self.time_source
+        )
         # prepare I/O streams
         self.io_streams = iostreams.IOStreams(self.queues, self.codepage)
         self.io_streams.add_pipes(input=input_streams)
         self.io_streams.add_pipes(output=output_streams)
         # initialise sound queue
-        self.sound = sound.Sound(self.queues, self.values, self.memory, syntax)
+        self.sound = sound.Sound(self.queues, self.values, self.memory, syntax, self.time_source)
         # initialise video
         self.display = display.Display(
             self.queues, self.values, self.queues,
@@ -153,7 +157,7 @@ class Implementation(object):
             self.values, self.memory, self.queues, self.keyboard, self.display, self.console,
             max_files, max_reclen, serial_buffer_size,
             devices, current_device,
-            self.codepage, textfile_encoding, soft_linefeed
+            self.codepage, textfile_encoding, soft_linefeed, mmap_files
         )
         # enable printer echo from console
         self.console.set_lpt1_file(self.files.lpt1_file)
@@ -171,7 +175,7 @@ class Implementation(object):
         # initialise random number generator
         self.randomiser = values.Randomiser(self.values)
         # initialise system clock
-        self.clock = clock.Clock(self.values)
+        self.clock = clock.Clock(self.values, self.time_source)
 
         ######################################################################
         # register input event handlers
@@ -228,6 +232,9 @@ class Implementation(object):
     def __setstate__(self, pickle_dict):
         """Unpickle and resume the session."""
         self.__dict__.update(pickle_dict)
+        if 'time_source' not in pickle_dict:
+            # stored by an older version
+            self.time_source = self.queues._time
         # re-assign callbacks (not picklable)
         self.parser.init_callbacks(self)
         # reopen keyboard, in case we quit because it was closed
@@ -236,10 +243,18 @@ class Implementation(object):
         if not self.interpreter.parse_mode:
             self._prompt = False
 
+    def get_immutables(self):
+        """Get objects that are not changed after initialisation; cloned sessions can share these."""
+        return [
+            self.codepage, self._token_keyword.to_keyword, self._token_keyword.to_token
+        ] + self.display.get_immutables()
+
     def attach_interface(self, interface=None):
         """Attach interface to interpreter session."""
         if interface:
             self.queues.set(*interface.get_queues())
+            # text-only interfaces don't need text to be drawn to pixels
+            self.display.set_pixel_output(getattr(interface, 'graphical', True))
             # rebuild the screen
             self.display.rebuild()
             # rebuild audio queues
@@ -248,6 +263,7 @@ class Implementation(object):
             # use dummy video & audio queues if not provided
             # but an input queue should be operational for I/O streams
             self.queues.set(inputs=queue.Queue())
+            self.display.set_pixel_output(False)
 
     def execute(self, command):
         """Execute a BASIC statement."""
@@ -323,6 +339,8 @@ class Implementation(object):
                     self._auto_step()
                 else:
                     self._show_prompt()
+                    if self.interpreter.checkpoint:
+                        self.interpreter.checkpoint()
                     # input loop, checks events
                     line = self.console.read_line(is_input=False)
                     self._prompt = not self._store_line(line)
@@ -901,13 +919,13 @@ class ImplementationAsync(Implementation):
             codepage=None, box_protect=True, font=None, text_width=80,
             video=u'cga', monitor=u'rgb',
             devices=None, current_device=u'Z:',
-            textfile_encoding=None, soft_linefeed=False,
+            textfile_encoding=None, soft_linefeed=False, mmap_files=False,
             check_keybuffer_full=True, ctrl_c_is_break=True,
             hide_listing=None, hide_protected=False,
             peek_values=None, allow_code_poke=False, rebuild_offsets=True,
             max_memory=65534, reserved_memory=3429, video_memory=262144,
             serial_buffer_size=128, max_reclen=128, max_files=3,
-            extension=(), **kwargs
+            extension=(), virtual_clock=False, **kwargs
     ):
         ######################################################################
         # data segment
@@ -923,9 +941,9 @@ class ImplementationAsync(Implementation):
         self.scalars = self.memory.scalars
         self.arrays = self.memory.arrays
         # prepare tokeniser
-        token_keyword = tk.TokenKeywordDict(syntax)
-        self.tokeniser = converter.Tokeniser(self.values, token_keyword)
-        self.lister = converter.Lister(self.values, token_keyword)
+        self._token_keyword = tk.TokenKeywordDict(syntax)
+        self.tokeniser = converter.Tokeniser(self.values, self._token_keyword)
+        self.lister = converter.Lister(self.values, self._token_keyword)
         # initialise the program
         bytecode = codestream.TokenisedStream(self.memory.code_start)
         self.program = program.Program(
@@ -940,15 +958,21 @@ class ImplementationAsync(Implementation):
         ######################################################################
         # prepare codepage
         self.codepage = cp.Codepage(codepage, box_protect)
+        # real time, or virtual time that skips waits
+        self.time_source = clock.TimeSource(virtual_clock)
         # set up input event handler
         # no interface yet; use dummy queues
-        self.queues = eventcycle.EventQueuesAsync(ctrl_c_is_break, inputs=asyncio.Queue())
+        self.queues = eventcycle.EventQueuesAsync(
+            ctrl_c_is_break, inputs=asyncio.Queue(), time_source=self.time_source
+        )
         # prepare I/O streams
         self.io_streams = iostreams.IOStreamsAsync(self.queues, self.codepage)
         await self.io_streams.add_pipes(input=input_streams)
         await self.io_streams.add_pipes(output=output_streams)
         # initialise sound queue
-        self.sound = sound.SoundAsync(self.queues, self.values, self.memory, syntax)
+        self.sound = sound.SoundAsync(
+            self.queues, self.values, self.memory, syntax, self.time_source
+        )
         # initialise video
         self.display = display.DisplayAsync(
             self.queues, self.values, self.queues,
@@ -987,7 +1011,7 @@ class ImplementationAsync(Implementation):
             self.values, self.memory, self.queues, self.keyboard, self.display, self.console,
             max_files, max_reclen, serial_buffer_size,
             devices, current_device,
-            self.codepage, textfile_encoding, soft_linefeed
+            self.codepage, textfile_encoding, soft_linefeed, mmap_files
         )
         # enable printer echo from console
         self.console.set_lpt1_file(self.files.lpt1_file)
@@ -1005,7 +1029,7 @@ class ImplementationAsync(Implementation):
         # initialise random number generator
         self.randomiser = values.Randomiser(self.values)
         # initialise system clock
-        self.clock = clock.Clock(self.values)
+        self.clock = clock.Clock(self.values, self.time_source)
 
         ######################################################################
         # register input event handlers
@@ -1032,7 +1056,7 @@ class ImplementationAsync(Implementation):
         # interpreter
         ######################################################################
         # initialise the parser
-        self.parser = parser.Parser(self.values, self.memory, syntax)
+        self.parser = parser.ParserAsync(self.values, self.memory, syntax)
         # initialise the interpreter
         self.interpreter = interpreter.InterpreterAsync(
             self.queues, self.console, self.display.cursor, self.files, self.sound,
@@ -1065,6 +1089,8 @@ class ImplementationAsync(Implementation):
                     await self._auto_step()
                 else:
                     self._show_prompt()
+                    if self.interpreter.checkpoint:
+                        self.interpreter.checkpoint()
                     # input loop, checks events
                     line = await self.console.read_line(is_input=False)
                     self._prompt = not self._store_line(line)
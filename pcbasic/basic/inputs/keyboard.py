@@ -409,6 +409,22 @@ class Keyboard(object):
 class KeyboardAsync(Keyboard):
     _queues: 'EventQueuesAsync'
 
+    def inject_keystrokes(self, keystring):
+        """Insert eascii/unicode string into keyboard buffer."""
+        super().inject_keystrokes(keystring)
+        # wake up if we're waiting for input
+        self._queues.wake()
+
+    def inkey_(self, args):
+        """INKEY$: read one byte from keyboard or stream; nonblocking."""
+        list(args)
+        # we can't wait here; wait a tick at the next statement to reduce load in loops
+        self._queues.defer_wait()
+        inkey = self._read_kybd_byte()
+        if not inkey and self._stream_buffer:
+            inkey = self._stream_buffer.popleft()
+        return self._values.new_string().from_str(inkey)
+
     async def read_bytes_block(self, n):
         """Read bytes from keyboard or stream; blocking."""
         word = []
@@ -449,7 +465,8 @@ class KeyboardAsync(Keyboard):
                 keyboard_only or (not self._input_closed and not self._stream_buffer)
         )
         ):
-            await self._queues.wait()
+            # sleep until woken by input
+            await self._queues.wait_input()
 
     async def get_fullchar_block(self, expand=True):
         """Read one (sbcs or dbcs) full character; blocking."""
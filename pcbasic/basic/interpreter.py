@@ -13,6 +13,7 @@ from .base import tokens as tk
 from .base.tokens import DIGITS
 from .base import codestream
 from . import values
+from .quotas import Quotas
 from .parser.statements import ParserAsync
 
 
@@ -57,22 +58,37 @@ class Interpreter(object):
         self.set_parse_mode(False)
         # additional operations on program step (debugging)
         self.step = lambda token: None
+        # function to save a checkpoint between statements, or None
+        self.checkpoint = None
+        # checkpoint is being saved before the current statement is executed
+        self._at_statement_start = False
+        # limits on statements, time and memory used by a command run
+        self.quotas = Quotas(queues, memory)
 
     def __getstate__(self):
         """Pickle."""
         pickle_dict = self.__dict__.copy()
         # functions can't be pickled
         pickle_dict['step'] = None
+        pickle_dict['checkpoint'] = None
         return pickle_dict
 
     def __setstate__(self, pickle_dict):
         """Unpickle."""
         self.__dict__.update(pickle_dict)
         self.step = lambda token: None
+        # not stored by older versions; the session re-attaches its checkpointer
+        self.checkpoint = None
+        if 'quotas' not in pickle_dict:
+            # stored by an older version
+            self.quotas = Quotas(self._queues, self._memory)
         # go to start of statement on resume
         ins = self.get_codestream()
         ins.seek(self.current_statement)
-        if not self.parser.redo_on_break:
+        if pickle_dict.get('_at_statement_start'):
+            # checkpoint saved between statements, execute the current statement
+            self._at_statement_start = False
+        elif not self.parser.redo_on_break:
             # parse line number or : at start of statement
             if ins.read(1) in tk.END_LINE:
                 # line number marker, new statement
@@ -99,6 +115,12 @@ class Interpreter(object):
                 self.handle_basic_events()
                 ins = self.get_codestream()
                 self.current_statement = ins.tell()
+                if self.checkpoint:
+                    self._at_statement_start = True
+                    self.checkpoint()
+                    self._at_statement_start = False
+                if self.quotas.active:
+                    self._check_quotas()
                 c = ins.skip_blank_read()
                 # parse line number or : at start of statement
                 if c in tk.END_LINE:
@@ -129,17 +151,28 @@ class Interpreter(object):
         """Run commands until control returns to user."""
         if not self.parse_mode:
             return
+        self.quotas.reset()
         try:
             # parse until break or end
             self.parse()
         except error.Break as e:
             self._sound.stop_all_sound()
             self._handle_break(e)
+        finally:
+            self.quotas.end()
         # move pointer to the start of direct line (for both on and off!)
         self.set_pointer(False, 0)
         # return control to user
         self.set_parse_mode(False)
 
+    def _check_quotas(self):
+        """Stop if a limit is exceeded; a break is continued at the current statement."""
+        try:
+            self.quotas.check()
+        except error.Break:
+            self.parser.redo_on_break = True
+            raise
+
     def set_parse_mode(self, on):
         """Enter or exit parse mode."""
         self.parse_mode = on
@@ -767,11 +800,17 @@ class InterpreterAsync(Interpreter):
             # update what basic events need to be handled
             self._queues.set_basic_event_handlers(self._basic_events.enabled)
             # check input and BASIC events. may raise Break, Reset or Exit
-            await self._queues.check_events()
+            await self._queues.check_statement_events()
             try:
                 self.handle_basic_events()
                 ins = self.get_codestream()
                 self.current_statement = ins.tell()
+                if self.checkpoint:
+                    self._at_statement_start = True
+                    self.checkpoint()
+                    self._at_statement_start = False
+                if self.quotas.active:
+                    self._check_quotas()
                 c = ins.skip_blank_read()
                 # parse line number or : at start of statement
                 if c in tk.END_LINE:
@@ -804,12 +843,21 @@ class InterpreterAsync(Interpreter):
         """Run commands until control returns to user."""
         if not self.parse_mode:
             return
+        # account processor time while running, if we're not hosted
+        own_clock = not self._queues.clock_running
+        if own_clock:
+            self._queues.start_clock()
+        self.quotas.reset()
         try:
             # parse until break or end
             await self.parse()
         except error.Break as e:
             self._sound.stop_all_sound()
             self._handle_break(e)
+        finally:
+            self.quotas.end()
+            if own_clock:
+                self._queues.stop_clock()
         # move pointer to the start of direct line (for both on and off!)
         self.set_pointer(False, 0)
         # return control to user
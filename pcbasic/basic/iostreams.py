@@ -200,6 +200,32 @@ class IOStreams(object):
 
 
 class IOStreamsAsync(IOStreams):
+    """Manage input/output to files, printers and stdio; read input in an asyncio task."""
+
+    def __init__(self, queues, codepage):
+        """Initialise I/O streams."""
+        IOStreams.__init__(self, queues, codepage)
+        # task reading the input streams
+        self._input_task = None
+
+    def __getstate__(self):
+        """Pickle the streams."""
+        pickle_dict = self.__dict__.copy()
+        pickle_dict['_input_task'] = None
+        return pickle_dict
+
+    def __setstate__(self, pickle_dict):
+        """Unpickle the streams; input is read again once the session is started."""
+        self.__dict__.update(pickle_dict)
+        self._input_task = None
+
+    def close(self):
+        """Stop reading input before exit."""
+        IOStreams.close(self)
+        if self._input_task:
+            self._input_task.cancel()
+            self._input_task = None
+
     async def add_pipes(self, input=None, output=None):
         """Add input/output pipes."""
         await self._add_input_streams(*_make_iterable(input))
@@ -220,8 +246,9 @@ class IOStreamsAsync(IOStreams):
             await self._launch_input_thread()
 
     async def _launch_input_thread(self):
-        """Launch a thread to allow nonblocking reads on both Windows and Unix."""
-        await self._process_input()
+        """Launch a task to allow nonblocking reads on both Windows and Unix."""
+        # keep a reference, or the task may be garbage collected while running
+        self._input_task = asyncio.ensure_future(self._process_input())
 
     async def _process_input(self):
         """Process input from streams."""
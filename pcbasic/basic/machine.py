@@ -329,7 +329,7 @@ class Memory(object):
         # initial DEF SEG
         self.segment = self._memory.data_segment
         # pre-defined PEEK outputs
-        self._peek_values = peek_values
+        self._peek_values = peek_values or {}
         # tandy syntax
         self._syntax = syntax
 
@@ -12,6 +12,7 @@ import struct
 from ...compat import iteritems, iterkeys
 
 from ..base import error
+from ..base.outofband import OutOfBand
 from .. import values
 from .scalars import get_name_in_memory
 
@@ -25,6 +26,14 @@ class Arrays(object):
         self.clear()
         self.clear_base()
 
+    def __getstate__(self):
+        """Pickle the arrays, with array buffers stored out-of-band."""
+        pickle_dict = self.__dict__.copy()
+        pickle_dict['_buffers'] = {
+            _name: OutOfBand(_buffer) for _name, _buffer in iteritems(self._buffers)
+        }
+        return pickle_dict
+
     def __contains__(self, varname):
         """Check if a scalar has been defined."""
         return varname in self._dims
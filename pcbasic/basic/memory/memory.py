@@ -264,6 +264,12 @@ class DataSegment(object):
         """Return the amount of memory available to variables, arrays, strings and code."""
         return self.strings.current - self.var_current() - self.arrays.current
 
+    def get_used(self, collect=False):
+        """Return the amount of memory used by variables, arrays, strings and code."""
+        if collect:
+            self._collect_garbage()
+        return self.stack_start() - self.code_start - self._get_free()
+
     @contextmanager
     def hold_garbage(self):
         """Temporarily block garbage collection."""
@@ -71,6 +71,72 @@ class MLParser(codestream.CodeStream):
             ptr = self.memory.get_value_for_varptrstr(self.read(3))
             return values.pass_string(ptr).to_str()
 
+    def read_number_spec(self):
+        """
+        Parse a value in a macro-language string without evaluating references.
+        Returns a literal value or the bytes of a reference, and False if the reference is incomplete.
+        """
+        start = self.tell()
+        c = self.skip_blank()
+        sgn = -1 if c == b'-' else 1
+        if c in (b'+', b'-'):
+            self.read(1)
+            c = self.peek()
+        if c == b'=':
+            self.read(1)
+            return self._read_reference(start)
+        elif c and c in DIGITS:
+            return sgn * self._parse_literal(), True
+        raise error.BASICError(error.IFC)
+
+    def read_string_spec(self):
+        """
+        Parse a string reference in a macro-language string without evaluating it.
+        Returns the bytes of the reference and False if the reference is incomplete.
+        """
+        start = self.tell()
+        if len(self.skip_blank()) == 0:
+            raise error.BASICError(error.IFC)
+        return self._read_reference(start)
+
+    def _read_reference(self, start):
+        """Read a reference up to its end; if incomplete, up to the end of the string."""
+        if self._skip_reference():
+            return self._buffer[start:self.tell()], True
+        # evaluating the rest of the string raises the error, after any side effects
+        self.seek(0, 2)
+        return self._buffer[start:], False
+
+    def _skip_reference(self):
+        """Skip a variable name or VARPTR$ reference; return False if incomplete."""
+        c = self.peek()
+        if len(c) == 0:
+            return False
+        elif ord(c) > 8:
+            try:
+                self._skip_variable()
+                self.require_read((b';',), err=error.IFC)
+            except error.BASICError:
+                return False
+            return True
+        else:
+            # varptr$
+            return len(self.read(3)) == 3
+
+    def _skip_variable(self):
+        """Skip a named variable without evaluating it."""
+        name = self.read_name()
+        error.throw_if(not name)
+        if self.skip_blank_read_if((b'[', b'(')):
+            while True:
+                if self.skip_blank() in set(iterchar(DIGITS)):
+                    self._parse_literal()
+                else:
+                    self._skip_variable()
+                if not self.skip_blank_read_if((b',',)):
+                    break
+            self.require_read((b']', b')'))
+
     def _parse_variable(self):
         """Parse and return a named variable."""
         name = self.read_name()
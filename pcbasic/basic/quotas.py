@@ -0,0 +1,109 @@
+"""
+PC-BASIC - quotas.py
+Execution limits
+
+(c) 2013--2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import time
+from collections import namedtuple
+
+from .base import error
+
+
+# limits on each command run: statements, wall and processor time in seconds, memory in bytes
+# and the BASIC error to raise when a limit is exceeded, or None to break
+Limits = namedtuple('Limits', ('statements', 'wall_time', 'cpu_time', 'memory', 'error_num'))
+
+# resources used by the current or latest command run
+Usage = namedtuple('Usage', ('statements', 'wall_time', 'cpu_time', 'memory'))
+
+# check the clocks and memory use once in this many statements
+CHECK_INTERVAL = 100
+
+
+class Quotas(object):
+    """Limits on the resources a command or program run may use."""
+
+    def __init__(self, queues, memory):
+        """Initialise quotas; no limits are set."""
+        self._queues = queues
+        self._memory = memory
+        self.limits = Limits(None, None, None, None, None)
+        self.active = False
+        self.reset()
+
+    def __setstate__(self, pickle_dict):
+        """Unpickle; clocks from another process are meaningless, so timing restarts."""
+        self.__dict__.update(pickle_dict)
+        self._wall_start = time.perf_counter()
+        self._cpu_start = None
+        self._wall_end = self._cpu_end = None
+
+    def set_limits(self, statements=None, wall_time=None, cpu_time=None, memory=None, error_num=None):
+        """Set limits; None for no limit."""
+        self.limits = Limits(statements, wall_time, cpu_time, memory, error_num)
+        self.active = any(_limit is not None for _limit in self.limits[:4])
+
+    def reset(self):
+        """Start counting for a new command run."""
+        self.statements = 0
+        self._countdown = CHECK_INTERVAL
+        self._wall_start = time.perf_counter()
+        self._cpu_start = self._queues.get_cpu_time()
+        self._wall_end = self._cpu_end = None
+
+    def end(self):
+        """Stop counting at the end of a command run."""
+        self._wall_end = self._get_wall_time()
+        self._cpu_end = self._get_cpu_time()
+
+    def _get_wall_time(self):
+        """Time elapsed in the current command run."""
+        if self._wall_end is not None:
+            return self._wall_end
+        return time.perf_counter() - self._wall_start
+
+    def _get_cpu_time(self):
+        """Processor time used by the current command run."""
+        if self._cpu_end is not None:
+            return self._cpu_end
+        if self._cpu_start is None:
+            self._cpu_start = self._queues.get_cpu_time()
+        return self._queues.get_cpu_time() - self._cpu_start
+
+    def get_usage(self):
+        """Resources used by the current or latest command run."""
+        return Usage(
+            self.statements, self._get_wall_time(), self._get_cpu_time(), self._memory.get_used()
+        )
+
+    def check(self):
+        """Count a statement; raise Break or a BASIC error if a limit is exceeded."""
+        self.statements += 1
+        if self.limits.statements is not None and self.statements > self.limits.statements:
+            self._exceeded()
+        self._countdown -= 1
+        if self._countdown:
+            return
+        self._countdown = CHECK_INTERVAL
+        if (
+                self.limits.wall_time is not None
+                and self._get_wall_time() > self.limits.wall_time
+            ) or (
+                self.limits.cpu_time is not None
+                and self._get_cpu_time() > self.limits.cpu_time
+            ) or (
+                # only collect garbage if we seem to be over the limit
+                self.limits.memory is not None
+                and self._memory.get_used() > self.limits.memory
+                and self._memory.get_used(collect=True) > self.limits.memory
+            ):
+            self._exceeded()
+
+    def _exceeded(self):
+        """Stop execution."""
+        if self.limits.error_num is None:
+            raise error.Break(stop=True)
+        raise error.BASICError(self.limits.error_num)
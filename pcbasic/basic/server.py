@@ -0,0 +1,326 @@
+"""
+PC-BASIC - server.py
+Serve sessions from a pool of worker processes
+
+(c) 2013--2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import os
+import time
+import itertools
+import threading
+from collections import namedtuple
+
+from . import state
+from .api import Session
+
+
+# load on a worker process
+WorkerLoad = namedtuple('WorkerLoad', ('sessions', 'calls', 'busy_time', 'cpu_time'))
+
+
+def _worker_main(conn):
+    """Entry point for worker processes."""
+    _Worker(conn).serve()
+
+
+class _Worker(object):
+    """Run sessions in a worker process, on request from the server."""
+
+    def __init__(self, conn):
+        """Set up the worker."""
+        self._conn = conn
+        self._sessions = {}
+        # screen buffer shared with the server
+        self._shm = None
+
+    def serve(self):
+        """Serve requests until told to stop or the server goes away."""
+        try:
+            while True:
+                try:
+                    command, session_id, args = self._conn.recv()
+                except EOFError:
+                    break
+                if command == 'quit':
+                    break
+                payload = None
+                try:
+                    result = getattr(self, '_' + command)(session_id, *args)
+                    if isinstance(result, _Payload):
+                        result, payload = None, result.data
+                    reply = True, result
+                except Exception as e:
+                    reply = False, e
+                try:
+                    self._conn.send(reply + (time.process_time(), payload is not None))
+                except Exception as e:
+                    # the result or exception could not be pickled
+                    self._conn.send((False, RuntimeError(repr(e)), time.process_time(), False))
+                    payload = None
+                if payload is not None:
+                    self._conn.send_bytes(payload)
+        finally:
+            for session in self._sessions.values():
+                session.close()
+            if self._shm:
+                self._shm.close()
+
+    def _open(self, session_id, kwargs):
+        """Start a new session."""
+        session = Session(**kwargs)
+        session.start()
+        self._sessions[session_id] = session
+
+    def _close(self, session_id):
+        """Close a session."""
+        self._sessions.pop(session_id).close()
+
+    def _snapshot(self, session_id):
+        """Return a snapshot of a session."""
+        return _Payload(b''.join(state.pack_snapshot(self._sessions[session_id])))
+
+    def _attach(self, session_id):
+        """Add a session from a snapshot."""
+        self._sessions[session_id] = state.unpack_snapshot(self._conn.recv_bytes())
+
+    def _call(self, session_id, method, args):
+        """Call a session method."""
+        return getattr(self._sessions[session_id], method)(*args)
+
+    def _get_pixels(self, session_id, shm_name, shm_size):
+        """Copy the visible pixels to the shared screen buffer, if it is large enough."""
+        pixels = self._sessions[session_id]._impl.display.vpage.pixels
+        height, width = pixels.height, pixels.width
+        if height * width <= shm_size:
+            from multiprocessing import shared_memory
+            if not self._shm or self._shm.name != shm_name:
+                if self._shm:
+                    self._shm.close()
+                self._shm = shared_memory.SharedMemory(shm_name)
+            self._shm.buf[:height*width] = pixels[:, :].to_bytes()
+        return height, width
+
+
+class _Payload(object):
+    """Bytes to be sent over the connection outside of the pickled reply."""
+
+    def __init__(self, data):
+        """Wrap a bytes-like object."""
+        self.data = data
+
+
+class _WorkerHandle(object):
+    """Server end of a worker process."""
+
+    def __init__(self, context):
+        """Start the worker process."""
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        # one request at a time on the connection
+        self._lock = threading.Lock()
+        self._shm = None
+        self.sessions = set()
+        self.calls = 0
+        self.busy_time = 0.
+        self.cpu_time = 0.
+
+    def call(self, command, session_id, *args, **kwargs):
+        """Make a request to the worker and wait for the reply."""
+        with self._lock:
+            return self._call(command, session_id, args, **kwargs)
+
+    def _call(self, command, session_id, args, payload=None):
+        """Make a request to the worker; lock must be held."""
+        start = time.perf_counter()
+        try:
+            self._conn.send((command, session_id, args))
+            if payload is not None:
+                self._conn.send_bytes(payload)
+            ok, result, self.cpu_time, has_payload = self._conn.recv()
+            if has_payload:
+                result = self._conn.recv_bytes()
+        finally:
+            self.calls += 1
+            self.busy_time += time.perf_counter() - start
+        if not ok:
+            raise result
+        return result
+
+    def get_pixels(self, session_id):
+        """Retrieve the visible pixels of a session through the shared screen buffer."""
+        from multiprocessing import shared_memory
+        with self._lock:
+            while True:
+                size = self._shm.size if self._shm else 0
+                name = self._shm.name if self._shm else None
+                height, width = self._call('get_pixels', session_id, (name, size))
+                if height * width <= size:
+                    break
+                # the screen buffer is too small for this video mode, make a new one
+                self._close_shm()
+                self._shm = shared_memory.SharedMemory(create=True, size=height*width)
+            data = bytes(self._shm.buf[:height*width])
+        return tuple(tuple(data[_y*width:(_y+1)*width]) for _y in range(height))
+
+    def _close_shm(self):
+        """Release the shared screen buffer."""
+        if self._shm:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def get_load(self):
+        """Report the load on this worker."""
+        return WorkerLoad(len(self.sessions), self.calls, self.busy_time, self.cpu_time)
+
+    def close(self):
+        """Stop the worker process."""
+        with self._lock:
+            try:
+                self._conn.send(('quit', None, ()))
+            except (OSError, ValueError):
+                pass
+            self._process.join()
+            self._conn.close()
+            self._close_shm()
+
+
+class RemoteSession(object):
+    """Proxy for a session running in a worker process."""
+
+    def __init__(self, server, session_id):
+        """Set up the proxy."""
+        self._server = server
+        self._id = session_id
+
+    def __enter__(self):
+        """Context guard."""
+        return self
+
+    def __exit__(self, ex_type, ex_val, tb):
+        """Context guard."""
+        self.close()
+
+    @property
+    def worker(self):
+        """Index of the worker process running this session."""
+        return self._server._placement[self._id]
+
+    def _call(self, method, *args):
+        """Call a method on the remote session."""
+        return self._server._workers[self.worker].call('call', self._id, method, args)
+
+    def execute(self, command, as_type=None):
+        """Execute a BASIC statement."""
+        return self._call('execute', command, as_type)
+
+    def evaluate(self, expression):
+        """Evaluate a BASIC expression."""
+        return self._call('evaluate', expression)
+
+    def get_variable(self, name, as_type=None):
+        """Get a variable in memory."""
+        return self._call('get_variable', name, as_type)
+
+    def press_keys(self, keys):
+        """Insert keypresses."""
+        return self._call('press_keys', keys)
+
+    def get_chars(self, as_type=bytes):
+        """Get currently displayed characters, as tuple of list of bytes / unicode."""
+        return self._call('get_chars', as_type)
+
+    def get_pixels(self):
+        """Get currently displayed pixels, as tuple of tuples of int attributes."""
+        return self._server._workers[self.worker].get_pixels(self._id)
+
+    def set_limits(self, statements=None, wall_time=None, cpu_time=None, memory=None, error_num=None):
+        """Limit the resources used by each command run."""
+        return self._call('set_limits', statements, wall_time, cpu_time, memory, error_num)
+
+    def migrate(self, worker):
+        """Move the session to another worker process."""
+        self._server.migrate(self, worker)
+
+    def close(self):
+        """Close the session."""
+        self._server._close_session(self._id)
+
+
+class SessionServer(object):
+    """Run sessions in a pool of worker processes."""
+
+    def __init__(self, workers=None, start_method=None):
+        """Start the worker processes; by default, one for each processor."""
+        # multiprocessing is imported here, so that it does not slow down every startup
+        import multiprocessing
+        from multiprocessing import resource_tracker
+        context = multiprocessing.get_context(start_method)
+        # workers must share our resource tracker, or theirs will unlink the screen buffers
+        resource_tracker.ensure_running()
+        self._workers = [_WorkerHandle(context) for _ in range(workers or os.cpu_count() or 1)]
+        # worker index for each session id
+        self._placement = {}
+        self._ids = itertools.count()
+
+    def __enter__(self):
+        """Context guard."""
+        return self
+
+    def __exit__(self, ex_type, ex_val, tb):
+        """Context guard."""
+        self.close()
+
+    def open_session(self, worker=None, **kwargs):
+        """Start a session on the given or the least loaded worker and return a proxy for it."""
+        # don't let sessions fight over the standard streams
+        kwargs.setdefault('input_streams', None)
+        kwargs.setdefault('output_streams', None)
+        if worker is None:
+            worker = self._least_loaded()
+        session_id = next(self._ids)
+        self._workers[worker].call('open', session_id, kwargs)
+        self._workers[worker].sessions.add(session_id)
+        self._placement[session_id] = worker
+        return RemoteSession(self, session_id)
+
+    def migrate(self, session, worker):
+        """Move a session to another worker through a snapshot."""
+        old = session.worker
+        if old == worker:
+            return
+        # the session stays on the old worker until it has been attached to the new one
+        snapshot = self._workers[old].call('snapshot', session._id)
+        self._workers[worker].call('attach', session._id, payload=snapshot)
+        self._workers[worker].sessions.add(session._id)
+        self._placement[session._id] = worker
+        self._workers[old].sessions.discard(session._id)
+        self._workers[old].call('close', session._id)
+
+    def get_load(self):
+        """Report the load on each worker."""
+        return [_worker.get_load() for _worker in self._workers]
+
+    def _least_loaded(self):
+        """Index of the worker with fewest sessions and least processor time used."""
+        return min(
+            range(len(self._workers)),
+            key=lambda _i: (len(self._workers[_i].sessions), self._workers[_i].cpu_time)
+        )
+
+    def _close_session(self, session_id):
+        """Close a session."""
+        worker = self._placement.pop(session_id, None)
+        if worker is not None:
+            self._workers[worker].sessions.discard(session_id)
+            self._workers[worker].call('close', session_id)
+
+    def close(self):
+        """Close all sessions and stop the worker processes."""
+        for worker in self._workers:
+            worker.close()
+        self._placement.clear()
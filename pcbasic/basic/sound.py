@@ -6,12 +6,14 @@ Sound handling
 This file is released under the GNU GPL version 3 or later.
 """
 
-from collections import deque
+from collections import deque, OrderedDict
 import datetime
+import threading
 
 from .eventcycle import EventQueues, EventQueuesAsync
 from .memory import DataSegment
 from .values import Values
+from .clock import TimeSource
 from ..compat import iterchar, zip
 from .base import error
 from .base import signals
@@ -49,11 +51,22 @@ LOOP_THRESHOLD = 0.02272727248
 # length of a clock tick ("PIT tick", see Joel Yliluoma's noise.bas)
 TICK_LENGTH = 0x1234DC / 65536.
 
+# number of compiled Music Macro Language strings to keep
+MML_CACHE_SIZE = 256
+# characters that would extend a command if following it in a Music Macro Language string
+_JOINING_CHARS = set(iterchar(b'#+-.' + DIGITS))
+
+# cache of compiled Music Macro Language strings, shared by sessions on all threads
+_mml_cache = OrderedDict()
+_mml_cache_lock = threading.Lock()
+
 
 class Sound(object):
     """Sound queue manipulations."""
 
-    def __init__(self, queues: EventQueues, values: Values, memory: DataSegment, syntax):
+    def __init__(
+            self, queues: EventQueues, values: Values, memory: DataSegment, syntax, time_source
+        ):
         """Initialise sound queue."""
         # for wait() and queues
         self._queues = queues
@@ -70,7 +83,7 @@ class Sound(object):
         # pc-speaker on/off; (not implemented; not sure whether should be on)
         self._beep_on = True
         # timed queues for each voice (including gaps, for background counting & rebuilding)
-        self._voice_queue = [TimedQueue(), TimedQueue(), TimedQueue(), TimedQueue()]
+        self._voice_queue = [TimedQueue(time_source) for _ in range(4)]
         self._foreground = True
         self._synch = False
         # initialise PLAY state
@@ -253,7 +266,7 @@ class Sound(object):
         if self._multivoice:
             max_time = max(q.expiry() for q in self._voice_queue[:3])
             for voice, q in enumerate(self._voice_queue[:3]):
-                duration = (max_time - q.expiry()).total_seconds()
+                duration = max_time - q.expiry()
                 # fill up the queue with the necessary amount of silence
                 # this takes up one spot in the buffer and thus affects timings
                 # which is intentional
@@ -284,128 +297,19 @@ class Sound(object):
         # this takes up one spot in the buffer and thus affects timings
         self._synch = True
         mml_list += [b''] * (3 - len(mml_list))
-        ml_parser_list = [mlparser.MLParser(mml, self._memory, self._values) for mml in mml_list]
-        next_oct = 0
+        # volume commands are only available with SOUND ON, or on Tandy
+        allow_volume = bool(self._multivoice and self._sound_on or self._multivoice == 'tandy')
+        stacks = [MMLStack(mml or b'', allow_volume) for mml in mml_list]
         voices = list(range(3))
         while True:
             if not voices:
                 break
             for voice in voices:
-                vstate = self._state[voice]
-                mmls = ml_parser_list[voice]
-                c = mmls.skip_blank_read().upper()
-                if c == b'':
+                command = stacks[voice].next_command()
+                if command is None:
                     voices.remove(voice)
                     continue
-                if c == b';':
-                    # absorb one (and only one) semicolon
-                    c = mmls.skip_blank_read().upper()
-                if c == b'X':
-                    # insert substring
-                    sub = mmls.parse_string()
-                    pos = mmls.tell()
-                    rest = mmls.read()
-                    mmls.seek(pos)
-                    mmls.truncate()
-                    mmls.write(sub)
-                    mmls.write(rest)
-                    mmls.seek(pos)
-                elif c == b'N':
-                    note = mmls.parse_number()
-                    error.range_check(0, 84, note)
-                    dur = vstate.length
-                    while mmls.skip_blank_read_if((b'.',)):
-                        dur *= 1.5
-                    if note == 0:
-                        # pause
-                        self.emit_tone(0, dur*vstate.tempo, 1, False, voice, vstate.volume)
-                    else:
-                        self.emit_tone(
-                                NOTE_FREQ[note-1], dur*vstate.tempo,
-                                vstate.fill, False, voice, vstate.volume)
-                elif c == b'L':
-                    recip = mmls.parse_number()
-                    error.range_check(1, 64, recip)
-                    vstate.length = 1. / recip
-                elif c == b'T':
-                    recip = mmls.parse_number()
-                    error.range_check(32, 255, recip)
-                    vstate.tempo = 240. / recip
-                elif c == b'O':
-                    octave = mmls.parse_number()
-                    error.range_check(0, 6, octave)
-                    vstate.octave = octave
-                elif c == b'>':
-                    vstate.octave += 1
-                    if vstate.octave > 6:
-                        vstate.octave = 6
-                elif c == b'<':
-                    vstate.octave -= 1
-                    if vstate.octave < 0:
-                        vstate.octave = 0
-                elif c in (b'A', b'B', b'C', b'D', b'E', b'F', b'G', b'P'):
-                    note = c
-                    dur = vstate.length
-                    length = None
-                    if mmls.skip_blank_read_if((b'#', b'+')):
-                        note += b'#'
-                    elif mmls.skip_blank_read_if((b'-',)):
-                        note += b'-'
-                    c = mmls.skip_blank_read_if(DIGITS)
-                    if c is not None:
-                        numstr = [c]
-                        while mmls.skip_blank() in set(iterchar(DIGITS)):
-                            numstr.append(mmls.read(1))
-                        # NOT ml_parse_number, only literals allowed here!
-                        length = int(b''.join(numstr))
-                        error.range_check(0, 64, length)
-                        if length > 0:
-                            dur = 1. / float(length)
-                    while mmls.skip_blank_read_if((b'.',)):
-                        error.throw_if(note == b'P' and length == 0)
-                        dur *= 1.5
-                    if note == b'P':
-                        # length must be specified
-                        if length is None:
-                            raise error.BASICError(error.IFC)
-                        # don't do anything for length 0
-                        elif length > 0:
-                            self.emit_tone(0, dur * vstate.tempo, 1, False, voice, vstate.volume)
-                    else:
-                        # use default length for length 0
-                        try:
-                            self.emit_tone(
-                                NOTE_FREQ[(vstate.octave + next_oct) * 12 + NOTES[note]],
-                                dur * vstate.tempo, vstate.fill, False, voice, vstate.volume)
-                        except KeyError:
-                            raise error.BASICError(error.IFC)
-                    next_oct = 0
-                elif c == b'M':
-                    c = mmls.skip_blank_read().upper()
-                    if c == b'N':
-                        vstate.fill = 7./8.
-                    elif c == b'L':
-                        vstate.fill = 1.
-                    elif c == b'S':
-                        vstate.fill = 3./4.
-                    elif c == b'F':
-                        self._foreground = True
-                    elif c == b'B':
-                        self._foreground = False
-                    else:
-                        raise error.BASICError(error.IFC)
-                elif c == b'V' and (
-                        self._multivoice and self._sound_on
-                        or self._multivoice == 'tandy'
-                    ):
-                    vol = mmls.parse_number()
-                    error.range_check(-1, 15, vol)
-                    if vol == -1:
-                        vstate.volume = 15
-                    else:
-                        vstate.volume = vol
-                else:
-                    raise error.BASICError(error.IFC)
+                self._play_command(voice, command, stacks[voice])
         self._synch = False
         if self._foreground:
             # wait until fully done on Tandy/PCjr, continue early on GW
@@ -413,12 +317,99 @@ class Sound(object):
         else:
             self._wait_background()
 
+    def _play_command(self, voice, command, stack):
+        """Execute a compiled Music Macro Language command."""
+        vstate = self._state[voice]
+        c = command[0]
+        if c == b'X':
+            # insert substring
+            _, spec = command
+            sub = mlparser.MLParser(spec, self._memory, self._values).parse_string()
+            stack.insert(sub)
+        elif c == b'N':
+            _, spec, dots = command
+            note = self._evaluate(spec)
+            error.range_check(0, 84, note)
+            dur = vstate.length
+            for _ in range(dots):
+                dur *= 1.5
+            if note == 0:
+                # pause
+                self.emit_tone(0, dur*vstate.tempo, 1, False, voice, vstate.volume)
+            else:
+                self.emit_tone(
+                        NOTE_FREQ[note-1], dur*vstate.tempo,
+                        vstate.fill, False, voice, vstate.volume)
+        elif c == b'L':
+            recip = self._evaluate(command[1])
+            error.range_check(1, 64, recip)
+            vstate.length = 1. / recip
+        elif c == b'T':
+            recip = self._evaluate(command[1])
+            error.range_check(32, 255, recip)
+            vstate.tempo = 240. / recip
+        elif c == b'O':
+            octave = self._evaluate(command[1])
+            error.range_check(0, 6, octave)
+            vstate.octave = octave
+        elif c == b'>':
+            vstate.octave += 1
+            if vstate.octave > 6:
+                vstate.octave = 6
+        elif c == b'<':
+            vstate.octave -= 1
+            if vstate.octave < 0:
+                vstate.octave = 0
+        elif c in (b'A', b'B', b'C', b'D', b'E', b'F', b'G', b'P'):
+            _, semitone, length, dots = command
+            # use default length for length 0
+            dur = 1. / length if length else vstate.length
+            for _ in range(dots):
+                dur *= 1.5
+            if c == b'P':
+                # don't do anything for length 0
+                if length > 0:
+                    self.emit_tone(0, dur * vstate.tempo, 1, False, voice, vstate.volume)
+            else:
+                self.emit_tone(
+                    NOTE_FREQ[vstate.octave * 12 + semitone],
+                    dur * vstate.tempo, vstate.fill, False, voice, vstate.volume)
+        elif c == b'M':
+            c = command[1]
+            if c == b'N':
+                vstate.fill = 7./8.
+            elif c == b'L':
+                vstate.fill = 1.
+            elif c == b'S':
+                vstate.fill = 3./4.
+            elif c == b'F':
+                self._foreground = True
+            elif c == b'B':
+                self._foreground = False
+        elif c == b'V':
+            vol = self._evaluate(command[1])
+            error.range_check(-1, 15, vol)
+            if vol == -1:
+                vstate.volume = 15
+            else:
+                vstate.volume = vol
+        else:
+            raise error.BASICError(command[1])
+
+    def _evaluate(self, spec):
+        """Get the value of a compiled number: a literal, or a reference resolved now."""
+        if isinstance(spec, int):
+            return spec
+        return mlparser.MLParser(spec, self._memory, self._values).parse_number()
+
 
 class SoundAsync(Sound):
     _queues: EventQueuesAsync
 
-    def __init__(self, queues: EventQueuesAsync, values: Values, memory: DataSegment, syntax):
-        super().__init__(queues, values, memory, syntax)
+    def __init__(
+            self, queues: EventQueuesAsync, values: Values, memory: DataSegment, syntax, time_source
+        ):
+        super().__init__(queues, values, memory, syntax, time_source)
 
     async def _wait_background(self):
         """Wait until the background queue becomes available."""
@@ -445,15 +436,175 @@ class PlayState(object):
         self.volume = 15
 
 
+###############################################################################
+# music macro language
+
+class MMLProgram(object):
+    """Music Macro Language string compiled to a list of commands."""
+
+    def __init__(self, mml, allow_volume):
+        """Compile a Music Macro Language string."""
+        self.source = mml
+        self.commands = []
+        # offset of the rest of the string after each command
+        self.ends = []
+        # whether the rest of the string would extend the last command if appended to it
+        self.joins = []
+        # whether the string compiled without errors or incomplete references
+        self.complete = True
+        self._allow_volume = allow_volume
+        parser = mlparser.MLParser(mml, None, None)
+        while True:
+            c = parser.skip_blank_read().upper()
+            if c == b'':
+                break
+            try:
+                self.commands.append(self._compile_command(c, parser))
+            except error.BASICError as e:
+                # raise the error when the command is reached
+                self.commands.append((b'error', e.err))
+                self.complete = False
+                break
+            self.ends.append(parser.tell())
+            self.joins.append(parser.skip_blank() in _JOINING_CHARS)
+
+    def _compile_command(self, c, parser):
+        """Compile one command."""
+        if c == b';':
+            # absorb one (and only one) semicolon
+            c = parser.skip_blank_read().upper()
+        if c == b'X':
+            return c, self._read_string(parser)
+        elif c == b'N':
+            spec = self._read_number(parser)
+            dots = 0
+            while parser.skip_blank_read_if((b'.',)):
+                dots += 1
+            return c, spec, dots
+        elif c in (b'L', b'T', b'O'):
+            return c, self._read_number(parser)
+        elif c in (b'>', b'<'):
+            return c,
+        elif c in (b'A', b'B', b'C', b'D', b'E', b'F', b'G', b'P'):
+            note = c
+            length = None
+            if parser.skip_blank_read_if((b'#', b'+')):
+                note += b'#'
+            elif parser.skip_blank_read_if((b'-',)):
+                note += b'-'
+            d = parser.skip_blank_read_if(DIGITS)
+            if d is not None:
+                numstr = [d]
+                while parser.skip_blank() in set(iterchar(DIGITS)):
+                    numstr.append(parser.read(1))
+                # NOT a number spec, only literals allowed here!
+                length = int(b''.join(numstr))
+                error.range_check(0, 64, length)
+            dots = 0
+            while parser.skip_blank_read_if((b'.',)):
+                error.throw_if(note == b'P' and length == 0)
+                dots += 1
+            if note == b'P':
+                # length must be specified
+                if length is None:
+                    raise error.BASICError(error.IFC)
+                return c, None, length, dots
+            try:
+                return c, NOTES[note], length, dots
+            except KeyError:
+                raise error.BASICError(error.IFC)
+        elif c == b'M':
+            c2 = parser.skip_blank_read().upper()
+            if c2 not in (b'N', b'L', b'S', b'F', b'B'):
+                raise error.BASICError(error.IFC)
+            return c, c2
+        elif c == b'V' and self._allow_volume:
+            return c, self._read_number(parser)
+        raise error.BASICError(error.IFC)
+
+    def _read_number(self, parser):
+        """Read a literal number, or a reference to resolve when played."""
+        spec, complete = parser.read_number_spec()
+        self.complete = self.complete and complete
+        return spec
+
+    def _read_string(self, parser):
+        """Read a string reference to resolve when played."""
+        spec, complete = parser.read_string_spec()
+        self.complete = self.complete and complete
+        return spec
+
+
+def compile_mml(mml, allow_volume):
+    """Retrieve a compiled Music Macro Language string from the cache, compiling if needed."""
+    key = (mml, allow_volume)
+    with _mml_cache_lock:
+        program = _mml_cache.get(key)
+        if program is not None:
+            _mml_cache.move_to_end(key)
+            return program
+    # compiled programs are not changed, so it doesn't matter if another thread gets there first
+    program = MMLProgram(mml, allow_volume)
+    with _mml_cache_lock:
+        _mml_cache[key] = program
+        if len(_mml_cache) > MML_CACHE_SIZE:
+            _mml_cache.popitem(last=False)
+    return program
+
+
+class MMLStack(object):
+    """Compiled Music Macro Language strings being played on a voice."""
+
+    def __init__(self, mml, allow_volume):
+        """Start playing a string."""
+        self._allow_volume = allow_volume
+        # compiled strings and index of their next command, innermost substring last
+        self._frames = [[compile_mml(bytes(mml), allow_volume), 0]]
+
+    def next_command(self):
+        """Get the next command to execute, None if done."""
+        while self._frames:
+            frame = self._frames[-1]
+            program, index = frame
+            if index < len(program.commands):
+                frame[1] += 1
+                return program.commands[index]
+            self._frames.pop()
+        return None
+
+    def insert(self, sub):
+        """Insert a substring at the current position (X command)."""
+        frames = self._frames
+        # a substring at the end of a string is followed by the rest of the enclosing string
+        while frames and frames[-1][1] >= len(frames[-1][0].commands):
+            frames.pop()
+        program = compile_mml(bytes(sub), self._allow_volume)
+        if not frames:
+            frames.append([program, 0])
+        elif program.complete and not frames[-1][0].joins[frames[-1][1]-1]:
+            # the substring can be played on its own, followed by the rest of the string
+            frames.append([program, 0])
+        else:
+            # commands may run across the boundary: compile the expanded string
+            outer, index = frames.pop()
+            rest = outer.source[outer.ends[index-1]:]
+            frames.append([compile_mml(bytes(sub) + rest, self._allow_volume), 0])
+
+
 ###############################################################################
 # sound queue
 
 class TimedQueue(object):
     """Queue with expiring elements."""
 
-    def __init__(self):
+    def __init__(self, time_source):
         """Initialise timed queue."""
+        # real or virtual time
+        self._time = time_source
+        # items are (item, expiry time on monotonic clock or None, whether it counts as a tone)
         self._deque = deque()
+        # number of items in queue that count as tones
+        self._tones = 0
         # hack to reproduce queue lengths as reported by GW-BASIC
         self._balloon_popped = False
 
@@ -461,26 +612,45 @@ class TimedQueue(object):
         """Get pickling dict for queue."""
         self._check_expired()
         return {
+            'time': self._time,
             'deque': self._deque,
-            'now': datetime.datetime.now(),
+            'now': self._time.monotonic(),
             'balloon_popped': self._balloon_popped,
         }
 
     def __setstate__(self, st):
         """Initialise queue from pickling dict."""
-        offset = datetime.datetime.now() - st['now']
-        self._deque = deque((item, expiry+offset, counts) for (item, expiry, counts) in st['deque'])
+        # older versions always ran in real time
+        self._time = st.get('time') or TimeSource()
+        items, then = st['deque'], st['now']
+        if isinstance(then, datetime.datetime):
+            # older versions stored expiry times as datetime; convert to seconds after pickling
+            items = [
+                (item, None if expiry is None else (expiry - then).total_seconds(), counts)
+                for (item, expiry, counts) in items
+            ]
+            then = 0.
+        offset = self._time.monotonic() - then
+        self._deque = deque(
+            (item, None if expiry is None else expiry+offset, counts)
+            for (item, expiry, counts) in items
+        )
+        self._tones = sum(1 for _, _, counts in self._deque if counts)
         self._balloon_popped = st['balloon_popped']
 
     def _check_expired(self):
         """Drop expired items from queue."""
-        counts = 0
-        try:
-            while self._deque[0][1] <= datetime.datetime.now():
-                popped = self._deque.popleft()
-                self._balloon_popped = (popped[2] is None)
-        except (IndexError, TypeError):
-            pass
+        if not self._deque:
+            return
+        now = self._time.monotonic()
+        while self._deque:
+            _, expiry, counts = self._deque[0]
+            # looping items do not expire
+            if expiry is None or expiry > now:
+                break
+            self._deque.popleft()
+            self._tones -= bool(counts)
+            self._balloon_popped = (counts is None)
 
     def put(self, item, duration, count_for_size):
         """
@@ -489,21 +659,22 @@ class TimedQueue(object):
         """
         self._check_expired()
         # drop looping elements
-        try:
-            if self._deque[-1][1] is None:
-                self._deque.pop()
-        except IndexError:
-            pass
+        if self._deque and self._deque[-1][1] is None:
+            _, _, counts = self._deque.pop()
+            self._tones -= bool(counts)
         if duration is None:
             expiry = None
         else:
-            last = self._deque[-1][1] if self._deque else datetime.datetime.now()
-            expiry = max(last, datetime.datetime.now()) + datetime.timedelta(seconds=duration)
+            now = self._time.monotonic()
+            last = self._deque[-1][1] if self._deque else now
+            expiry = max(last, now) + duration
         self._deque.append((item, expiry, count_for_size))
+        self._tones += bool(count_for_size)
 
     def clear(self):
         """Clear the queue."""
         self._deque.clear()
+        self._tones = 0
 
     def __len__(self):
         """Number of elements in queue."""
@@ -514,7 +685,9 @@ class TimedQueue(object):
         """Number of tones (not gaps) waiting in queue."""
         self._check_expired()
         # count number of notes waiting, exclude the top of queue ("now playing")
-        waiting = len([item for i, item in enumerate(self._deque) if item[2] and i])
+        waiting = self._tones
+        if self._deque and self._deque[0][2]:
+            waiting -= 1
         # hack: if the most recent item popped was a balloon
         # (i.e. we've just started a PLAY and the first note has not finished)
         # include the first note in the waiting queue length
@@ -523,22 +696,21 @@ class TimedQueue(object):
         return waiting
 
     def expiry(self):
-        """Last expiry in queue, return now() for looping sound."""
+        """Last expiry in queue, return now for looping sound."""
         self._check_expired()
-        try:
-            return self._deque[-1][1] or datetime.datetime.now()
-        except IndexError:
-            return datetime.datetime.now()
+        if self._deque and self._deque[-1][1] is not None:
+            return self._deque[-1][1]
+        return self._time.monotonic()
 
     def items(self):
         """Iterate over each item and its duration."""
         self._check_expired()
-        last_expiry = datetime.datetime.now()
+        last_expiry = self._time.monotonic()
         for item, expiry, _ in self._deque:
             if expiry is None:
                 duration = None
             else:
                 # adjust duration
-                duration = (expiry - last_expiry).total_seconds()
+                duration = expiry - last_expiry
                 last_expiry = expiry
             yield item, duration
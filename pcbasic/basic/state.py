@@ -15,13 +15,17 @@ import os
 import io
 import sys
 import zlib
+import time
 import struct
 import codecs
+import hashlib
 import logging
+import threading
 from contextlib import contextmanager
 
 from . import VERSION
 from ..compat import PY2, copyreg, stdio
+from .base.outofband import OutOfBand
 
 
 # session file header
@@ -31,12 +35,27 @@ HEADER_KEYS = [
 ]
 HEADER = {
     # increment this if we change the format of the session file
-    'format_version': 2,
+    'format_version': 4,
     'python_major': sys.version_info.major,
     'python_minor': sys.version_info.minor,
     'pcbasic_major': int(VERSION.split(u'.')[0]),
     'pcbasic_minor': int(VERSION.split(u'.')[1]),
 }
+# flag set on the format version if the snapshot is compressed
+COMPRESSED = 0x80000000
+# flag set on the format version if the file holds incremental checkpoints
+CHECKPOINT = 0x40000000
+# oldest format we can load; format 3 checkpoints have no buffer of shared objects
+OLDEST_FORMAT = 3
+# zlib compression level: favour speed over size
+COMPRESSION_LEVEL = 1
+
+# checkpoint record header: length and checksum of record
+RECORD_FORMAT = '<LL'
+# checkpoints store buffers in pages; only pages not yet in the file are written
+PAGE_SIZE = 4096
+# start a new checkpoint file once the old one is this many times the size of a full snapshot
+COMPACT_RATIO = 3
 
 
 def unpickle_bytesio(value, pos):
@@ -47,7 +66,7 @@ def unpickle_bytesio(value, pos):
 
 def pickle_bytesio(f):
     """Pickle a BytesIO object."""
-    return unpickle_bytesio, (f.getvalue(), f.tell())
+    return unpickle_bytesio, (OutOfBand(f.getvalue()), f.tell())
 
 def unpickle_file(name, mode, pos):
     """Unpickle a file object."""
@@ -115,23 +134,114 @@ if PY2: # pragma: no cover
         streamclass.__setstate__ = patched_setstate
 
 
+def _dump(obj, shared=()):
+    """
+    Pickle an object, return the pickle stream and a list of out-of-band buffers.
+    Objects in shared are stored by reference.
+    """
+    buffers = []
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        # objects holding large buffers provide them out-of-band, so they are not copied
+        kwargs = dict(protocol=5, buffer_callback=buffers.append)
+    else: # pragma: no cover
+        kwargs = dict(protocol=pickle.HIGHEST_PROTOCOL)
+    if shared:
+        stream = io.BytesIO()
+        _SharingPickler(stream, shared, **kwargs).dump(obj)
+        pickle_stream = stream.getvalue()
+    else:
+        pickle_stream = pickle.dumps(obj, **kwargs)
+    return pickle_stream, [_buffer.raw() for _buffer in buffers]
+
+def pack_snapshot(obj):
+    """Serialise an object to a list of byte chunks."""
+    pickle_stream, buffers = _dump(obj)
+    table = struct.pack(
+        '<LL%dL' % (len(buffers),), len(pickle_stream), len(buffers), *(len(_b) for _b in buffers)
+    )
+    return [table, pickle_stream] + buffers
+
+def unpack_snapshot(payload):
+    """Deserialise an object from a bytes-like payload."""
+    view = memoryview(payload)
+    pickle_length, num_buffers = struct.unpack_from('<LL', view, 0)
+    offset = struct.calcsize('<LL')
+    lengths = struct.unpack_from('<%dL' % (num_buffers,), view, offset)
+    offset += struct.calcsize('<%dL' % (num_buffers,))
+    pickle_stream = view[offset:offset+pickle_length]
+    offset += pickle_length
+    buffers = []
+    for length in lengths:
+        # buffers are mutable in the unpickled objects, so they need to be copied anyway
+        buffers.append(bytearray(view[offset:offset+length]))
+        offset += length
+    if not buffers:
+        return pickle.loads(pickle_stream)
+    return pickle.loads(pickle_stream, buffers=buffers)
+
+def _load_checkpoint(payload, has_shared):
+    """
+    Deserialise an object from the latest complete record in a checkpoint file.
+    If has_shared is set, the first buffer holds the pickled shared objects.
+    """
+    view = memoryview(payload)
+    record_size = struct.calcsize(RECORD_FORMAT)
+    offset, latest = 0, None
+    while offset + record_size <= len(view):
+        length, checksum = struct.unpack_from(RECORD_FORMAT, view, offset)
+        record = view[offset+record_size:offset+record_size+length]
+        # stop at a record that was not completely written
+        if len(record) < length or zlib.crc32(record) & 0xffffffff != checksum:
+            break
+        latest = record
+        offset += record_size + length
+    # pages can only be stored in the latest or earlier records
+    end = offset
+    if latest is None:
+        raise ValueError('session file corrupted')
+    pickle_length, num_buffers, num_pages = struct.unpack_from('<LLL', latest, 0)
+    table_format = '<LLL%dL%dQ' % (num_buffers, num_pages)
+    table = struct.unpack_from(table_format, latest, 0)
+    lengths, pages = table[3:3+num_buffers], iter(table[3+num_buffers:])
+    start = struct.calcsize(table_format)
+    pickle_stream = latest[start:start+pickle_length]
+    buffers = []
+    for length in lengths:
+        buffer = bytearray()
+        for page_offset in range(0, length, PAGE_SIZE):
+            page_length = min(PAGE_SIZE, length - page_offset)
+            offset = next(pages)
+            if offset + page_length > end:
+                raise ValueError('session file corrupted')
+            buffer += view[offset:offset+page_length]
+        buffers.append(buffer)
+    if has_shared:
+        shared = pickle.loads(buffers.pop(0))
+        return _SharingUnpickler(io.BytesIO(pickle_stream), shared, buffers).load()
+    return pickle.loads(pickle_stream, buffers=buffers)
+
+
 def load_session(state_file):
-    """Read state from a compressed pickle."""
+    """Read state from a session snapshot."""
     if not state_file:
         raise ValueError('Session filename must not be empty')
     with open(state_file, 'rb') as in_file:
         header = in_file.read(struct.calcsize(HEADER_FORMAT))
         blob = in_file.read()
-    # mask checksum to deal with different signs on Py2/Py3
-    # see https://docs.python.org/3.5/library/zlib.html#zlib.crc32
-    checksum = zlib.crc32(blob) & 0xffffffff
     try:
         header_dict = dict(zip(HEADER_KEYS, struct.unpack(HEADER_FORMAT, header)))
     except struct.error:
         raise ValueError('session file header corrupted')
-    # check blob integrity
-    if checksum != header_dict['checksum']:
-        raise ValueError('session file corrupted')
+    format_version = header_dict['format_version'] & ~(COMPRESSED | CHECKPOINT)
+    if not OLDEST_FORMAT <= format_version <= HEADER['format_version']:
+        # format 2 files hold a pickle of the objects of an older version; these can't be restored
+        raise ValueError('session file stored in unsupported format %d' % (format_version,))
+    # check blob integrity; checkpoint files have checksums for each record instead
+    # mask checksum to deal with different signs on Py2/Py3
+    # see https://docs.python.org/3.5/library/zlib.html#zlib.crc32
+    if not header_dict['format_version'] & CHECKPOINT:
+        if zlib.crc32(blob) & 0xffffffff != header_dict['checksum']:
+            raise ValueError('session file corrupted')
     if (
             HEADER['python_major'] != header_dict['python_major']
             or HEADER['python_minor'] != header_dict['python_minor']
@@ -142,17 +252,191 @@ def load_session(state_file):
             or HEADER['pcbasic_minor'] != header_dict['pcbasic_minor']
         ):
         raise ValueError('session file stored with different PC-BASIC version')
-    session = pickle.loads(zlib.decompress(blob))
-    return session
+    if header_dict['format_version'] & CHECKPOINT:
+        return _load_checkpoint(blob, has_shared=format_version > 3)
+    if header_dict['format_version'] & COMPRESSED:
+        blob = zlib.decompress(blob)
+    return unpack_snapshot(blob)
 
-def save_session(obj, state_file):
-    """Write state to a compressed pickle."""
+def save_session(obj, state_file, compress=True):
+    """Write state to a session snapshot, with optional fast compression."""
     if not state_file:
         raise ValueError('Session filename must not be empty')
-    blob = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
-    checksum = zlib.crc32(blob) & 0xffffffff
-    header_dict = dict(checksum=checksum, **HEADER)
+    chunks = pack_snapshot(obj)
+    if compress:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        chunks = [compressor.compress(_chunk) for _chunk in chunks] + [compressor.flush()]
+    checksum = 0
+    for chunk in chunks:
+        checksum = zlib.crc32(chunk, checksum)
+    header_dict = dict(HEADER, checksum=checksum & 0xffffffff)
+    if compress:
+        header_dict['format_version'] |= COMPRESSED
     header = struct.pack(HEADER_FORMAT, *(header_dict[_key] for _key in HEADER_KEYS))
     with open(state_file, 'wb') as out_file:
         out_file.write(header)
-        out_file.write(blob)
+        out_file.writelines(chunks)
+
+
+class _SharingPickler(pickle.Pickler):
+    """Pickler that stores shared objects by reference."""
+
+    def __init__(self, stream, shared, protocol=pickle.HIGHEST_PROTOCOL, **kwargs):
+        """Set up the pickler with a list of shared objects."""
+        pickle.Pickler.__init__(self, stream, protocol, **kwargs)
+        self._shared_index = {id(_obj): _index for _index, _obj in enumerate(shared)}
+
+    def persistent_id(self, obj):
+        """Refer to shared objects by their index."""
+        return self._shared_index.get(id(obj))
+
+
+class _SharingUnpickler(pickle.Unpickler):
+    """Unpickler that restores references to shared objects."""
+
+    def __init__(self, stream, shared, buffers=None):
+        """Set up the unpickler with a list of shared objects and out-of-band buffers."""
+        pickle.Unpickler.__init__(self, stream, buffers=buffers)
+        self._shared = shared
+
+    def persistent_load(self, pid):
+        """Retrieve a shared object."""
+        return self._shared[pid]
+
+
+class Template(object):
+    """Pickled state of an object, from which copies can be made that share immutable parts."""
+
+    def __init__(self, obj, shared=()):
+        """Store the state of the object; objects in shared are not copied."""
+        # keep the shared objects alive, as they are identified by id()
+        self._shared = list(shared)
+        stream = io.BytesIO()
+        _SharingPickler(stream, self._shared).dump(obj)
+        self._pickle_stream = stream.getvalue()
+
+    def copy(self):
+        """Make a new copy of the object."""
+        return _SharingUnpickler(io.BytesIO(self._pickle_stream), self._shared).load()
+
+
+class Checkpointer(object):
+    """Write incremental checkpoints of an object to file on a background thread."""
+
+    def __init__(self, obj, state_file, interval=0, get_shared=None):
+        """
+        Set up checkpoints; interval is the minimum time between periodic checkpoints.
+        get_shared returns objects that don't change; they are only written once to each file.
+        """
+        self._obj = obj
+        self._get_shared = get_shared
+        # shared objects and their pickle
+        self._shared, self._shared_pickle = [], b''
+        self.state_file = state_file
+        self.interval = interval
+        self._due = time.monotonic() + interval
+        self._thread = None
+        self._new_file()
+
+    def _new_file(self):
+        """Write the next checkpoint to a new file."""
+        # file offsets of pages stored in the file, by digest
+        self._pages = {}
+        # size of the file after the header; 0 if it needs to be created
+        self._size = 0
+
+    def poll(self):
+        """Write a checkpoint if it is due and the last one has been written."""
+        if (
+                time.monotonic() >= self._due
+                and not (self._thread and self._thread.is_alive())
+            ):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Copy the object's state and write it to file in the background."""
+        self.wait()
+        shared = self._get_shared() if self._get_shared else []
+        if [id(_obj) for _obj in shared] != [id(_obj) for _obj in self._shared]:
+            self._shared = shared
+            self._shared_pickle = pickle.dumps(shared, pickle.HIGHEST_PROTOCOL)
+        pickle_stream, buffers = _dump(self._obj, self._shared)
+        # copy the buffers, as the object is going to change while we write
+        # the shared objects are stored as a buffer too, so their pages are only written once
+        buffers = [self._shared_pickle] + [bytes(_buffer) for _buffer in buffers]
+        self._due = time.monotonic() + self.interval
+        self._thread = threading.Thread(
+            target=self._write, args=(pickle_stream, buffers), name='checkpoint'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wait(self):
+        """Wait until the last checkpoint has been written."""
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        """Start a new file at the next checkpoint, e.g. if the file has been overwritten."""
+        self.wait()
+        self._new_file()
+
+    def _write(self, pickle_stream, buffers):
+        """Write a checkpoint record."""
+        try:
+            self._write_record(pickle_stream, buffers)
+        except Exception as e:
+            logging.error('Failed to write checkpoint to %s: %s', self.state_file, e)
+            self._new_file()
+
+    def _write_record(self, pickle_stream, buffers):
+        """Append a checkpoint record with the pages that are not yet in the file."""
+        lengths = [len(_buffer) for _buffer in buffers]
+        pages = [
+            _buffer[_offset:_offset+PAGE_SIZE]
+            for _buffer in buffers for _offset in range(0, len(_buffer), PAGE_SIZE)
+        ]
+        digests = [hashlib.sha1(_page).digest() for _page in pages]
+        # size of this checkpoint if written to a new file
+        full_size = len(pickle_stream) + sum(
+            len(_page) for _page in dict(zip(digests, pages)).values()
+        )
+        if self._size > COMPACT_RATIO * full_size:
+            self._new_file()
+        table_format = '<LLL%dL%dQ' % (len(buffers), len(pages))
+        record_size = struct.calcsize(RECORD_FORMAT)
+        # new pages are stored after the table and pickle stream
+        offset = self._size + record_size + struct.calcsize(table_format) + len(pickle_stream)
+        offsets, new_pages = [], []
+        for digest, page in zip(digests, pages):
+            if digest not in self._pages:
+                self._pages[digest] = offset
+                new_pages.append(page)
+                offset += len(page)
+            offsets.append(self._pages[digest])
+        table = struct.pack(
+            table_format, len(pickle_stream), len(buffers), len(pages), *(lengths + offsets)
+        )
+        chunks = [table, pickle_stream] + new_pages
+        checksum = 0
+        for chunk in chunks:
+            checksum = zlib.crc32(chunk, checksum)
+        record = struct.pack(RECORD_FORMAT, offset - self._size - record_size, checksum & 0xffffffff)
+        if self._size:
+            with open(self.state_file, 'ab') as out_file:
+                out_file.write(record)
+                out_file.writelines(chunks)
+        else:
+            header_dict = dict(
+                HEADER, checksum=0, format_version=HEADER['format_version'] | CHECKPOINT
+            )
+            header = struct.pack(HEADER_FORMAT, *(header_dict[_key] for _key in HEADER_KEYS))
+            # replace atomically, so that a crash leaves the previous file intact
+            temp_file = u'%s.%d' % (self.state_file, os.getpid())
+            with open(temp_file, 'wb') as out_file:
+                out_file.write(header)
+                out_file.write(record)
+                out_file.writelines(chunks)
+            os.replace(temp_file, self.state_file)
+        self._size = offset
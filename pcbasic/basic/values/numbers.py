@@ -69,9 +69,10 @@ class Value(object):
             return '%s[%s <detached>]' % (sigil_repr, bytes_repr)
 
     def __getstate__(self):
-        # can't pickle memoryview
-        self._buffer = bytearray(self._buffer)
-        return self.__dict__
+        # can't pickle memoryview; copy without detaching the live value from its buffer
+        pickle_dict = self.__dict__.copy()
+        pickle_dict['_buffer'] = bytearray(self._buffer)
+        return pickle_dict
 
     def __setstate__(self, pickle_dict):
         # can't pickle memoryview
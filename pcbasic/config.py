@@ -291,6 +291,7 @@ ARGUMENTS = {
     u'fullscreen': {u'type': u'bool', u'default': False,},
     u'prevent-close': {u'type': u'bool', u'default': False,},
     u'debug': {u'type': u'bool', u'default': False,},
+    u'startup-timing': {u'type': u'bool', u'default': False,},
     u'hide-listing': {u'type': u'int', u'default': 65535,},
     u'hide-protected': {u'type': u'bool', u'default': False,},
     u'mount': {u'type': u'string', u'list': u'*', u'default': [],},
@@ -309,9 +310,12 @@ ARGUMENTS = {
     },
     u'text-encoding': {u'type': u'string', u'default': u'', u'check': _check_text_encoding},
     u'soft-linefeed': {u'type': u'bool', u'default': False,},
+    u'mmap-files': {u'type': u'bool', u'default': False,},
     u'border': {u'type': u'int', u'default': 5,},
     u'mouse-clipboard': {u'type': u'bool', u'default': True,},
     u'state': {u'type': u'string', u'default': u'',},
+    u'checkpoint': {u'type': u'int', u'default': 0,},
+    u'virtual-clock': {u'type': u'bool', u'default': False,},
     u'monitor': {
         u'type': u'string',
         u'choices': (u'rgb', u'composite', u'green', u'amber', u'grey', u'mono'),
@@ -570,8 +574,11 @@ class Settings(object):
             # text file parameters
             'textfile_encoding': self.get('text-encoding'),
             'soft_linefeed': self.get('soft-linefeed'),
+            'mmap_files': self.get('mmap-files'),
             # keyboard settings
             'ctrl_c_is_break': self.get('ctrl-c-break'),
+            # skip waits for sound and timers
+            'virtual_clock': self.get('virtual-clock'),
             # program parameters
             'hide_listing': self.get('hide-listing'),
             'hide_protected': self.get('hide-protected'),
@@ -836,6 +843,7 @@ class Settings(object):
             'resume': self.get('resume'),
             'greeting': greeting,
             'state_file': self._get_state_file(),
+            'checkpoint': self.get('checkpoint'),
             'commands': commands,
             # inserted keystrokes
             # we first need to encode the unicode to bytes before we can decode it
@@ -897,6 +905,11 @@ class Settings(object):
         """Debugging mode."""
         return self.get('debug')
 
+    @property
+    def startup_timing(self):
+        """Report the duration of startup phases."""
+        return self.get('startup-timing')
+
 
 ##############################################################################
 # argument parsing
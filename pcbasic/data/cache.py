@@ -0,0 +1,86 @@
+"""
+PC-BASIC - data.cache
+Cache of parsed font and codepage files
+
+(c) 2013--2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import os
+import io
+import sys
+import pickle
+import hashlib
+import logging
+import tempfile
+
+from ..compat import USER_CACHE_HOME
+
+
+# location of cache files; set to None to disable caching
+# can be redirected, or set to empty to disable caching, through the environment
+CACHE_DIR = os.environ.get(u'PCBASIC_CACHE_DIR', os.path.join(USER_CACHE_HOME, u'pcbasic')) or None
+
+# increase when the structure of cached objects changes
+_FORMAT_VERSION = 2
+
+
+def get_hash(*parts):
+    """Get a hex digest identifying a sequence of bytes objects."""
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(b'%d:' % len(part))
+        sha.update(part)
+    return sha.hexdigest()
+
+
+def cached(kind, name, key, build):
+    """Retrieve an object from the cache, or build it and store it if missing or out of date."""
+    if CACHE_DIR is None:
+        return build()
+    # one file per name, so that outdated entries get overwritten
+    path = os.path.join(CACHE_DIR, u'%s-%s.cache' % (kind, get_hash(name.encode('utf-8'))[:16]))
+    # include the python version as pickle protocols differ
+    header = (_FORMAT_VERSION, tuple(sys.version_info[:2]), name, key)
+    obj = _load(path, header)
+    if obj is None:
+        obj = build()
+        _store(path, header, obj)
+    return obj
+
+
+def _load(path, header):
+    """Load a cache file, return None if missing or if the header does not match."""
+    try:
+        with io.open(path, 'rb') as cache_file:
+            stream = io.BytesIO(cache_file.read())
+    except EnvironmentError:
+        return None
+    try:
+        if pickle.load(stream) != header:
+            return None
+        return pickle.load(stream)
+    except Exception as e:
+        logging.debug('Ignoring damaged cache file %s: %s', path, e)
+        return None
+
+
+def _store(path, header, obj):
+    """Write a cache file; fail silently."""
+    temp_path = None
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        handle, temp_path = tempfile.mkstemp(dir=CACHE_DIR)
+        with io.open(handle, 'wb') as cache_file:
+            pickle.dump(header, cache_file, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(obj, cache_file, pickle.HIGHEST_PROTOCOL)
+        # replace atomically, in case another process is reading the old file
+        os.replace(temp_path, path)
+    except EnvironmentError as e:
+        logging.debug('Could not write cache file %s: %s', path, e)
+        if temp_path:
+            try:
+                os.remove(temp_path)
+            except EnvironmentError:
+                pass
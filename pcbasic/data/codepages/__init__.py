@@ -10,6 +10,7 @@ import logging
 import binascii
 
 from ...compat import resources, unichr
+from ..cache import cached, get_hash
 
 
 # list of available codepages
@@ -22,9 +23,14 @@ CODEPAGES = tuple(
 
 def read_codepage(codepage_name):
     """Read a codepage file and convert to codepage dict."""
-    codepage_name += '.ucp'
+    ucp = resources.read_binary(__package__, codepage_name + '.ucp')
+    return cached('codepage', codepage_name, get_hash(ucp), lambda: _parse_ucp(ucp))
+
+
+def _parse_ucp(ucp):
+    """Convert the contents of a codepage file to codepage dict."""
     codepage = {}
-    for line in resources.read_binary(__package__, codepage_name).splitlines():
+    for line in ucp.splitlines():
         # ignore empty lines and comment lines (first char is #)
         if (not line) or (line[0] == b'#'):
             continue
@@ -10,9 +10,13 @@ This file is released under the GNU GPL version 3 or later.
 import sys
 import logging
 import binascii
+import itertools
 import unicodedata
+from array import array
+from collections.abc import MutableMapping
 
 from ...compat import resources, iteritems, itervalues, unichr, iterchar
+from ..cache import cached, get_hash
 
 
 _HEIGHTS = (8, 14, 16)
@@ -35,11 +39,6 @@ def read_fonts(codepage_dict, font_families):
     """Load font typefaces."""
     # default font is fallback
     font_families = (_DEFAULT_NAME,) + tuple(font_families)
-    # load the graphics fonts, including the 8-pixel RAM font
-    # use set() for speed - lookup is O(1) rather than O(n) for list
-    unicode_needed = set(itervalues(codepage_dict))
-    # break up any grapheme clusters and add components to set of needed glyphs
-    unicode_needed |= set(c for cluster in unicode_needed if len(cluster) > 1 for c in cluster)
     # load font resources
     font_files = {
         _height: [
@@ -49,13 +48,42 @@ def read_fonts(codepage_dict, font_families):
         ]
         for _height in _HEIGHTS
     }
-    # convert
-    uc_fonts = {
+    # retrieve the converted fonts from the cache, or convert
+    # codepages read from file always list their characters in the same order
+    codepage_hash = get_hash(
+        u'\0'.join(itervalues(codepage_dict)).encode('utf-8', 'surrogatepass')
+    )
+    files_hash = tuple(
+        (_height, get_hash(*font_files[_height])) for _height in _HEIGHTS
+    )
+    return cached(
+        'fonts', u'%s:%s' % (u','.join(font_families), codepage_hash), files_hash,
+        lambda: _convert_fonts(codepage_dict, font_files)
+    )
+
+
+def _convert_fonts(codepage_dict, font_files):
+    """Convert font resources to glyph tables."""
+    # load the graphics fonts, including the 8-pixel RAM font
+    # use set() for speed - lookup is O(1) rather than O(n) for list
+    unicode_needed = set(itervalues(codepage_dict))
+    # break up any grapheme clusters and add components to set of needed glyphs
+    unicode_needed |= set(c for cluster in unicode_needed if len(cluster) > 1 for c in cluster)
+    return _pack_fonts({
         _height: load_hex(_font_file, _height, unicode_needed)
         for _height, _font_file in iteritems(font_files)
         if _font_file
-    }
-    return uc_fonts
+    })
+
+
+def _pack_fonts(fontdicts):
+    """Pack font dicts into glyph tables, sharing the character index where possible."""
+    index = None
+    tables = {}
+    for height, fontdict in sorted(iteritems(fontdicts)):
+        tables[height] = GlyphTable(fontdict, index)
+        index = tables[height].index
+    return tables
 
 
 def _read_font_file(name, height):
@@ -70,6 +98,76 @@ def _read_font_file(name, height):
             logging.debug('Failed to load %d-pixel font `%s`: %s', height, name, e)
 
 
+###################################################################################################
+# packed glyph table
+
+class GlyphTable(MutableMapping):
+    """Font dict with glyphs packed into a single buffer and sliced out on access."""
+
+    def __init__(self, fontdict, index=None):
+        """Pack the glyphs of a font dict, using the slots in index if it has the same keys."""
+        if index is None or index.keys() != fontdict.keys():
+            index = {_c: _slot for _slot, _c in enumerate(fontdict)}
+        chars = sorted(index, key=index.__getitem__)
+        # character slot number
+        self._index = index
+        # offset of each glyph in the packed buffer, plus the end of the last glyph
+        self._offsets = array('L', [0])
+        self._offsets.extend(itertools.accumulate(len(fontdict[_c]) for _c in chars))
+        self._packed = b''.join(fontdict[_c] for _c in chars)
+        # glyphs that have been changed since packing; None if deleted
+        self._changed = {}
+
+    @property
+    def index(self):
+        """Character slot numbers, can be shared between tables."""
+        return self._index
+
+    def __getitem__(self, char):
+        """Retrieve a glyph."""
+        if char in self._changed:
+            glyph = self._changed[char]
+            if glyph is None:
+                raise KeyError(char)
+            return glyph
+        slot = self._index[char]
+        return self._packed[self._offsets[slot]:self._offsets[slot+1]]
+
+    def __setitem__(self, char, glyph):
+        """Change a glyph."""
+        self._changed[char] = bytes(glyph)
+
+    def __delitem__(self, char):
+        """Remove a glyph."""
+        # raise KeyError if not present
+        self[char]
+        self._changed[char] = None
+
+    def __iter__(self):
+        """Iterate over characters with glyphs."""
+        for char in self._index:
+            if self._changed.get(char, b'') is not None:
+                yield char
+        for char, glyph in iteritems(self._changed):
+            if glyph is not None and char not in self._index:
+                yield char
+
+    def __len__(self):
+        """Number of characters with glyphs."""
+        return sum(1 for _ in self)
+
+    def copy(self):
+        """Make a copy that shares the packed glyphs."""
+        copy = self.__class__.__new__(self.__class__)
+        copy.__dict__.update(self.__dict__)
+        copy._changed = dict(self._changed)
+        return copy
+
+    def get_shared(self):
+        """Get the packed glyph storage, which is shared between copies and never changed."""
+        return [self._index, self._offsets, self._packed]
+
+
 ###################################################################################################
 # hex font loader
 
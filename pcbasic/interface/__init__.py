@@ -10,21 +10,28 @@ from .base import InitFailed, video_plugins, audio_plugins
 from .interface import Interface, InterfaceAsync
 from ..compat import EMSCRIPTEN
 
+if False:
+    # packagers take note, plugin modules are imported only when requested
+    from . import video_pygame, video_ansi, video_cli, video_curses, video_sdl2
+    from . import audio_pygame, audio_beep, audio_sdl2, audio_portaudio
+
 # video plugins
 from .video import VideoPlugin
-from .video_pygame import VideoPygame
+video_plugins.declare('pygame', '.video_pygame')
 
 if not EMSCRIPTEN:
-    from .video_ansi import VideoANSI
-    from .video_cli import VideoCLI
-    from .video_curses import VideoCurses
-    from .video_sdl2 import VideoSDL2
+    video_plugins.declare('ansi', '.video_ansi')
+    video_plugins.declare('cli', '.video_cli')
+    video_plugins.declare('curses', '.video_curses')
+    video_plugins.declare('sdl2', '.video_sdl2')
 
 # audio plugins
 from .audio import AudioPlugin
-from .audio_pygame import AudioPygame
+audio_plugins.declare('pygame', '.audio_pygame')
 
 if not EMSCRIPTEN:
-    from .audio_beep import AudioBeep
-    from .audio_sdl2 import AudioSDL2
-    from .audio_portaudio import AudioPortAudio
+    audio_plugins.declare('beep', '.audio_beep')
+    audio_plugins.declare('ansi', '.audio_sdl2')
+    audio_plugins.declare('cli', '.audio_sdl2')
+    audio_plugins.declare('sdl2', '.audio_sdl2')
+    audio_plugins.declare('portaudio', '.audio_portaudio')
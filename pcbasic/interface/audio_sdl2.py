@@ -13,7 +13,7 @@ import logging
 import ctypes
 from collections import deque
 
-from ..compat import zip, BASE_DIR
+from ..compat import BASE_DIR
 from .audio import AudioPlugin
 from .base import audio_plugins, InitFailed
 from . import synthesiser
@@ -54,6 +54,8 @@ _CHUNK_LENGTH = 1192 * 4
 _CALLBACK_CHUNK_LENGTH = 2048
 # number of samples below which to replenish the buffer
 _MIN_SAMPLES_BUFFER = 2 * _CALLBACK_CHUNK_LENGTH
+# initial size of sample buffers
+_BUFFER_LENGTH = _MIN_SAMPLES_BUFFER + 2 * _CHUNK_LENGTH
 # pause audio device after given number of ticks without sound
 _QUIET_QUIT = 100
 
@@ -74,8 +76,12 @@ class AudioSDL2(AudioPlugin):
         self._signal_sources = synthesiser.get_signal_sources()
         # sound generators for each voice
         self._generators = [deque() for _ in synthesiser.VOICES]
-        # buffer of samples; drained by callback, replenished by _play_sound
-        self._samples = [bytearray() for _ in synthesiser.VOICES]
+        # buffers of samples for each voice; mixed into the output buffer by _work
+        self._mixer = synthesiser.Mixer(_BUFFER_LENGTH)
+        # buffer of mixed 16-bit samples; drained by callback
+        self._output = synthesiser.RingBuffer(2 * _BUFFER_LENGTH)
+        # work buffer for callback
+        self._chunk = bytearray(2 * _CALLBACK_CHUNK_LENGTH)
         self._next_tone = [None for _ in synthesiser.VOICES]
         self._device = None
         self._audiospec = None
@@ -119,8 +125,9 @@ class AudioSDL2(AudioPlugin):
         self._next_tone = [None for _ in synthesiser.VOICES]
         for gen in self._generators:
             gen.clear()
+        self._mixer.clear()
         sdl2.SDL_LockAudioDevice(self._device)
-        self._samples = [bytearray() for _ in synthesiser.VOICES]
+        self._output.clear()
         sdl2.SDL_UnlockAudioDevice(self._device)
 
     def _work(self):
@@ -134,7 +141,8 @@ class AudioSDL2(AudioPlugin):
             self._quiet_ticks = 0
             sdl2.SDL_PauseAudioDevice(self._device, 0)
         for voice in synthesiser.VOICES:
-            if len(self._samples[voice]) > _MIN_SAMPLES_BUFFER:
+            # count samples already mixed as well as those waiting to be mixed
+            if len(self._mixer[voice]) + len(self._output) // 2 > _MIN_SAMPLES_BUFFER:
                 # nothing to do
                 continue
             while True:
@@ -152,28 +160,29 @@ class AudioSDL2(AudioPlugin):
                     break
                 self._next_tone[voice] = None
             if current_chunk is not None:
-                # append chunk to samples list
-                # lock to ensure callback doesn't try to access the list too
-                sdl2.SDL_LockAudioDevice(self._device)
-                self._samples[voice] = bytearray().join((self._samples[voice], current_chunk))
-                sdl2.SDL_UnlockAudioDevice(self._device)
+                self._mixer[voice].write(current_chunk)
+        # mix as far as all sounding voices have samples
+        lengths = [
+            len(self._mixer[_voice]) for _voice in synthesiser.VOICES
+            if self._next_tone[_voice] is not None or self._generators[_voice]
+        ]
+        if not lengths:
+            # nothing more to come, mix whatever is left
+            lengths = [max(len(self._mixer[_voice]) for _voice in synthesiser.VOICES)]
+        mixed = self._mixer.mix(min(lengths))
+        if mixed:
+            # lock to ensure callback doesn't try to access the buffer too
+            sdl2.SDL_LockAudioDevice(self._device)
+            self._output.write(mixed)
+            sdl2.SDL_UnlockAudioDevice(self._device)
 
     def _get_next_chunk(self, notused, stream, length_bytes):
-        """Callback function to generate the next chunk to be played."""
-        # this assumes 8-bit samples
-        length = length_bytes // 2
+        """Callback function to copy the next chunk to be played."""
+        if len(self._chunk) != length_bytes:
+            self._chunk = bytearray(length_bytes)
+        moved = self._output.read_into(memoryview(self._chunk))
         # if samples have run out, add silence
-        samples = (
-            _samp.ljust(length, b'\0') if len(_samp) < length else _samp[:length]
-            for _samp in self._samples
-        )
-        # mix the samples
-        mixed = bytearray(sum(_b) & 0xff for _b in zip(*samples))
-        # convert from S8 to S16 (little-endian)
-        # interlace with leading zeros to multiply by 256
-        mixed_16 = bytearray(length_bytes)
-        mixed_16[1::2] = mixed
-        self._samples = [_samp[length:] for _samp in self._samples]
+        self._chunk[moved:] = bytes(length_bytes - moved)
         ctypes.memmove(
-            stream, (ctypes.c_char * length_bytes).from_buffer(mixed_16), length_bytes
+            stream, (ctypes.c_char * length_bytes).from_buffer(self._chunk), length_bytes
         )
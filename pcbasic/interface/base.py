@@ -7,6 +7,7 @@ This file is released under the GNU GPL version 3 or later.
 """
 
 import os
+from importlib import import_module
 
 
 # message displayed when wiating to close
@@ -25,6 +26,12 @@ class PluginRegister(object):
     def __init__(self):
         """Initialise plugin register."""
         self._plugins = {}
+        # modules providing plugins that have not been imported yet
+        self._modules = {}
+
+    def declare(self, name, module):
+        """Declare the module providing a plugin, to be imported when first requested."""
+        self._modules[name] = module
 
     def register(self, name):
         """Decorator to register a plugin."""
@@ -34,7 +41,10 @@ class PluginRegister(object):
         return decorated_plugin
 
     def __getitem__(self, name):
-        """Retrieve plugin."""
+        """Retrieve plugin, importing its module if necessary."""
+        if name not in self._plugins and name in self._modules:
+            # registers the plugin as a side effect
+            import_module(self._modules[name], __package__)
         return self._plugins[name]
 
 
@@ -14,6 +14,7 @@ import traceback
 from ..compat import queue
 
 from ..basic.base import signals
+from ..basic.eventcycle import VideoQueue
 from .base import InitFailed, video_plugins, audio_plugins, WAIT_MESSAGE
 from .audio import AudioPlugin
 
@@ -21,6 +22,9 @@ from .audio import AudioPlugin
 # millisecond delay
 DELAY = 12
 
+# number of coalesced video signals queued before the interpreter waits for the interface
+VIDEO_QUEUE_SIZE = 200
+
 
 class Interface(object):
     """User interface for PC-BASIC session."""
@@ -28,7 +32,8 @@ class Interface(object):
     def __init__(self, try_interfaces=(), audio_override=None, wait=False, **kwargs):
         """Initialise interface."""
         self._input_queue = queue.Queue()
-        self._video_queue = queue.Queue()
+        # coalesce superseded video signals so the interpreter rarely waits for the interface
+        self._video_queue = VideoQueue(maxsize=VIDEO_QUEUE_SIZE)
         self._audio_queue = queue.Queue()
         self._wait = wait
         self._video, self._audio = None, None
@@ -61,6 +66,11 @@ class Interface(object):
         """Retrieve interface queues."""
         return self._input_queue, self._video_queue, self._audio_queue
 
+    @property
+    def graphical(self):
+        """The video plugin displays pixels, not only text."""
+        return self._video.graphical
+
     def launch(self, target, *args, **kwargs):
         """Start an interactive interpreter session."""
         thread = threading.Thread(target=self._thread_runner, args=(target,) + args, kwargs=kwargs)
@@ -110,6 +120,9 @@ class Interface(object):
     def quit_input(self):
         """Send signal through the input queue to quit BASIC."""
         self._input_queue.put(signals.Event(signals.QUIT))
+        if isinstance(self._video_queue, VideoQueue):
+            # nothing retrieves video signals any more, so don't let the interpreter wait for that
+            self._video_queue.maxsize = 0
         # drain video queue (joined in other thread)
         while not self._video_queue.empty():
             try:
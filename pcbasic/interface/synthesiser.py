@@ -7,8 +7,12 @@ This file is released under the GNU GPL version 3 or later.
 """
 
 from math import ceil
+from collections import OrderedDict
 
-from ..compat import xrange
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 # initial condition - see dosbox source
@@ -44,6 +48,13 @@ _AMPLITUDE = [0] + [int(_MAX_AMPLITUDE * _STEP_FACTOR**_power) for _power in ran
 # resolution for averaging, should be even
 _RESOLUTION = 20
 
+# maximum number of waveform tables to keep
+_WAVEFORM_CACHE_SIZE = 64
+# longest shift register cycle for which whole periods of the waveform are kept
+_MAX_TILED_CYCLE = 64
+# below this number of samples per half-wave, NumPy is faster than joining half-waves
+_NUMPY_MAX_SAMPLES = 8
+
 
 class SignalSource(object):
     """Linear Feedback Shift Register to generate noise or tone."""
@@ -52,10 +63,17 @@ class SignalSource(object):
         """Initialise the signal source."""
         self._lfsr = init
         self._feedback = feedback
+        # precomputed output of the shift register
+        self.cycle = _get_lfsr_cycle(feedback, init)
         # "remaining phase"/pi, i.e. runs 0 to 1 or 0 to -1 on half wavelength
         self.phase = 0.
         self.bit = 0
 
+    @property
+    def position(self):
+        """Position of the shift register in its cycle."""
+        return self.cycle.position[self._lfsr]
+
     def next(self):
         """Get a sample bit."""
         bit = self._lfsr & 1
@@ -65,6 +83,165 @@ class SignalSource(object):
         self.bit = bit
         return bit
 
+    def bits(self, count):
+        """Get a sequence of sample bits."""
+        position = self.position
+        bits = self.cycle.get_bits(position, count)
+        if bits:
+            self._lfsr = self.cycle.states[self.cycle.advance(position, count)]
+            self.bit = bits[-1]
+        return bits
+
+
+class _LFSRCycle(object):
+    """Output of a Linear Feedback Shift Register from a given state until it repeats."""
+
+    def __init__(self, feedback, init):
+        """Run the shift register through its cycle."""
+        self.bits = bytearray()
+        # shift register state before each bit is produced
+        self.states = []
+        # position of each state in the cycle
+        self.position = {}
+        lfsr = init
+        while lfsr not in self.position:
+            self.position[lfsr] = len(self.states)
+            self.states.append(lfsr)
+            bit = lfsr & 1
+            lfsr >>= 1
+            if bit:
+                lfsr ^= feedback
+            self.bits.append(bit)
+        # output repeats from here on
+        self.loop_start = self.position[lfsr]
+
+    @property
+    def loop_length(self):
+        """Length of the repeating part of the output."""
+        return len(self.bits) - self.loop_start
+
+    def advance(self, position, count):
+        """Position after producing a number of bits."""
+        position += count
+        if position >= len(self.bits):
+            position = self.loop_start + (position - self.loop_start) % self.loop_length
+        return position
+
+    def get_bits(self, position, count):
+        """Get a sequence of bits from a given position."""
+        if position + count <= len(self.bits):
+            return self.bits[position:position+count]
+        head = self.bits[position:]
+        rest = count - len(head)
+        loop = self.bits[self.loop_start:]
+        return head + (loop * (rest // len(loop) + 1))[:rest]
+
+
+class _Waveform(object):
+    """Tables to build samples for a given half wavelength, amplitude and signal source."""
+
+    def __init__(self, stretch, amplitude):
+        """Build the waveform tables."""
+        # number of sub-samples per half-wave, at resolution _RESOLUTION
+        self._stretch = stretch
+        # sample value for each number of set sub-samples in a sample
+        self._levels = [_to_sample(_ones, amplitude) for _ones in range(_RESOLUTION+1)]
+        # whole periods of the waveform, by shift register state at their start
+        self._tiles = {}
+        if stretch >= _RESOLUTION:
+            # start of each half-wave within its sample, repeating after a number of half-waves
+            period = _RESOLUTION // _gcd(stretch, _RESOLUTION)
+            self._phases = [(_i * stretch) % _RESOLUTION for _i in range(period)]
+            # samples for a half-wave by starting phase, previous bit and bit
+            self._pieces = {_phase: self._build_pieces(_phase) for _phase in set(self._phases)}
+
+    def _build_pieces(self, phase):
+        """Build the samples for a half-wave starting at a given phase within a sample."""
+        # number of samples entirely within the half-wave
+        count = (phase + self._stretch) // _RESOLUTION - (phase + _RESOLUTION - 1) // _RESOLUTION
+        pieces = [[None, None], [None, None]]
+        for prev in (0, 1):
+            for bit in (0, 1):
+                piece = bytearray([self._levels[bit * _RESOLUTION]]) * count
+                if phase:
+                    # the first sample is shared with the previous half-wave
+                    shared = self._levels[prev * phase + bit * (_RESOLUTION - phase)]
+                    piece = bytearray([shared]) + piece
+                pieces[prev][bit] = piece
+        return pieces
+
+    def level(self, bit):
+        """Sample value for a constant bit."""
+        return self._levels[bit * _RESOLUTION]
+
+    def render(self, signal_source, num_half_waves):
+        """Get the samples for a number of half-waves from the signal source."""
+        cycle = signal_source.cycle
+        position = signal_source.position
+        if (
+                self._stretch >= _RESOLUTION and cycle.loop_length <= _MAX_TILED_CYCLE
+                and position >= cycle.loop_start
+            ):
+            state = cycle.states[position]
+            signal_source.bits(num_half_waves)
+            try:
+                tile = self._tiles[state]
+            except KeyError:
+                # build a whole period of the waveform
+                length = _lcm(len(self._phases), cycle.loop_length)
+                tile = self._tiles[state] = self._render_pieces(cycle.get_bits(position, length))
+            length = num_half_waves * self._stretch // _RESOLUTION
+            return (tile * (-(-length // len(tile))))[:length]
+        bits = signal_source.bits(num_half_waves)
+        if numpy and self._stretch < _NUMPY_MAX_SAMPLES * _RESOLUTION:
+            return self._render_numpy(bits)
+        elif self._stretch >= _RESOLUTION:
+            return self._render_pieces(bits)
+        return self._render_samples(bits)
+
+    def _render_pieces(self, bits):
+        """Build samples half-wave by half-wave; needs at least one sample per half-wave."""
+        phases, pieces = self._phases, self._pieces
+        period = len(phases)
+        # the first half-wave starts at phase 0, so the previous bit is not used
+        return bytearray().join(
+            pieces[phases[_i % period]][bits[_i-1]][bits[_i]]
+            for _i in range(len(bits))
+        )
+
+    def _render_samples(self, bits):
+        """Build samples one by one from the number of set sub-samples."""
+        stretch = self._stretch
+        length = len(bits) * stretch // _RESOLUTION
+        # number of set sub-samples before each half-wave
+        before = [0]
+        for bit in bits:
+            before.append(before[-1] + bit)
+        bits = bits + bytearray(1)
+        set_before = [
+            stretch * before[_q] + bits[_q] * _r
+            for _q, _r in (divmod(_k * _RESOLUTION, stretch) for _k in range(length + 1))
+        ]
+        return bytearray(
+            self._levels[_next - _this] for _this, _next in zip(set_before[:-1], set_before[1:])
+        )
+
+    def _render_numpy(self, bits):
+        """Build samples from the number of set sub-samples, using NumPy."""
+        stretch = self._stretch
+        length = len(bits) * stretch // _RESOLUTION
+        half_waves = numpy.frombuffer(bytes(bits), dtype=numpy.uint8).astype(numpy.int64)
+        # number of set sub-samples before each half-wave
+        before = numpy.zeros(len(half_waves) + 1, dtype=numpy.int64)
+        numpy.cumsum(half_waves, out=before[1:])
+        half_waves = numpy.append(half_waves, 0)
+        quotient, remainder = numpy.divmod(
+            numpy.arange(length + 1, dtype=numpy.int64) * _RESOLUTION, stretch
+        )
+        set_before = stretch * before[quotient] + half_waves[quotient] * remainder
+        levels = numpy.array(self._levels, dtype=numpy.uint8)
+        return bytearray(levels[numpy.diff(set_before)].tobytes())
+
 
 class SoundGenerator(object):
     """Sound sample chunk generator."""
@@ -76,6 +253,7 @@ class SoundGenerator(object):
         self._feedback = feedback
         # actual duration and gap length
         self._duration = duration
+        self._volume = volume
         self._amplitude = _AMPLITUDE[volume]
         self._frequency = frequency
         self.loop = loop
@@ -98,40 +276,24 @@ class SoundGenerator(object):
             chunk = bytearray(length)
         else:
             half_wavelength = SAMPLE_RATE / (2.*self._frequency)
+            waveform = _get_waveform(
+                self._frequency, self._volume, self._signal_source,
+                int(half_wavelength * _RESOLUTION), self._amplitude
+            )
             # generate first half-wave so as to complete the last one played
             if self._signal_source.phase:
                 first_length = int(half_wavelength * self._signal_source.phase)
-                first_half_wave = bytearray([self._signal_source.bit]) * first_length * _RESOLUTION
+                first_half_wave = (
+                    bytearray([waveform.level(self._signal_source.bit)]) * first_length
+                )
                 length -= first_length
                 self._signal_source.phase = 0.
             else:
                 first_half_wave = bytearray()
-            num_half_waves = int(ceil(length / half_wavelength))
-            # generate bits
-            bits = (
-                self._signal_source.next()
-                for _ in range(num_half_waves)
-            )
-            # do sampling by averaging the signal over bins of given resolution
-            # this allows to use vectors all the way
-            # which is *much* faster than looping over an array
-            # stretch array by half_wavelength * _RESOLUTION
-            stretch = int(half_wavelength * _RESOLUTION)
-            waves = bytearray().join(bytearray([_b]) * stretch for _b in bits)
-            matrix = bytearray().join((first_half_wave, waves))
-            # cut off on round number of resolution blocks
-            use_length = len(matrix) - (len(matrix) % _RESOLUTION)
-            # average over blocks
-            # sums are between 0 and RESOLUTION, inclusive
-            sums = (
-                sum(matrix[_i:_i+_RESOLUTION])
-                for _i in xrange(0, use_length, _RESOLUTION)
-            )
-            # scale to signed amplitude
-            half_res = _RESOLUTION // 2
-            averages = ((_s - half_res) * self._amplitude // _RESOLUTION for _s in sums)
-            # pack signed bytes into bytearray
-            chunk = bytearray(_sb if _sb >= 0 else 0xff + _sb for _sb in averages)
+            num_half_waves = max(0, int(ceil(length / half_wavelength)))
+            # sample by averaging the signal over bins of given resolution
+            # half-waves are built from precomputed tables; partial bins at the end are cut off
+            chunk = first_half_wave + waveform.render(self._signal_source, num_half_waves)
         if not self.loop:
             # last chunk is shorter
             if self._count_samples + len(chunk) < self._num_samples:
@@ -151,6 +313,95 @@ class SoundGenerator(object):
         return chunk
 
 
+class RingBuffer(object):
+    """Preallocated first-in, first-out byte buffer."""
+
+    def __init__(self, size):
+        """Allocate the buffer."""
+        self._buffer = bytearray(size)
+        self._start = 0
+        self._length = 0
+
+    def __len__(self):
+        """Number of bytes in the buffer."""
+        return self._length
+
+    def clear(self):
+        """Empty the buffer."""
+        self._start = 0
+        self._length = 0
+
+    def write(self, data):
+        """Append bytes to the buffer, growing it if needed."""
+        data = memoryview(data)
+        size = len(self._buffer)
+        if self._length + len(data) > size:
+            # move contents to the start of a larger buffer
+            contents = bytearray(self._length)
+            self.read_into(memoryview(contents))
+            self._buffer = contents + bytearray(max(size, len(data)))
+            self._start, self._length = 0, len(contents)
+            size = len(self._buffer)
+        end = (self._start + self._length) % size
+        first = min(len(data), size - end)
+        self._buffer[end:end+first] = data[:first]
+        self._buffer[:len(data)-first] = data[first:]
+        self._length += len(data)
+
+    def read_into(self, target):
+        """Move bytes from the buffer to fill a writable memoryview; return the number moved."""
+        count = min(len(target), self._length)
+        size = len(self._buffer)
+        first = min(count, size - self._start)
+        target[:first] = self._buffer[self._start:self._start+first]
+        target[first:count] = self._buffer[:count-first]
+        self._start = (self._start + count) % size
+        self._length -= count
+        return count
+
+
+class Mixer(object):
+    """Sample buffers for each voice, mixed into signed 16-bit samples."""
+
+    def __init__(self, size):
+        """Allocate the buffers."""
+        self._voices = [RingBuffer(size) for _ in VOICES]
+        # work buffers for the samples of a voice, also spaced out to 16-bit lanes
+        self._samples = bytearray(size)
+        self._lanes = bytearray(2 * size)
+
+    def __getitem__(self, voice):
+        """Sample buffer for a voice."""
+        return self._voices[voice]
+
+    def clear(self):
+        """Empty the sample buffers."""
+        for voice in self._voices:
+            voice.clear()
+
+    def mix(self, count):
+        """Take a number of samples from each voice and mix to signed 16-bit little-endian."""
+        if not count:
+            return b''
+        if len(self._samples) < count:
+            self._samples = bytearray(count)
+            self._lanes = bytearray(2 * count)
+        samples = memoryview(self._samples)[:count]
+        lanes = memoryview(self._lanes)[:2*count]
+        # add the voices as big integers with a 16-bit lane per sample
+        # lane sums are at most 4*255, so they don't carry over into the next lane
+        total = 0
+        for voice in self._voices:
+            moved = voice.read_into(samples)
+            # voices that have run out are silent
+            samples[moved:] = bytes(count - moved)
+            self._lanes[0:2*count:2] = samples
+            total += int.from_bytes(lanes, 'little')
+        # wrap the sum to a signed 8-bit sample and shift to the top byte
+        low_bytes = int.from_bytes(b'\xff\0' * count, 'little')
+        return ((total & low_bytes) << 8).to_bytes(2 * count, 'little')
+
+
 def get_signal_sources():
     """Return three tone voices plus a noise source."""
     return [
@@ -158,3 +409,54 @@ def get_signal_sources():
         else SignalSource(FEEDBACK_TONE, INIT_TONE)
         for _voice in VOICES
     ]
+
+
+###############################################################################
+# waveform tables
+
+# shift register cycles by feedback and initial state
+_lfsr_cycles = {}
+# waveform tables by frequency, volume and feedback, least recently used first
+_waveforms = OrderedDict()
+
+
+def _get_lfsr_cycle(feedback, init):
+    """Retrieve the cycle of a shift register, building if needed."""
+    try:
+        return _lfsr_cycles[(feedback, init)]
+    except KeyError:
+        cycle = _lfsr_cycles[(feedback, init)] = _LFSRCycle(feedback, init)
+        return cycle
+
+
+def _get_waveform(frequency, volume, signal_source, stretch, amplitude):
+    """Retrieve a waveform table, building if needed."""
+    key = (frequency, volume, signal_source._feedback)
+    try:
+        waveform = _waveforms.pop(key)
+    except KeyError:
+        waveform = _Waveform(stretch, amplitude)
+        if len(_waveforms) >= _WAVEFORM_CACHE_SIZE:
+            _waveforms.popitem(last=False)
+    _waveforms[key] = waveform
+    return waveform
+
+
+def _to_sample(ones, amplitude):
+    """Convert a number of set sub-samples to a signed 8-bit sample."""
+    # scale to signed amplitude
+    signed = (ones - _RESOLUTION // 2) * amplitude // _RESOLUTION
+    # pack signed bytes
+    return signed if signed >= 0 else 0xff + signed
+
+
+def _gcd(a, b):
+    """Greatest common divisor."""
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def _lcm(a, b):
+    """Least common multiple."""
+    return a * b // _gcd(a, b)
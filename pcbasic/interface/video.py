@@ -10,11 +10,15 @@ import time
 
 from ..compat import queue
 from ..basic.base import signals
+from ..basic.eventcycle import VideoQueue
 
 
 class VideoPlugin(object):
     """Base class for display/input interface plugins."""
 
+    # plugin displays pixels; text-only plugins ignore the sprite in update()
+    graphical = True
+
     def __init__(self, input_queue, video_queue, **kwargs):
         """Setup the interface."""
         self.alive = True
@@ -53,6 +57,11 @@ class VideoPlugin(object):
 
     def _drain_queue(self):
         """Drain signal queue."""
+        if isinstance(self._video_queue, VideoQueue):
+            # handle only what has been queued so far, as one frame
+            for signal in self._video_queue.get_frame():
+                self._handle_signal(signal)
+            return True
         while True:
             try:
                 if type(self._video_queue) is asyncio.Queue:
@@ -63,14 +72,18 @@ class VideoPlugin(object):
                 return True
             # putting task_done before the execution avoids hanging on join() after an exception
             self._video_queue.task_done()
-            if signal.event_type == signals.QUIT:
-                # close thread
-                self.alive = False
-            else:
-                try:
-                    self._handlers[signal.event_type](*signal.params)
-                except KeyError:
-                    pass
+            self._handle_signal(signal)
+
+    def _handle_signal(self, signal):
+        """Handle a video signal."""
+        if signal.event_type == signals.QUIT:
+            # close thread
+            self.alive = False
+        else:
+            try:
+                self._handlers[signal.event_type](*signal.params)
+            except KeyError:
+                pass
 
     # plugin overrides
 
@@ -114,7 +127,10 @@ class VideoPlugin(object):
         """Move the cursor to a new position and set attribute and width."""
 
     def scroll(self, direction, start_row, stop_row, back_attr):
-        """Scroll the screen between start_row and stop_row. direction 1 is down, -1 up."""
+        """
+        Scroll the screen between start_row and stop_row. direction 1 is down, -1 up;
+        the video queue merges consecutive scrolls into a scroll by abs(direction) rows.
+        """
 
     def set_cursor_shape(self, from_line, to_line):
         """Build a sprite for the cursor."""
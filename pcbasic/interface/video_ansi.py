@@ -209,25 +209,25 @@ class VideoANSI(video_cli.VideoTextBase):
         console.move_cursor_to(self._cursor_row + self._border_y, self._cursor_col + self._border_x)
 
     def scroll(self, direction, from_line, scroll_height, back_attr):
-        """Scroll the screen between from_line and scroll_height."""
+        """Scroll the screen between from_line and scroll_height by abs(direction) rows."""
         # set the default background
         # as some (not all) consoles use the background color when inserting/deleting
         # and if they can't resize this leads to glitches outside the window
         self._set_attributes(7, 0, False, False)
-        if direction == -1:
-            self._scroll_up(from_line, scroll_height, back_attr)
+        if direction < 0:
+            self._scroll_up(from_line, scroll_height, back_attr, -direction)
         else:
-            self._scroll_down(from_line, scroll_height, back_attr)
+            self._scroll_down(from_line, scroll_height, back_attr, direction)
 
-    def _scroll_up(self, from_line, scroll_height, back_attr):
+    def _scroll_up(self, from_line, scroll_height, back_attr, rows):
         """Scroll the screen up between from_line and scroll_height."""
-        console.scroll(from_line + self._border_y, scroll_height + self._border_y, rows=-1)
-        self.clear_rows(back_attr, scroll_height, scroll_height)
+        console.scroll(from_line + self._border_y, scroll_height + self._border_y, rows=-rows)
+        self.clear_rows(back_attr, max(from_line, scroll_height-rows+1), scroll_height)
 
-    def _scroll_down(self, from_line, scroll_height, back_attr):
+    def _scroll_down(self, from_line, scroll_height, back_attr, rows):
         """Scroll the screen down between from_line and scroll_height."""
-        console.scroll(from_line + self._border_y, scroll_height + self._border_y, rows=1)
-        self.clear_rows(back_attr, from_line, from_line)
+        console.scroll(from_line + self._border_y, scroll_height + self._border_y, rows=rows)
+        self.clear_rows(back_attr, from_line, min(scroll_height, from_line+rows-1))
 
     def set_caption_message(self, msg):
         """Add a message to the window caption."""
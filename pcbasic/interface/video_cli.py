@@ -154,6 +154,8 @@ ALT_KEY_TO_EASCII = {
 class VideoTextBase(VideoPlugin):
     """Text-based interface."""
 
+    graphical = False
+
     def __init__(self, input_queue, video_queue, **kwargs):
         """Initialise text-based interface."""
         if not console:
@@ -226,28 +228,30 @@ class VideoCLI(VideoTextBase):
         self._refresh(start, stop)
 
     def scroll(self, direction, start_row, stop_row, back_attr):
-        """Scroll the screen between start_row and stop_row."""
-        if direction == -1:
-            self._scroll_up(start_row, stop_row, back_attr)
+        """Scroll the screen between start_row and stop_row by abs(direction) rows."""
+        if direction < 0:
+            self._scroll_up(start_row, stop_row, back_attr, -direction)
         else:
-            self._scroll_down(start_row, stop_row, back_attr)
+            self._scroll_down(start_row, stop_row, back_attr, direction)
         self._refresh(start_row, stop_row)
 
-    def _scroll_up(self, start_row, stop_row, back_attr):
+    def _scroll_up(self, start_row, stop_row, back_attr, rows):
         """Scroll the screen up between start_row and stop_row."""
         self._text[start_row-1:stop_row] = (
-            self._text[start_row:stop_row] + [[u' '] * len(self._text[0])]
+            self._text[start_row-1+rows:stop_row]
+            + [[u' '] * len(self._text[0]) for _ in range(rows)]
         )
-        if start_row < self._last_row <= stop_row:
-            self._last_row -= 1
+        if start_row <= self._last_row <= stop_row:
+            self._last_row = max(start_row, self._last_row - rows)
 
-    def _scroll_down(self, start_row, stop_row, back_attr):
+    def _scroll_down(self, start_row, stop_row, back_attr, rows):
         """Scroll the screen down between start_row and stop_row."""
         self._text[start_row-1:stop_row] = (
-            [[u' '] * len(self._text[0])] + self._text[start_row-1:stop_row-1]
+            [[u' '] * len(self._text[0]) for _ in range(rows)]
+            + self._text[start_row-1:stop_row-rows]
         )
-        if start_row <= self._last_row < stop_row:
-            self._last_row += 1
+        if start_row <= self._last_row <= stop_row:
+            self._last_row = min(stop_row, self._last_row + rows)
 
     def set_mode(self, canvas_height, canvas_width, text_height, text_width):
         """Initialise video mode """
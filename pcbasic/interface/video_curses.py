@@ -87,6 +87,8 @@ if curses:
 class VideoCurses(VideoPlugin):
     """Curses-based text interface."""
 
+    graphical = False
+
     def __init__(self, input_queue, video_queue, caption=u'', border_width=0, **kwargs):
         """Initialise the text interface."""
         logging.warning('The `curses` interface is deprecated, please use the `text` interface instead.')
@@ -398,27 +400,31 @@ class VideoCurses(VideoPlugin):
             col = start_col
 
     def scroll(self, direction, from_line, scroll_height, back_attr):
-        """Scroll the screen between from_line and scroll_height."""
-        if direction == -1:
-            self._scroll_up(from_line, scroll_height, back_attr)
+        """Scroll the screen between from_line and scroll_height by abs(direction) rows."""
+        if direction < 0:
+            self._scroll_up(from_line, scroll_height, back_attr, -direction)
         else:
-            self._scroll_down(from_line, scroll_height, back_attr)
+            self._scroll_down(from_line, scroll_height, back_attr, direction)
 
-    def _scroll_up(self, from_line, scroll_height, back_attr):
+    def _scroll_up(self, from_line, scroll_height, back_attr, rows):
         """Scroll the screen up between from_line and scroll_height."""
         bgcolor = self._curses_colour(7, back_attr, False)
-        self._curses_scroll(from_line, scroll_height, -1)
-        self.clear_rows(back_attr, scroll_height, scroll_height)
-        if self.cursor_row > 1:
-            self.window.move(self.border_y+self.cursor_row-2, self.border_x+self.cursor_col-1)
+        self._curses_scroll(from_line, scroll_height, -rows)
+        self.clear_rows(back_attr, max(from_line, scroll_height-rows+1), scroll_height)
+        if self.cursor_row > rows:
+            self.window.move(
+                self.border_y+self.cursor_row-1-rows, self.border_x+self.cursor_col-1
+            )
 
-    def _scroll_down(self, from_line, scroll_height, back_attr):
+    def _scroll_down(self, from_line, scroll_height, back_attr, rows):
         """Scroll the screen down between from_line and scroll_height."""
         bgcolor = self._curses_colour(7, back_attr, False)
-        self._curses_scroll(from_line, scroll_height, 1)
-        self.clear_rows(back_attr, from_line, from_line)
-        if self.cursor_row < self.height:
-            self.window.move(self.border_y+self.cursor_row, self.border_x+self.cursor_col-1)
+        self._curses_scroll(from_line, scroll_height, rows)
+        self.clear_rows(back_attr, from_line, min(scroll_height, from_line+rows-1))
+        if self.cursor_row + rows <= self.height:
+            self.window.move(
+                self.border_y+self.cursor_row-1+rows, self.border_x+self.cursor_col-1
+            )
 
     def _curses_scroll(self, from_line, scroll_height, direction):
         """Perform a scroll in curses."""
@@ -97,6 +97,10 @@ class VideoPygame(VideoPlugin):
         # update cycle
         # update flag
         self.busy = False
+        # palette changed, but canvas unchanged
+        self._palette_changed = False
+        # 8-bit screen scaled to window size, kept to be mapped again on palette changes
+        self._scaled = None
         # refresh cycle parameters
         self._cycle = 0
         self.last_cycle = 0
@@ -358,7 +362,10 @@ class VideoPygame(VideoPlugin):
         if self._palette_blinks or self.text_cursor:
             self.blink_state = 0 if self._cycle < BLINK_CYCLES * 2 else 1
             if self._cycle % BLINK_CYCLES == 0:
-                self.busy = True
+                if self.text_cursor:
+                    self.busy = True
+                else:
+                    self._palette_changed = True
         if self.cursor_visible and (
                 (self.cursor_row != self.last_row) or (self.cursor_col != self.last_col)
             ):
@@ -372,6 +379,8 @@ class VideoPygame(VideoPlugin):
         if self.busy:
             self._do_flip()
             self.busy = False
+        elif self._palette_changed:
+            self._do_remap()
 
     def _do_flip(self):
         """Draw the canvas to the screen."""
@@ -395,6 +404,13 @@ class VideoPygame(VideoPlugin):
             create_feedback(workscreen, self.clipboard.selection_rect)
         if self._pixel_packing:
             screen = apply_composite_artifacts(screen, *self._pixel_packing)
+        self._palette_changed = False
+        if not self._smooth and not self._pixel_packing:
+            # scale the attributes and keep them, so that palette changes only need a re-map
+            self._scaled = pygame.transform.scale(screen, self._window_sizer.window_size)
+            self._do_remap()
+            return
+        self._scaled = None
         screen.set_palette(self._palette[self.blink_state])
         letterbox = pygame.Rect(
             self._window_sizer.letterbox_shift, self._window_sizer.window_size
@@ -413,6 +429,16 @@ class VideoPygame(VideoPlugin):
             )
         pygame.display.flip()
 
+    def _do_remap(self):
+        """Map the scaled screen onto the display with the current palette."""
+        self._palette_changed = False
+        if self._scaled is None:
+            self._do_flip()
+            return
+        self._scaled.set_palette(self._palette[self.blink_state])
+        self.display.blit(self._scaled, self._window_sizer.letterbox_shift)
+        pygame.display.flip()
+
     def _draw_cursor(self, screen):
         """Draw the cursor on the surface provided."""
         if not self.cursor_visible:
@@ -507,8 +533,11 @@ class VideoPygame(VideoPlugin):
         self._palette[0] = [_fore for _fore, _, _, _ in attributes]
         self._palette[1] = [_back if _blink else _fore for _fore, _back, _blink, _ in attributes]
         self._palette_blinks = self._palette[0] != self._palette[1]
+        if pack_pixels != self._pixel_packing:
+            self.busy = True
         self._pixel_packing = pack_pixels
-        self.busy = True
+        # attributes are unchanged, only their colours need to be mapped again
+        self._palette_changed = True
 
     def set_border_attr(self, attr):
         """Change the border attribute."""
@@ -543,7 +572,7 @@ class VideoPygame(VideoPlugin):
             self.cursor.set_palette_at(254, pygame.Color(0, self.cursor_attr, self.cursor_attr))
 
     def scroll(self, direction, from_line, scroll_height, back_attr):
-        """Scroll the screen between from_line and scroll_height."""
+        """Scroll the screen between from_line and scroll_height by abs(direction) rows."""
         temp_scroll_area = pygame.Rect(
             0, (from_line-1)*self.font_height,
             self.size[0], (scroll_height-from_line+1) * self.font_height
@@ -551,10 +580,14 @@ class VideoPygame(VideoPlugin):
         # scroll
         self.canvas.set_clip(temp_scroll_area)
         self.canvas.scroll(0, direction * self.font_height)
-        # empty new line
+        # empty new lines
         bg = (0, 0, back_attr)
+        if direction < 0:
+            new_line = scroll_height + direction
+        else:
+            new_line = from_line - 1
         self.canvas.fill(
-            bg, (0, (scroll_height-1) * self.font_height, self.size[0], self.font_height)
+            bg, (0, new_line * self.font_height, self.size[0], abs(direction) * self.font_height)
         )
         self.canvas.set_clip(None)
         self.busy = True
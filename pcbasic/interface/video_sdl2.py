@@ -42,6 +42,9 @@ N_BLINK_STATES = 4
 BLINK_TIME = 120
 CYCLE_TIME = BLINK_TIME // BLINK_CYCLES
 
+# maximum number of changed regions to flip separately; beyond this, flip the whole canvas
+MAX_DIRTY_RECTS = 64
+
 
 # blank icon
 BLANK_ICON = ((0,) * 16) * 16
@@ -373,6 +376,21 @@ class VideoSDL2(VideoPlugin):
         # one cache per blink state
         self._display_cache = [None] * N_BLINK_STATES
         self._has_display_cache = [False] * N_BLINK_STATES
+        # blink state currently shown on the display
+        self._shown_blink_state = None
+        # 8-bit canvas scaled to window size, to be mapped onto the display with the palette
+        self._scaled_surface = None
+        # blink state and cursor rect of the scaled surface
+        self._scaled_blink_state = None
+        self._scaled_cursor = None
+        # display shows the scaled surface mapped with its blink state's palette
+        self._display_mapped = False
+        # canvas regions changed since last flip, as (x, y, width, height)
+        self._dirty_rects = []
+        # whole canvas needs to be scaled on next flip
+        self._rescale = True
+        # palette has changed, whole scaled surface needs to be mapped on next flip
+        self._remap = True
         # pointer to the zoomed surface
         self._zoomed_surface = None
         # clipboard handler
@@ -451,6 +469,7 @@ class VideoSDL2(VideoPlugin):
         # free caches
         for surface in self._display_cache:
             sdl2.SDL_FreeSurface(surface)
+        sdl2.SDL_FreeSurface(self._scaled_surface)
         # free surfaces
         if self._window_surface:
             sdl2.SDL_FreeSurface(self._window_surface)
@@ -513,6 +532,9 @@ class VideoSDL2(VideoPlugin):
             for _ in range(N_BLINK_STATES)
         ]
         self._has_display_cache = [False] * N_BLINK_STATES
+        # window size may have changed
+        self._rescale = True
+        self._display_mapped = False
 
 
     ###########################################################################
@@ -804,7 +826,6 @@ class VideoSDL2(VideoPlugin):
                 blink_state = 1
             # flip display fully if changed, use cache if just blinking
             if self.busy:
-                self._clear_display_cache()
                 self._flip_busy(blink_state)
                 self.busy = False
             elif (self._palette_blinks or self._text_cursor) and blink_tock == 0:
@@ -822,12 +843,43 @@ class VideoSDL2(VideoPlugin):
                 self._display_cache[blink_state], None, self._display_surface, None
             )
             sdl2.SDL_UpdateWindowSurface(self._display)
+            self._shown_blink_state = blink_state
+            self._display_mapped = False
         else:
             # if we don't have a cache for this state, build it
-            self._flip_busy(blink_state)
+            self._flip(blink_state)
 
     def _flip_busy(self, blink_state):
-        """Draw the canvas to the screen."""
+        """Draw the changed canvas to the screen."""
+        # the cache for the blink state on display can be patched along with the display
+        patch_cache = (
+            self._has_display_cache[blink_state] and self._shown_blink_state == blink_state
+        )
+        self._clear_display_cache()
+        self._flip(blink_state, patch_cache)
+
+    def _flip(self, blink_state, patch_cache=False):
+        """Draw the canvas to the screen, scaling and mapping only changed regions if possible."""
+        if self._smooth or self._pixel_packing or self._clipboard_interface.active():
+            display_rects = None
+            self._flip_converted(blink_state)
+        else:
+            display_rects = self._flip_indexed(blink_state)
+        # save in display cache for this blink state
+        cache = self._display_cache[blink_state]
+        if patch_cache and display_rects is not None:
+            for rect in display_rects:
+                sdl2.SDL_BlitSurface(
+                    self._display_surface, rect, cache, sdl2.SDL_Rect(rect.x, rect.y, rect.w, rect.h)
+                )
+        else:
+            sdl2.SDL_BlitSurface(self._display_surface, None, cache, None)
+        self._has_display_cache[blink_state] = True
+        self._shown_blink_state = blink_state
+        self._dirty_rects = []
+
+    def _flip_converted(self, blink_state):
+        """Convert the whole canvas to display format, then scale and flip onto the display."""
         if self._pixel_packing:
             work_surface = self._create_composite_surface()
         else:
@@ -844,11 +896,95 @@ class VideoSDL2(VideoPlugin):
         if self._clipboard_interface.active():
             self._show_clipboard(conv)
         # scale surface to final dimensions and flip
-        self._scale_and_flip(conv, blink_state)
+        self._scale_and_flip(conv)
         # destroy the temporary surface
         sdl2.SDL_FreeSurface(conv)
+        # the scaled surface has not been kept up to date
+        self._rescale = True
+        self._display_mapped = False
+
+    def _flip_indexed(self, blink_state):
+        """
+        Scale changed regions of the 8-bit canvas and map them onto the display.
+        Returns the display rects changed, or None if the whole display was mapped.
+        """
+        window_w, window_h = self._window_sizer.window_size
+        cursor_state = (blink_state % 2) or not self._text_cursor
+        cursor_rect = self._get_cursor_rect(cursor_state)
+        if self._rescale or len(self._dirty_rects) > MAX_DIRTY_RECTS:
+            if not self._scaled_surface or (
+                    self._scaled_surface.contents.w, self._scaled_surface.contents.h
+                ) != (window_w, window_h):
+                sdl2.SDL_FreeSurface(self._scaled_surface)
+                self._scaled_surface = sdl2.SDL_CreateRGBSurface(
+                    0, window_w, window_h, 8, 0, 0, 0, 0
+                )
+            with self._show_cursor(cursor_state):
+                # nearest-neighbour stretch copies the attributes without mapping colours
+                sdl2.SDL_SoftStretch(self._window_surface, None, self._scaled_surface, None)
+            scaled_rects = None
+        else:
+            # redraw the cursor at its old and new locations
+            rects = self._dirty_rects + [_r for _r in (self._scaled_cursor, cursor_rect) if _r]
+            scaled_rects = [self._get_scaled_rects(*_r) for _r in rects]
+            with self._show_cursor(cursor_state):
+                for source_rect, target_rect in scaled_rects:
+                    sdl2.SDL_SoftStretch(
+                        self._window_surface, source_rect, self._scaled_surface, target_rect
+                    )
+        # map the attributes to display colours
+        sdl2.SDL_SetSurfacePalette(self._scaled_surface, self._palette[blink_state // 2])
+        xshift, yshift = self._window_sizer.letterbox_shift
+        if (
+                scaled_rects is None or self._remap or not self._display_mapped
+                or self._scaled_blink_state // 2 != blink_state // 2
+            ):
+            target_rect = sdl2.SDL_Rect(xshift, yshift, window_w, window_h)
+            sdl2.SDL_BlitSurface(self._scaled_surface, None, self._display_surface, target_rect)
+            sdl2.SDL_UpdateWindowSurface(self._display)
+            display_rects = None
+        else:
+            display_rects = []
+            for _, rect in scaled_rects:
+                display_rect = sdl2.SDL_Rect(rect.x + xshift, rect.y + yshift, rect.w, rect.h)
+                display_rects.append(display_rect)
+                # blits may clip the target rect, so give them a copy
+                sdl2.SDL_BlitSurface(
+                    self._scaled_surface, rect, self._display_surface,
+                    sdl2.SDL_Rect(display_rect.x, display_rect.y, rect.w, rect.h)
+                )
+            if display_rects:
+                sdl2.SDL_UpdateWindowSurfaceRects(
+                    self._display,
+                    (sdl2.SDL_Rect * len(display_rects))(*display_rects), len(display_rects)
+                )
+        self._scaled_blink_state = blink_state
+        self._scaled_cursor = cursor_rect
+        self._rescale = False
+        self._remap = False
+        self._display_mapped = True
+        return display_rects
+
+    def _get_scaled_rects(self, x, y, width, height):
+        """Get the window rect and the scaled rect for a region of the canvas."""
+        border_x, border_y = self._window_sizer.border_shift
+        lwindow_w, lwindow_h = self._window_sizer.window_size_logical
+        window_w, window_h = self._window_sizer.window_size
+        # canvas to window coordinates, clipped to the window
+        left, top = x + border_x, y + border_y
+        right, bottom = min(left + width, lwindow_w), min(top + height, lwindow_h)
+        # window to scaled coordinates
+        scaled_left, scaled_top = left * window_w // lwindow_w, top * window_h // lwindow_h
+        scaled_right = right * window_w // lwindow_w
+        scaled_bottom = bottom * window_h // lwindow_h
+        return (
+            sdl2.SDL_Rect(left, top, right-left, bottom-top),
+            sdl2.SDL_Rect(
+                scaled_left, scaled_top, scaled_right-scaled_left, scaled_bottom-scaled_top
+            )
+        )
 
-    def _scale_and_flip(self, conv, blink_state):
+    def _scale_and_flip(self, conv):
         """Scale converted surface and flip onto display."""
         # determine letterbox dimensions
         xshift, yshift = self._window_sizer.letterbox_shift
@@ -867,22 +1003,27 @@ class VideoSDL2(VideoPlugin):
             self._zoomed_surface = sdl2.sdlgfx.zoomSurface(conv, scalex, scaley, 1)
             # blit onto display
             sdl2.SDL_BlitSurface(self._zoomed_surface, None, self._display_surface, target_rect)
-        # save in display cache for this blink state
-        sdl2.SDL_BlitSurface(self._display_surface, None, self._display_cache[blink_state], None)
-        self._has_display_cache[blink_state] = True
         # flip the display
         sdl2.SDL_UpdateWindowSurface(self._display)
 
+    def _get_cursor_rect(self, cursor_state):
+        """Get the canvas area covered by the cursor as (x, y, width, height), or None."""
+        if not self._cursor_visible or not cursor_state:
+            return None
+        top = (self._cursor_row-1) * self._font_height + self._cursor_from
+        left = (self._cursor_col-1) * self._font_width
+        return left, top, self._cursor_width, self._cursor_height
+
     @contextmanager
     def _show_cursor(self, cursor_state):
         """Draw or remove the cursor on the visible page."""
-        if not self._cursor_visible or not cursor_state:
+        cursor_rect = self._get_cursor_rect(cursor_state)
+        if not cursor_rect:
             yield
         else:
             # cursor shape
-            top = (self._cursor_row-1) * self._font_height + self._cursor_from
-            left = (self._cursor_col-1) * self._font_width
-            cursor_slice = slice(top, top+self._cursor_height), slice(left, left+self._cursor_width)
+            left, top, width, height = cursor_rect
+            cursor_slice = slice(top, top+height), slice(left, left+width)
             # canvas_pixels is a view
             cursor_area = self._canvas_pixels[cursor_slice]
             # copy area under cursor
@@ -978,6 +1119,7 @@ class VideoSDL2(VideoPlugin):
             (canvas_width, canvas_height)
         )
         self._mode_set = True
+        self._rescale = True
         self.busy = True
 
     def set_caption_message(self, msg):
@@ -1007,6 +1149,8 @@ class VideoSDL2(VideoPlugin):
         sdl2.SDL_SetPaletteColors(self._palette[0], colors_0, 0, 256)
         sdl2.SDL_SetPaletteColors(self._palette[1], colors_1, 0, 256)
         self._pixel_packing = pack_pixels
+        # attributes are unchanged, only their colours need to be mapped again
+        self._remap = True
         self.busy = True
 
     def set_border_attr(self, attr):
@@ -1022,6 +1166,7 @@ class VideoSDL2(VideoPlugin):
         if self._window_surface:
             sdl2.SDL_FillRects(self._window_surface, border_rects, 4, attr)
         self._border_attr = attr
+        self._rescale = True
         self.busy = True
 
     def clear_rows(self, back_attr, start, stop):
@@ -1030,6 +1175,10 @@ class VideoSDL2(VideoPlugin):
             (start-1)*self._font_height : stop*self._font_height,
             0 : self._window_sizer.width
         ] = back_attr
+        self._dirty_rects.append((
+            0, (start-1)*self._font_height,
+            self._window_sizer.width, (stop-start+1)*self._font_height
+        ))
         self.busy = True
 
     def show_cursor(self, cursor_on, cursor_blinks):
@@ -1056,23 +1205,27 @@ class VideoSDL2(VideoPlugin):
             self.busy = True
 
     def scroll(self, direction, from_line, scroll_height, back_attr):
-        """Scroll the screen between from_line and scroll_height."""
+        """Scroll the screen between from_line and scroll_height by abs(direction) rows."""
         pixels = self._canvas_pixels
+        shift = abs(direction) * self._font_height
         # scroll window, top of rows
-        hi_y0, hi_y1 = (from_line-1)*self._font_height, (scroll_height-1)*self._font_height
+        hi_y0, hi_y1 = (from_line-1)*self._font_height, scroll_height*self._font_height - shift
         # scroll window, bottom of rows
-        lo_y0, lo_y1 = from_line*self._font_height, scroll_height*self._font_height
-        if direction == -1:
+        lo_y0, lo_y1 = (from_line-1)*self._font_height + shift, scroll_height*self._font_height
+        if direction < 0:
             # scroll up
-            pixels[hi_y0:hi_y1, :] = pixels[lo_y0:lo_y1, :]
-            # clear the new empty line
-            pixels[hi_y1:lo_y1, :] = back_attr
+            if hi_y0 < hi_y1:
+                pixels[hi_y0:hi_y1, :] = pixels[lo_y0:lo_y1, :]
+            # clear the new empty lines
+            pixels[max(hi_y0, hi_y1):lo_y1, :] = back_attr
         else:
             # scroll down
             # copy is needed here as bytearray-view self-slice assignment will self-overwrite
-            pixels[lo_y0:lo_y1, :] = pixels[hi_y0:hi_y1, :].copy()
-            # clear the new empty line
-            pixels[hi_y0:lo_y0, :] = back_attr
+            if lo_y0 < lo_y1:
+                pixels[lo_y0:lo_y1, :] = pixels[hi_y0:hi_y1, :].copy()
+            # clear the new empty lines
+            pixels[hi_y0:min(lo_y0, lo_y1), :] = back_attr
+        self._dirty_rects.append((0, hi_y0, pixels.width, lo_y1-hi_y0))
         self.busy = True
 
     def update(self, row, col, unicode_matrix, attr_matrix, y0, x0, sprite):
@@ -1085,4 +1238,5 @@ class VideoSDL2(VideoPlugin):
         if y0 + sprite.height > pixels.height or x0 + sprite.width > pixels.width:
             sprite = sprite[:pixels.height-y0, :pixels.width-x0]
         pixels[y0:y0+sprite.height, x0:x0+sprite.width] = sprite
+        self._dirty_rects.append((x0, y0, sprite.width, sprite.height))
         self.busy = True
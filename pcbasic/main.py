@@ -13,36 +13,41 @@ import logging
 import traceback
 
 from . import config
-from . import info
 from .basic import Session
-from .debug import DebugSession
-from .guard import ExceptionGuard
 from .basic import NAME, VERSION, LONG_VERSION, COPYRIGHT
-from .interface import Interface, InitFailed
 from .compat import stdio, resources, nullcontext
 from .compat import script_entry_point_guard
+from .timing import startup_timer
+
+# the interface, debugger, crash guard and platform info modules are imported only when needed
+# so that short-lived command-line invocations don't pay for them
 
 
 def main(*arguments):
     """Initialise, parse arguments and perform requested operations."""
     with config.TemporaryDirectory(prefix='pcbasic-') as temp_dir:
         # get settings and prepare logging
-        settings = config.Settings(temp_dir, arguments)
-        if settings.version:
-            # print version and exit
-            _show_version(settings)
-        elif settings.help:
-            # print usage and exit
-            _show_usage()
-        elif settings.convert:
-            # convert and exit
-            _convert(settings)
-        elif settings.interface:
-            # start an interpreter session with interface
-            _run_session_with_interface(settings)
-        else:
-            # start an interpreter session with standard i/o
-            _run_session(**settings.launch_params)
+        with startup_timer.phase(u'settings'):
+            settings = config.Settings(temp_dir, arguments)
+        try:
+            if settings.version:
+                # print version and exit
+                _show_version(settings)
+            elif settings.help:
+                # print usage and exit
+                _show_usage()
+            elif settings.convert:
+                # convert and exit
+                _convert(settings)
+            elif settings.interface:
+                # start an interpreter session with interface
+                _run_session_with_interface(settings)
+            else:
+                # start an interpreter session with standard i/o
+                _run_session(**settings.launch_params)
+        finally:
+            if settings.startup_timing:
+                stdio.stderr.write(startup_timer.get_report())
 
 
 def _show_usage():
@@ -53,6 +58,7 @@ def _show_usage():
 def _show_version(settings):
     """Show version with optional debugging details."""
     if settings.debug:
+        from . import info
         stdio.stdout.write(info.get_version_info())
         stdio.stdout.write(info.get_platform_info())
     else:
@@ -72,8 +78,11 @@ def _convert(settings):
 
 def _run_session_with_interface(settings):
     """Start an interactive interpreter session."""
+    from .interface import Interface, InitFailed
+    from .guard import ExceptionGuard
     try:
-        interface = Interface(**settings.iface_params)
+        with startup_timer.phase(u'interface'):
+            interface = Interface(**settings.iface_params)
     except InitFailed as e: # pragma: no cover
         logging.error(e)
     else:
@@ -87,7 +96,7 @@ def _run_session_with_interface(settings):
 
 def _run_session(
         interface=None, exception_handler=nullcontext,
-        resume=False, debug=False, state_file=None,
+        resume=False, debug=False, state_file=None, checkpoint=0,
         prog=None, commands=(), keys=u'', greeting=True, **session_params
     ):
     """Start or resume session, handle exceptions, suspend on exit."""
@@ -100,6 +109,7 @@ def _run_session(
             logging.critical('Failed to resume session from %s: %s' % (state_file, e))
             sys.exit(1)
     elif debug:
+        from .debug import DebugSession
         session = DebugSession(**session_params)
         exception_handler = nullcontext
     else:
@@ -107,7 +117,12 @@ def _run_session(
     with exception_handler(session) as handler:
         with session:
             try:
-                _operate_session(session, interface, prog, commands, keys, greeting)
+                with startup_timer.phase(u'session start'):
+                    session.start()
+                if checkpoint:
+                    session.checkpoint(state_file, checkpoint)
+                with startup_timer.phase(u'session run'):
+                    _operate_session(session, interface, prog, commands, keys, greeting)
             finally:
                 try:
                     session.suspend(state_file)
@@ -115,7 +130,8 @@ def _run_session(
                     logging.error('Failed to save session to %s: %s', state_file, e)
     if exception_handler is not nullcontext and handler.exception_handled:
         _run_session(
-            interface, exception_handler, resume=True, state_file=state_file, greeting=False
+            interface, exception_handler, resume=True, state_file=state_file,
+            checkpoint=checkpoint, greeting=False
         )
 
 
@@ -0,0 +1,41 @@
+"""
+PC-BASIC - timing
+Startup timing report
+
+(c) 2013--2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer(object):
+    """Record the duration of import and initialisation phases."""
+
+    def __init__(self):
+        """Start timing."""
+        self._origin = time.perf_counter()
+        # list of (phase name, start, end) tuples, relative to origin
+        self._phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase of startup."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases.append((name, start - self._origin, time.perf_counter() - self._origin))
+
+    def get_report(self):
+        """Retrieve the report of timed phases as text."""
+        lines = [u'STARTUP TIMING']
+        for name, start, end in sorted(self._phases, key=lambda _phase: _phase[1]):
+            lines.append(u'%-24s %8.1f ms  (at %8.1f ms)' % (name, (end-start)*1000., start*1000.))
+        lines.append(u'%-24s %8.1f ms' % (u'total', (time.perf_counter()-self._origin)*1000.))
+        return u'\n'.join(lines) + u'\n'
+
+
+# timer for this process, started when the package is first imported
+startup_timer = StartupTimer()
@@ -0,0 +1,12 @@
+"""
+PC-BASIC tests
+
+(c) 2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import os
+import tempfile
+
+# keep parsed fonts and codepages out of the user's cache
+os.environ.setdefault(u'PCBASIC_CACHE_DIR', os.path.join(tempfile.gettempdir(), u'pcbasic-tests'))
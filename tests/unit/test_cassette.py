@@ -8,8 +8,15 @@ This file is released under the GNU GPL version 3 or later.
 
 import os
 import shutil
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from pcbasic import Session
+from pcbasic.basic.devices import cassette
 from tests.unit.utils import TestCase, run_tests
 
 
@@ -161,6 +168,48 @@ class CassetteTest(TestCase):
             s.execute('run "cas1:"')
             assert s.get_variable('A%') == 12345
 
+    def _round_trip(self, name):
+        """Write a binary file and a long data file to tape and read them back."""
+        try:
+            os.remove(_output_file(name))
+        except EnvironmentError:
+            pass
+        with Session(devices={b'CAS1:': _output_file(name)}) as s:
+            s.execute('def seg=&hb800: for i=0 to 1999: poke i, (i*7 + i\\256) mod 256: next')
+            s.execute('bsave "cas1:bytes", 0, 2000')
+            s.execute('open "cas1:data" for output as 1')
+            s.execute('for i=1 to 300: write#1, i, string$(i mod 50, 64 + i mod 26): next')
+            s.execute('close')
+        with Session(devices={b'CAS1:': _output_file(name)}) as s:
+            s.execute('def seg=&hb800: bload "cas1:bytes", 0')
+            s.execute('e=0: for i=0 to 1999: e=e-(peek(i)<>(i*7 + i\\256) mod 256): next')
+            assert s.get_variable('E!') == 0
+            s.execute('open "cas1:data" for input as 1')
+            s.execute('e=0: for i=1 to 300: input#1, n, a$: e=e-(n<>i or a$<>string$(i mod 50, 64 + i mod 26)): next')
+            assert s.get_variable('E!') == 0
+            assert s.evaluate('eof(1)')
+
+    def test_cas_round_trip(self):
+        """Write several blocks to a CAS file and read them back."""
+        self._round_trip('test_round_trip.cas')
+
+    def test_wav_round_trip(self):
+        """Write several blocks to a WAV file and read them back without NumPy."""
+        numpy_module, cassette.numpy = cassette.numpy, False
+        try:
+            self._round_trip('test_round_trip.wav')
+        finally:
+            cassette.numpy = numpy_module
+
+    @unittest.skipIf(numpy is None, 'NumPy not available')
+    def test_wav_round_trip_numpy(self):
+        """Write several blocks to a WAV file and read them back with NumPy."""
+        numpy_module, cassette.numpy = cassette.numpy, numpy
+        try:
+            self._round_trip('test_round_trip_numpy.wav')
+        finally:
+            cassette.numpy = numpy_module
+
     def test_cas_empty(self):
         """Attach empty CAS file."""
         try:
@@ -8,10 +8,14 @@ Codepage functionality tests
 This file is released under the GNU GPL version 3 or later.
 """
 
+import os
+import sys
+import subprocess
 from io import open
 
 from pcbasic import Session
-from pcbasic.data import read_codepage
+from pcbasic.data import read_codepage, read_fonts
+from pcbasic.data import cache
 
 from tests.unit.utils import TestCase, run_tests
 
@@ -165,6 +169,43 @@ class CodepageTest(TestCase):
             bstr = s.convert(u'\u041e\u041e\u0301\u263a', to_type=type(b''))
         assert bstr == b'\x8e\xc5\1', bstr
 
+    def test_cache(self):
+        """Test reading codepages and fonts through the cache."""
+        cache_dir = cache.CACHE_DIR
+        try:
+            cache.CACHE_DIR = None
+            cp_uncached = read_codepage('936')
+            font_uncached = read_fonts(cp_uncached, [u'vga'])
+            cache.CACHE_DIR = self.output_path()
+            # first read builds the cache, second read uses it
+            for _ in range(2):
+                assert read_codepage('936') == cp_uncached
+                assert read_fonts(cp_uncached, [u'vga']) == font_uncached
+            cache_files = os.listdir(self.output_path())
+            assert len(cache_files) == 2
+            # damaged or outdated cache files are replaced
+            for name in cache_files:
+                with open(self.output_path(name), 'wb') as f:
+                    f.write(b'\0')
+            assert read_codepage('936') == cp_uncached
+            assert read_fonts(cp_uncached, [u'vga']) == font_uncached
+            assert sorted(os.listdir(self.output_path())) == sorted(cache_files)
+            for name in cache_files:
+                assert os.path.getsize(self.output_path(name)) > 1
+        finally:
+            cache.CACHE_DIR = cache_dir
+
+    def test_cache_dir_environment(self):
+        """Redirect or disable the cache through the environment."""
+        here = os.path.dirname(os.path.abspath(__file__))
+        for value, expected in ((self.output_path(), self.output_path()), (u'', u'None')):
+            env = dict(os.environ, PCBASIC_CACHE_DIR=value)
+            output = subprocess.check_output(
+                [sys.executable, '-c', 'from pcbasic.data import cache; print(cache.CACHE_DIR)'],
+                env=env, cwd=os.path.join(here, '..', '..')
+            )
+            assert output.decode('utf-8').strip() == expected
+
 
 ##############################################################################
 
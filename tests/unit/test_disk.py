@@ -191,6 +191,66 @@ class DiskTest(TestCase):
         assert s.get_variable('B$') == b'b'
         assert s.get_variable('C$') == b'c'
 
+    def test_disk_data_long(self):
+        """Read lines and entries across read buffer boundaries."""
+        # CR LF straddles the 4096-byte read block
+        lines = [b'x' * 4095, b'y' * 300, b'1,"two",3', b'4']
+        with open(self.output_path('DATA'), 'wb') as f:
+            f.write(b'\r\n'.join(lines) + b'\x1aignored')
+        with Session(devices={b'A': self.output_path()}) as s:
+            s.execute('open "a:data" for input as 1')
+            s.execute('for i = 1 to 17: line input#1, a$: next')
+            s.execute('line input#1, b$: line input#1, c$')
+            s.execute('input#1, d, e$, f: loc1 = loc(1): line input#1, g$: eof1 = eof(1)')
+            assert s.get_variable('A$') == b'x' * 15
+            assert s.get_variable('B$') == b'y' * 255
+            assert s.get_variable('C$') == b'y' * 45
+            assert s.get_variable('D!') == 1
+            assert s.get_variable('E$') == b'two'
+            assert s.get_variable('F!') == 3
+            assert s.get_variable('LOC1!') == (4095 + 2 + 300 + 2 + 11 + 127) // 128
+            assert s.get_variable('G$') == b'4'
+            assert s.get_variable('EOF1!') == -1
+
+    def test_disk_data_lof(self):
+        """Report length and position of a text file while writing."""
+        with Session(devices={b'A': self.output_path()}) as s:
+            s.execute('open "a:data" for output as 1')
+            s.execute('for i = 1 to 100: print#1, string$(i, "*"): next')
+            s.execute('a = lof(1): b = loc(1)')
+            s.execute('width#1, 20: print#1, string$(30, "*");: print#1, "x";')
+            assert s.get_variable('A!') == 5050 + 200
+            assert s.get_variable('B!') == (5050 + 200) // 128
+        with open(self.output_path('DATA'), 'rb') as f:
+            # width is applied before the next string
+            assert f.read()[-36:] == b'\r\n' + b'*' * 30 + b'\r\nx\x1a'
+
+    def test_disk_data_entries(self):
+        """Read INPUT# entries of all kinds across read buffer boundaries."""
+        with open(self.output_path('DATA'), 'wb') as f:
+            f.write(
+                (b'x' * 100 + b'\r\n') * 40
+                + b'pad,  "a, b"  ,1 2 , c d  \r\n-3.5,"e"x\r\n7\08,4\n5,"h\r\ni"\r\n6\x1a7'
+            )
+        with Session(devices={b'A': self.output_path()}) as s:
+            s.execute('open "a:data" for input as 1')
+            s.execute('for i = 1 to 40: line input#1, z$: next')
+            s.execute('input#1, a$, b$, c, d, e$, f, g$, h$, i, j, k$, l$, m: eof1 = eof(1)')
+            assert s.get_variable('A$') == b'pad'
+            assert s.get_variable('B$') == b'a, b'
+            assert s.get_variable('C!') == 1
+            assert s.get_variable('D!') == 2
+            assert s.get_variable('E$') == b'c d'
+            assert s.get_variable('F!') == -3.5
+            assert s.get_variable('G$') == b'e'
+            assert s.get_variable('H$') == b'x'
+            assert s.get_variable('I!') == 78
+            assert s.get_variable('J!') == 4
+            assert s.get_variable('K$') == b'5'
+            assert s.get_variable('L$') == b'h\ri'
+            assert s.get_variable('M!') == 6
+            assert s.get_variable('EOF1!') == -1
+
     def test_disk_data_append(self):
         """Append data to a text file."""
         with Session(devices={b'A': self.output_path()}) as s:
@@ -221,6 +281,37 @@ class DiskTest(TestCase):
             assert s.get_variable('A$') == b' 1234 \r\n'.ljust(20, b'\0')
             assert s.get_variable('B$') == b'abcde'.ljust(20, b' ')
 
+    def test_disk_random_mmap(self):
+        """Share a memory-mapped random access file between file numbers."""
+        with Session(devices={b'A': self.output_path()}, mmap_files=True) as s:
+            s.execute('open "a:data" for random shared as 1 len=4: field#1, 4 as a$')
+            s.execute('open "a:data" for random shared as 2 len=4: field#2, 4 as b$')
+            s.execute('lset a$="abcd": put#1, 3')
+            s.execute('lset a$="efgh": put#1, 1')
+            s.execute('get#2, 1: c$=b$: get#2: d$=b$: get#2')
+            assert s.get_variable('C$') == b'efgh'
+            assert s.get_variable('D$') == b'\0\0\0\0'
+            assert s.get_variable('B$') == b'abcd'
+            s.execute('lset b$="ijkl": put#2, 2: get#1, 2: lof1=lof(1): lof2=lof(2)')
+            assert s.get_variable('A$') == b'ijkl'
+            assert s.get_variable('LOF1!') == s.get_variable('LOF2!') == 12
+        with open(self.output_path('DATA'), 'rb') as f:
+            assert f.read() == b'efghijklabcd'
+
+    def test_disk_random_locks(self):
+        """Lock record ranges on a random access file."""
+        with Session(devices={b'A': self.output_path()}) as s:
+            s.execute('open "a:data" for random shared as 1 len=4')
+            s.execute('open "a:data" for random shared as 2 len=4')
+            s.execute('lock#1, 5 to 10: lock#1, 20 to 30')
+            s.execute('get#2, 4: get#2, 11: put#2, 19: put#2, 31')
+            # range covering a locked range but with both ends outside it is accepted
+            s.execute('lock#2, 12 to 18: unlock#2, 12 to 18: lock#2, 1 to 40')
+            s.execute('get#2, 25')
+            s.execute('unlock#1, 20 to 30: get#2, 25: unlock#1, 5 to 9')
+            output = [_row.strip() for _row in self.get_text(s)]
+        assert output[:3] == [b'Permission Denied\xff', b'Permission Denied\xff', b'']
+
     def test_match_name(self):
         """Test case-insensitive matching of native file name."""
         # this will be case sensitive on some platforms but should be picked up correctly anyway
@@ -236,6 +327,23 @@ class DiskTest(TestCase):
         with open(self.output_path('MixCase.txt'), 'rb') as f:
             assert f.read() == b' 1234 \r\n\x1a'
 
+    def test_match_name_after_changes(self):
+        """Test matching of native file names after the directory has changed."""
+        open(self.output_path('MixCase.txt'), 'w').close()
+        with Session(devices={b'A': self.output_path()}) as s:
+            s.execute('open "a:mixcase.txt" for input as 1: close 1')
+            s.execute('name "a:mixcase.txt" as "a:renamed.txt"')
+            s.execute('open "a:mixcase.txt" for input as 1')
+            # created outside of BASIC after the first match
+            open(self.output_path('OthCase.txt'), 'w').close()
+            s.execute('open "a:othcase.txt" for input as 1: close 1')
+            s.execute('kill "a:othcase.txt"')
+            s.execute('open "a:othcase.txt" for input as 1')
+            output = [_row.strip() for _row in self.get_text(s)]
+        assert output[:2] == [b'File not found\xff', b'File not found\xff']
+        assert os.path.isfile(self.output_path('RENAMED.TXT'))
+        assert not os.path.exists(self.output_path('OthCase.txt'))
+
     def test_match_name_non_ascii(self):
         """Test non-matching of names that are not ascii."""
         # this will be case sensitive on some platforms but should be picked up correctly anyway
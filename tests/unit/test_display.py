@@ -8,9 +8,14 @@ This file is released under the GNU GPL version 3 or later.
 
 import unittest
 import os
+import threading
 
 from pcbasic import Session
-from pcbasic.compat import int2byte
+from pcbasic.compat import int2byte, queue, text_type
+from pcbasic.basic.base import signals
+from pcbasic.basic.eventcycle import VideoQueue
+from pcbasic.basic.display import font
+from pcbasic.data.fonts import GlyphTable
 from tests.unit.utils import TestCase, run_tests
 
 
@@ -49,6 +54,268 @@ class DisplayTest(TestCase):
                 model_chars = model.read()
             assert bytes(bytearray(_c for _r in self.get_text(s) for _c in _r)) == model_chars
 
+    def test_pixels_after_mode_switch(self):
+        """Glyphs and rendered text are the same after switching back to a previous mode."""
+        program = b'''
+            10 KEY OFF: CLS
+            20 FOR B = 32 TO 255
+            30   COLOR B MOD 16, B MOD 8: PRINT CHR$(B);
+            40 NEXT
+            RUN
+        '''
+        with Session() as s:
+            s.execute(b'SCREEN 0: WIDTH 40')
+            s.execute(program)
+            model_pix = s.get_pixels()
+        with Session() as s:
+            s.execute(b'SCREEN 0: WIDTH 40: WIDTH 80: SCREEN 2: SCREEN 0: WIDTH 40')
+            s.execute(program)
+            assert s.get_pixels() == model_pix
+
+    def test_pixels_on_request(self):
+        """Pixels drawn on request are the same as pixels drawn as text is printed."""
+        program = b'''
+            10 KEY OFF: SCREEN 0: WIDTH 80: CLS
+            20 FOR I = 1 TO 30
+            30   COLOR I MOD 16, I MOD 8: PRINT STRING$(I, 64+I)
+            40 NEXT
+            50 PCOPY 0, 1: LOCATE 3, 1: PRINT SPC(10);
+            RUN
+        '''
+        with Session() as s:
+            s.execute(program)
+            lazy_pix = s.get_pixels()
+        with Session() as s:
+            # draw text to pixels as it is printed, as for a graphical interface
+            s.start()
+            s._impl.display.set_pixel_output(True)
+            s.execute(program)
+            assert s.get_pixels() == lazy_pix
+
+    def test_glyph_cache_limit(self):
+        """Pixels are the same if glyphs are dropped from the glyph cache and rebuilt."""
+        program = b'''
+            10 KEY OFF: SCREEN 9: CLS
+            20 FOR I = 1 TO 2: FOR B = 32 TO 255
+            30   COLOR B MOD 16: PRINT CHR$(B);
+            40 NEXT: NEXT
+            RUN
+        '''
+        with Session() as s:
+            s.execute(program)
+            model_pix = s.get_pixels()
+        cache_size = font._GLYPH_CACHE_SIZE
+        try:
+            font._GLYPH_CACHE_SIZE = 16
+            with Session() as s:
+                s.execute(program)
+                assert s.get_pixels() == model_pix
+                for glyph_set in s._impl.display._fonts[8]._glyph_sets.values():
+                    assert len(glyph_set) <= 16
+        finally:
+            font._GLYPH_CACHE_SIZE = cache_size
+
+    def test_glyph_table(self):
+        """Packed glyph tables behave like font dicts."""
+        fontdict = {u'a': b'\1\2', u'b': b'', u'\u4e00': b'\3\4\5\6'}
+        table = GlyphTable(fontdict)
+        assert dict(table) == fontdict
+        # tables with the same characters share the index
+        other = GlyphTable({u'a': b'\7', u'b': b'\7', u'\u4e00': b'\7\7'}, table.index)
+        assert other.index is table.index
+        assert other[u'\u4e00'] == b'\7\7'
+        copy = table.copy()
+        copy[u'a'] = b'\0\0'
+        copy[u'c'] = b'\1'
+        del copy[u'b']
+        assert dict(copy) == {u'a': b'\0\0', u'c': b'\1', u'\u4e00': b'\3\4\5\6'}
+        assert len(copy) == 3
+        assert u'b' not in copy
+        assert dict(table) == fontdict
+
+
+class VideoQueueTest(TestCase):
+    """Unit tests for the coalescing video queue."""
+
+    tag = u'display'
+
+    def _update(self, row, col, text):
+        """Create an update signal for a row of text."""
+        return signals.Event(
+            signals.VIDEO_UPDATE, (row, col, [list(text)], [[7] * len(text)], 0, 0, None)
+        )
+
+    def test_coalesce(self):
+        """Superseded updates and cursor moves are dropped, adjacent updates merged."""
+        video = VideoQueue()
+        video.put(self._update(1, 1, u'ab'))
+        video.put(signals.Event(signals.VIDEO_MOVE_CURSOR, (1, 3, 7, 1)))
+        video.put(self._update(1, 3, u'c'))
+        video.put(signals.Event(signals.VIDEO_MOVE_CURSOR, (1, 4, 7, 1)))
+        video.put(self._update(2, 1, u'x'))
+        video.put(self._update(2, 1, u'yz'))
+        frame = video.get_frame()
+        assert [_s.event_type for _s in frame] == [
+            signals.VIDEO_UPDATE, signals.VIDEO_MOVE_CURSOR, signals.VIDEO_UPDATE
+        ]
+        assert frame[0].params[:3] == (1, 1, [list(u'abc')])
+        assert frame[1].params == (1, 4, 7, 1)
+        assert frame[2].params[:3] == (2, 1, [list(u'yz')])
+        assert video.empty()
+
+    def test_no_coalesce_across_scroll(self):
+        """Updates are not merged across a scroll."""
+        video = VideoQueue()
+        video.put(self._update(1, 1, u'ab'))
+        video.put(signals.Event(signals.VIDEO_SCROLL, (-1, 1, 25, 0)))
+        video.put(self._update(1, 1, u'ab'))
+        assert video.qsize() == 3
+        assert video.get(False).params[:3] == (1, 1, [list(u'ab')])
+        assert video.get(False).event_type == signals.VIDEO_SCROLL
+        assert video.get(False).event_type == signals.VIDEO_UPDATE
+        with self.assertRaises(queue.Empty):
+            video.get(False)
+
+    def test_full(self):
+        """A bounded queue refuses signals when full, also if they could be coalesced."""
+        video = VideoQueue(maxsize=2)
+        video.put(self._update(1, 1, u'ab'))
+        video.put(signals.Event(signals.VIDEO_CLEAR_ROWS, (0, 1, 25)))
+        assert video.full()
+        with self.assertRaises(queue.Full):
+            video.put_nowait(self._update(1, 1, u'ab'))
+        with self.assertRaises(queue.Full):
+            video.put(self._update(1, 1, u'ab'), timeout=0.01)
+        video.get()
+        assert not video.full()
+        video.put_nowait(self._update(1, 1, u'ab'))
+
+    def test_full_waits(self):
+        """Putting a signal on a full queue waits until the interface retrieves one."""
+        video = VideoQueue(maxsize=1)
+        video.put(signals.Event(signals.VIDEO_CLEAR_ROWS, (0, 1, 25)))
+        thread = threading.Thread(
+            target=video.put, args=(signals.Event(signals.VIDEO_CLEAR_ROWS, (0, 1, 24)),)
+        )
+        thread.start()
+        thread.join(0.05)
+        assert thread.is_alive()
+        assert video.get_frame()[0].params == (0, 1, 25)
+        thread.join()
+        assert video.get().params == (0, 1, 24)
+
+    def test_merge_scrolls(self):
+        """Consecutive scrolls are merged and the updates between them moved along."""
+        video = VideoQueue()
+        video.put(self._update(25, 1, u'a'))
+        video.put(signals.Event(signals.VIDEO_SCROLL, (-1, 1, 25, 0)))
+        video.put(self._update(1, 1, u'x'))
+        video.put(self._update(25, 1, u'b'))
+        video.put(signals.Event(signals.VIDEO_SCROLL, (-1, 1, 25, 0)))
+        video.put(self._update(25, 1, u'c'))
+        # a scroll of another region is not merged
+        video.put(signals.Event(signals.VIDEO_SCROLL, (-1, 1, 24, 0)))
+        frame = video.get_frame()
+        assert [(_s.event_type, _s.params[:3]) for _s in frame] == [
+            (signals.VIDEO_UPDATE, (25, 1, [[u'a']])),
+            (signals.VIDEO_SCROLL, (-2, 1, 25)),
+            (signals.VIDEO_UPDATE, (24, 1, [[u'b']])),
+            (signals.VIDEO_UPDATE, (25, 1, [[u'c']])),
+            (signals.VIDEO_SCROLL, (-1, 1, 24)),
+        ]
+
+    def test_merge_scrolls_clear(self):
+        """Merged scrolls don't scroll by more rows than the region holds."""
+        video = VideoQueue()
+        for _ in range(30):
+            video.put(signals.Event(signals.VIDEO_SCROLL, (1, 3, 12, 0)))
+        assert [_s.params for _s in video.get_frame()] == [(10, 3, 12, 0)]
+
+    def _run_frame(self, program):
+        """Rebuild the screen from a coalesced frame and compare with the session's screen."""
+
+        class Interface(object):
+            def __init__(self):
+                self.queues = queue.Queue(), VideoQueue(), queue.Queue()
+            def get_queues(self):
+                return self.queues
+
+        iface = Interface()
+        with Session() as s:
+            s.attach(iface)
+            s.execute(program)
+            frame = iface.queues[1].get_frame()
+            screen = [[u' '] * 80 for _ in range(25)]
+            for signal in frame:
+                if signal.event_type == signals.VIDEO_UPDATE:
+                    row, col, text = signal.params[:3]
+                    for ofs, line in enumerate(text):
+                        screen[row-1+ofs][col-1:col-1+len(line)] = line
+                elif signal.event_type == signals.VIDEO_CLEAR_ROWS:
+                    _, start, stop = signal.params
+                    screen[start-1:stop] = [[u' '] * 80 for _ in range(start-1, stop)]
+                elif signal.event_type == signals.VIDEO_SCROLL:
+                    direction, start, stop, _ = signal.params
+                    for _ in range(abs(direction)):
+                        if direction < 0:
+                            screen[start-1:stop] = screen[start:stop] + [[u' '] * 80]
+                        else:
+                            screen[start-1:stop] = [[u' '] * 80] + screen[start-1:stop-1]
+            assert [u''.join(_row) for _row in screen] == [
+                u''.join(_row) for _row in s.get_chars(as_type=text_type)
+            ]
+        return frame
+
+    def test_session_frame(self):
+        """Screen rebuilt from a coalesced frame matches the session's screen."""
+        self._run_frame(b'''
+            10 KEY OFF: CLS
+            20 FOR I = 1 TO 10: PRINT "line"; I; : PRINT STRING$(I, 42): NEXT
+            30 LOCATE 5, 3: PRINT "hello";
+            RUN
+        ''')
+
+    def test_session_scroll(self):
+        """Scrolling text is coalesced into a short frame that rebuilds the screen."""
+        frame = self._run_frame(b'''
+            10 KEY OFF: CLS
+            20 FOR I = 1 TO 100: PRINT "line"; I; : PRINT STRING$(I MOD 30, 42): NEXT
+            30 LOCATE 5, 3: PRINT "hello";
+            RUN
+        ''')
+        assert len(frame) < 100
+
+    def test_session_bounded(self):
+        """The interpreter waits for the interface when a bounded queue is full."""
+
+        class Interface(object):
+            def __init__(self):
+                self.queues = queue.Queue(), VideoQueue(maxsize=5), queue.Queue()
+                self.sizes = []
+                self.done = threading.Event()
+            def get_queues(self):
+                return self.queues
+            def run(self):
+                while not self.done.is_set():
+                    self.sizes.append(len(self.queues[1].get_frame()))
+                    self.done.wait(0.001)
+
+        iface = Interface()
+        thread = threading.Thread(target=iface.run)
+        thread.start()
+        try:
+            with Session() as s:
+                s.attach(iface)
+                s.execute(b'''
+                    10 KEY OFF: CLS
+                    20 FOR I = 1 TO 100: PRINT "line"; I: LOCATE 1, 1: PRINT I: NEXT
+                    RUN
+                ''')
+        finally:
+            iface.done.set()
+            thread.join()
+        assert max(iface.sizes) <= 5
+
 
 if __name__ == '__main__':
     run_tests()
@@ -0,0 +1,113 @@
+"""
+PC-BASIC tests.test_host
+Tests for hosting many asynchronous sessions
+
+(c) 2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import io
+import asyncio
+
+from pcbasic import SessionHost
+from tests.unit.utils import TestCase, run_tests
+
+
+class SessionHostTest(TestCase):
+    """Unit tests for SessionHost."""
+
+    tag = u'host'
+
+    def test_host_execute(self):
+        """Execute statements in hosted sessions."""
+        async def main():
+            with SessionHost() as host:
+                s1 = await host.add_session()
+                s2 = await host.add_session()
+                assert host.sessions == (s1, s2)
+                await host.execute(s1, b'a=1')
+                await host.execute(s2, b'a=2')
+                assert await s1.evaluate(b'a') == 1
+                assert await s2.evaluate(b'a') == 2
+                assert await host.execute(s1, b'print a+1') == b' 2 \r\n'
+                host.remove_session(s1)
+                assert host.sessions == (s2,)
+        asyncio.run(main())
+
+    def test_host_time_slice(self):
+        """Running sessions take turns in equal time slices."""
+        async def main():
+            with SessionHost(statements=10) as host:
+                sessions = [await host.add_session() for _ in range(3)]
+                for s in sessions:
+                    await s.execute(b'10 for i=1 to 100: next')
+                jobs = [asyncio.ensure_future(host.execute(_s, b'run')) for _s in sessions]
+                await asyncio.sleep(0)
+                while not jobs[0].done():
+                    counts = [host.get_usage(_s).statements for _s in sessions]
+                    assert max(counts) - min(counts) <= 10
+                    await asyncio.sleep(0)
+                await asyncio.gather(*jobs)
+                usage = [host.get_usage(_s) for _s in sessions]
+                assert len(set(_u.statements for _u in usage)) == 1
+                assert all(_u.cpu_time > 0 for _u in usage)
+        asyncio.run(main())
+
+    def test_host_input_streams_closed(self):
+        """Closing a session stops the task reading its input streams."""
+        async def main():
+            with SessionHost() as host:
+                s = await host.add_session(input_streams=io.BytesIO(b'print 1\r'))
+                task = s._impl.io_streams._input_task
+                assert task is not None and not task.done()
+                host.remove_session(s)
+                await asyncio.sleep(0)
+                assert task.cancelled()
+        asyncio.run(main())
+
+    def test_host_time_slice_seconds(self):
+        """A time slice starts when it is set, not at the start of the clock."""
+        async def main():
+            with SessionHost(statements=10000, seconds=60) as host:
+                s = await host.add_session()
+                await s.execute(b'10 for i=1 to 100: next')
+                job = asyncio.ensure_future(host.execute(s, b'run'))
+                await asyncio.sleep(0)
+                # the session did not yield after its first statement
+                assert host.get_usage(s).statements > 1
+                await job
+        asyncio.run(main())
+
+    def test_host_input(self):
+        """Sessions waiting for input sleep until keys are pressed."""
+        async def main():
+            with SessionHost() as host:
+                s = await host.add_session()
+                await s.execute(b'10 input a: print a*2')
+                job = asyncio.ensure_future(host.execute(s, b'run'))
+                await asyncio.sleep(0.1)
+                assert not job.done()
+                cpu_time = host.get_usage(s).cpu_time
+                await asyncio.sleep(0.2)
+                # no processor time used while waiting
+                assert host.get_usage(s).cpu_time == cpu_time
+                await s.press_keys(u'21\r')
+                assert await job == b'? 21\r\n 42 \r\n'
+        asyncio.run(main())
+
+    def test_host_inkey(self):
+        """INKEY$ in a hosted session."""
+        async def main():
+            with SessionHost() as host:
+                s = await host.add_session()
+                await s.execute(b'10 a$=inkey$: if a$="" then 10\n20 print a$')
+                job = asyncio.ensure_future(host.execute(s, b'run'))
+                await asyncio.sleep(0.1)
+                assert not job.done()
+                await s.press_keys(u'x')
+                assert await job == b'x\r\n'
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    run_tests()
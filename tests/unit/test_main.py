@@ -55,6 +55,15 @@ class MainTest(TestCase):
             main('-nqe', '?1')
         assert output.getvalue() == b' 1 \r\n', output.getvalue()
 
+    def test_startup_timing(self):
+        """Test startup timing report."""
+        report = io.BytesIO()
+        with stdio.redirect_output(report, 'stderr'):
+            main('-nqe', '?1', '--startup-timing')
+        report = report.getvalue()
+        for phase in (b'STARTUP TIMING', b'settings', b'session start', b'session run', b'total'):
+            assert phase in report, report
+
     # exercise interfaces
 
     def test_cli(self):
@@ -6,16 +6,31 @@ Test pickling various kinds of objects
 This file is released under the GNU GPL version 3 or later.
 """
 
+import os
+import sys
 import pickle
+import unittest
+import datetime
 from io import open
 
 from pcbasic import Session
+from pcbasic.data import read_codepage, read_fonts
 from pcbasic.basic.base.codestream import TokenisedStream
 from pcbasic.basic.base.error import Exit
+from pcbasic.basic.base.bytematrix import ByteMatrix
+from pcbasic.basic.sound import TimedQueue
+from pcbasic.basic.clock import Clock, TimeSource
 
 from tests.unit.utils import TestCase, run_tests
 
 
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _input_file(name):
+    """Test input file."""
+    return os.path.join(HERE, 'input', 'pickle', name)
+
+
 class PickleTest(TestCase):
     """Test pickling various kinds of objects."""
 
@@ -67,6 +82,152 @@ class PickleTest(TestCase):
             pass
         assert s2.get_variable('i%') == 2
 
+    def test_pickle_bytematrix(self):
+        """Pickle ByteMatrix object."""
+        bm = ByteMatrix(3, 4, 7)
+        bm[1, 2] = 9
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL+1):
+            bm2 = pickle.loads(pickle.dumps(bm, protocol))
+            assert bm2 == bm
+            assert bm2.height == 3 and bm2.width == 4
+            # rows must not share storage with the original
+            bm2[1, 2] = 1
+            assert bm[1, 2] == 9
+        assert pickle.loads(pickle.dumps(ByteMatrix())) == ByteMatrix()
+
+    def test_pickle_timedqueue(self):
+        """Pickle TimedQueue object."""
+        queue = TimedQueue(TimeSource())
+        queue.put(b'a', 100, True)
+        queue.put(b'b', 100, True)
+        queue2 = pickle.loads(pickle.dumps(queue))
+        assert len(queue2) == 2
+        assert queue2.tones_waiting() == 1
+        assert 199 < queue2.expiry() - queue2._time.monotonic() <= 200
+
+    def test_unpickle_timedqueue_datetime(self):
+        """Restore TimedQueue state with expiry times stored as datetime."""
+        then = datetime.datetime.now() - datetime.timedelta(seconds=1000)
+        queue = TimedQueue.__new__(TimedQueue)
+        queue.__setstate__({
+            'time': TimeSource(),
+            'deque': [
+                (b'a', then + datetime.timedelta(seconds=100), True),
+                (b'b', then + datetime.timedelta(seconds=200), True),
+                (b'c', None, False),
+            ],
+            'now': then,
+            'balloon_popped': False,
+        })
+        assert len(queue) == 3
+        assert queue.tones_waiting() == 1
+        assert list(queue.items())[1][1] == 100
+
+    def test_unpickle_without_time_source(self):
+        """Restore state stored before sessions had a time source."""
+        queue = TimedQueue.__new__(TimedQueue)
+        queue.__setstate__({'deque': [(b'a', 5., True)], 'now': 0., 'balloon_popped': False})
+        assert not queue._time.virtual
+        assert 4 < queue.expiry() - queue._time.monotonic() <= 5
+        clock = Clock(None, TimeSource())
+        del clock._time
+        clock = pickle.loads(pickle.dumps(clock))
+        assert not clock._time.virtual
+        assert clock.get_time_ms() >= 0
+
+    def test_suspend_resume(self):
+        """Suspend and resume a session, with and without compression."""
+        s = Session()
+        s.execute('10 print "hello"')
+        s.execute('screen 1: line (0,0)-(100,100),2,bf')
+        s.execute('dim a(100): a(50)=1.5: b$="test"')
+        for compress in (True, False):
+            s.suspend(self.output_path('session.pcb'), compress)
+            s2 = Session.resume(self.output_path('session.pcb'))
+            assert s2.get_variable('a!()')[50] == 1.5
+            assert s2.get_variable('b$') == b'test'
+            assert s2.execute('pset(10,10),3: print point(50,50); point(10,10)', as_type=bytes) == b' 2  3 \r\n'
+            assert s2.execute('list', as_type=bytes) == b'10 PRINT "hello"\r\n'
+            s2.close()
+        s.close()
+
+    def test_resume_format_2(self):
+        """Reject session files stored in the format of older versions."""
+        with self.assertRaises(ValueError) as context:
+            Session.resume(_input_file('format2.pcb'))
+        assert 'unsupported format 2' in str(context.exception)
+
+    @unittest.skipIf(sys.version_info[:2] != (3, 11), 'session file stored with Python 3.11')
+    def test_resume_format_3(self):
+        """Resume a session file stored before checkpoints and the virtual clock."""
+        s = Session.resume(_input_file('format3.pcb'))
+        assert s.get_variable('a!()')[5] == 1.5
+        assert s.execute('print point(10,10)', as_type=bytes) == b' 3 \r\n'
+        assert s.execute('list', as_type=bytes) == b'10 PRINT "hello"\r\n'
+        s.close()
+
+    def test_checkpoint(self):
+        """Save incremental checkpoints and resume from the latest one."""
+        s = Session()
+        s.execute('10 print "hello"')
+        s.execute('screen 1: dim a(100): a(50)=1.5')
+        s.checkpoint(self.output_path('checkpoint.pcb'))
+        s.execute('a(50)=2.5: pset(10,10),3')
+        s.checkpoint(self.output_path('checkpoint.pcb'))
+        s.close()
+        s2 = Session.resume(self.output_path('checkpoint.pcb'))
+        assert s2.get_variable('a!()')[50] == 2.5
+        assert s2.execute('print point(10,10)', as_type=bytes) == b' 3 \r\n'
+        assert s2.execute('list', as_type=bytes) == b'10 PRINT "hello"\r\n'
+        s2.close()
+
+    def test_checkpoint_incomplete(self):
+        """Resume from the last complete checkpoint."""
+        s = Session()
+        s.execute('a=1')
+        s.checkpoint(self.output_path('checkpoint.pcb'))
+        s.close()
+        # unfinished checkpoint record
+        with open(self.output_path('checkpoint.pcb'), 'ab') as f:
+            f.write(b'\xff\xff\0\0\0\0\0\0\0')
+        s2 = Session.resume(self.output_path('checkpoint.pcb'))
+        assert s2.get_variable('a!') == 1
+
+    def test_checkpoint_unchanged(self):
+        """Store fonts, codepage and unchanged text only once in a checkpoint file."""
+        for codepage in ('437', '936'):
+            cp = read_codepage(codepage)
+            s = Session(codepage=cp, font=read_fonts(cp, ['unifont', 'univga', 'freedos']))
+            s.execute('print "hello"')
+            s.checkpoint(self.output_path('checkpoint.pcb'))
+            s._checkpointer.wait()
+            first = os.path.getsize(self.output_path('checkpoint.pcb'))
+            s.checkpoint(self.output_path('checkpoint.pcb'))
+            s.close()
+            assert os.path.getsize(self.output_path('checkpoint.pcb')) - first < 32768
+            s2 = Session.resume(self.output_path('checkpoint.pcb'))
+            assert s2.execute('print 1+1', as_type=bytes) == b' 2 \r\n'
+            s2.close()
+
+    def test_checkpoint_running(self):
+        """Save periodic checkpoints while a program runs."""
+        s = Session()
+        s.execute('10 i%=i%+1: if i%=500 then system\n20 goto 10')
+        s.checkpoint(self.output_path('checkpoint.pcb'), interval=0.001)
+        try:
+            s.execute('run')
+        except Exit:
+            pass
+        s.close()
+        s2 = Session.resume(self.output_path('checkpoint.pcb'))
+        assert 0 < s2.get_variable('i%') <= 500
+        # resume the running program
+        try:
+            s2.interact()
+        except Exit:
+            pass
+        assert s2.get_variable('i%') == 500
+
 
 if __name__ == '__main__':
     run_tests()
@@ -0,0 +1,102 @@
+"""
+PC-BASIC tests.test_server
+Tests for serving sessions from worker processes
+
+(c) 2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+from pcbasic import Session, SessionServer
+from tests.unit.utils import TestCase, run_tests
+
+
+class SessionServerTest(TestCase):
+    """Unit tests for SessionServer."""
+
+    tag = u'server'
+
+    def test_server_session(self):
+        """Use sessions in worker processes."""
+        with SessionServer(workers=2) as server:
+            with server.open_session() as s1:
+                with server.open_session() as s2:
+                    # sessions are spread over the workers
+                    assert s1.worker != s2.worker
+                    assert s1.execute(b'a=5: print a*2') == b' 10 \r\n'
+                    assert s1.evaluate(b'a+1') == 6.
+                    assert s1.get_variable(b'a!') == 5.
+                    assert s2.get_variable(b'a!') == 0.
+                    s2.press_keys(u'x')
+                    assert s2.execute(b'print inkey$;') == b'x'
+                    assert s2.get_chars()[0][:2] == (b'x', b' ')
+                    # errors are raised in the calling process
+                    with self.assertRaises(ValueError):
+                        s1.get_variable(b'a')
+
+    def test_server_pixels(self):
+        """Retrieve pixels through the shared screen buffer."""
+        commands = b'screen 1: pset (5,3),2: line (0,0)-(10,0),3'
+        with Session(input_streams=None, output_streams=None) as s:
+            s.execute(commands)
+            pixels = s.get_pixels()
+        with SessionServer(workers=1) as server:
+            with server.open_session() as s:
+                s.execute(commands)
+                assert s.get_pixels() == pixels
+                # larger video mode
+                s.execute(b'screen 2: pset (600, 100)')
+                assert s.get_pixels()[100][600] == 1
+
+    def test_server_migrate(self):
+        """Move a session between workers."""
+        with SessionServer(workers=2) as server:
+            s = server.open_session(worker=0)
+            s.execute(b'10 a=a+1\nscreen 1: pset (5,3),2\na=41')
+            pixels = s.get_pixels()
+            s.migrate(1)
+            assert s.worker == 1
+            assert s.evaluate(b'a') == 41.
+            assert s.get_pixels() == pixels
+            s.execute(b'goto 10')
+            assert s.evaluate(b'a') == 42.
+            load = server.get_load()
+            assert (load[0].sessions, load[1].sessions) == (0, 1)
+            s.close()
+            assert server.get_load()[1].sessions == 0
+
+    def test_server_migrate_closes_old_copy(self):
+        """Close the session on the old worker once it has moved."""
+        with SessionServer(workers=2) as server:
+            s = server.open_session(worker=0)
+            s.execute(b'a=41')
+            s.migrate(1)
+            with self.assertRaises(KeyError):
+                server._workers[0].call('call', s._id, 'evaluate', (b'a',))
+
+    def test_server_migrate_failed(self):
+        """Keep the session on its worker if it can't be moved."""
+        with SessionServer(workers=2) as server:
+            s = server.open_session(worker=0)
+            s.execute(b'a=41')
+            server._workers[1].close()
+            with self.assertRaises(OSError):
+                s.migrate(1)
+            assert s.worker == 0
+            assert s.evaluate(b'a') == 41.
+            assert server.get_load()[0].sessions == 1
+
+    def test_server_load(self):
+        """Report load on workers."""
+        with SessionServer(workers=2) as server:
+            s = server.open_session(worker=1)
+            s.execute(b'for i=1 to 100: next')
+            load = server.get_load()
+            assert load[1].calls > load[0].calls
+            assert load[1].busy_time > 0
+            assert load[1].cpu_time > 0
+            # new sessions go to the least loaded worker
+            assert server.open_session().worker == 0
+
+
+if __name__ == '__main__':
+    run_tests()
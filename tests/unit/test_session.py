@@ -13,7 +13,7 @@ import io
 from io import open
 import unittest
 
-from pcbasic import Session
+from pcbasic import Session, SessionTemplate
 from tests.unit.utils import TestCase, run_tests
 
 
@@ -153,6 +153,16 @@ class SessionTest(TestCase):
         with Session() as s:
             assert s.evaluate(b'1+1') == 2
 
+    def test_session_peek(self):
+        """PEEK works on a session created without preset PEEK values."""
+        with Session() as s:
+            s.execute(b'DEF SEG=&HB800: POKE 0, 65: POKE 1, 23')
+            assert s.evaluate(b'PEEK(0)') == 65
+            assert s.evaluate(b'PEEK(1)') == 23
+        with Session(peek_values={0xb8000: 66}) as s:
+            s.execute(b'DEF SEG=&HB800')
+            assert s.evaluate(b'PEEK(0)') == 66
+
     def test_session_bind_file(self):
         """test Session.bind_file."""
         # open file object
@@ -392,6 +402,65 @@ class SessionTest(TestCase):
                 [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
             ]
 
+    def test_session_template(self):
+        """Test creating sessions from a template."""
+        with Session() as s:
+            s.execute('10 a=a+1')
+            s.execute('a=41')
+            template = SessionTemplate(s)
+        with template.new_session() as s1:
+            with template.new_session() as s2:
+                assert s1.evaluate('a') == 41
+                s1.execute('run')
+                assert s1.evaluate('a') == 1
+                s2.execute('a=a+1')
+                assert s2.evaluate('a') == 42
+                s2.execute('list')
+                output = [_row.strip() for _row in self.get_text(s2)]
+                assert b'10 A=A+1' in output
+                # immutable resources are shared, not copied
+                assert s1._impl.codepage is s2._impl.codepage
+        with template.new_session() as s3:
+            assert s3.evaluate('a') == 41
+
+    def test_session_limits(self):
+        """Test execution limits."""
+        with Session() as s:
+            s.execute('10 a=a+1:b=b+1:c=c+1: goto 10')
+            s.set_limits(statements=3)
+            assert s.info.get_limits().statements == 3
+            # break before executing the statement over the limit
+            assert s.execute('run', as_type=bytes) == b'Break in 10\xff\r\n'
+            assert (s.evaluate('a'), s.evaluate('b')) == (1, 1)
+            assert s.info.get_usage().statements == 4
+            # continue where we stopped
+            s.execute('cont')
+            assert (s.evaluate('a'), s.evaluate('b'), s.evaluate('c')) == (1, 1, 1)
+            # stop with a BASIC error instead
+            s.set_limits(wall_time=0.1, error_num=5)
+            assert s.execute('run', as_type=bytes) == b'Illegal function call in 10\xff\r\n'
+            assert s.info.get_usage().wall_time >= 0.1
+            s.set_limits(memory=2000)
+            s.execute('dim a$(100): for i=1 to 100: a$(i)=space$(100): next')
+            assert s.evaluate('i') < 100
+            # no limits
+            s.set_limits()
+            assert s.execute('for i=1 to 500: next: print i') == ' 501 \r\n'
+
+    def test_session_virtual_clock(self):
+        """Test skipping waits on a virtual clock."""
+        with Session(virtual_clock=True) as s:
+            s.execute('10 on timer(1) gosub 100: timer on: t=timer: t$=time$')
+            s.execute('20 play "t120 l4 cdefgab>c": sound 440, 36.4: sound 440, 1')
+            s.execute('30 s=timer: while timer < s+3: wend: x=timer-t: end')
+            s.execute('100 n=n+1: return')
+            s.execute('run')
+            # about 4 seconds of music, 2 of sound and 3 of waiting, as in real time
+            assert 8.5 < s.evaluate('x') < 9.5
+            # timer events were handled, though not necessarily every second
+            assert 0 < s.evaluate('n') <= 9
+            assert s.evaluate('time$') != s.evaluate('t$')
+
 
 from pcbasic.basic import iostreams
 from pcbasic.basic.codepage import Codepage
@@ -0,0 +1,288 @@
+"""
+PC-BASIC test_sound
+unit tests for sound and Music Macro Language
+
+(c) 2023 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import random
+import unittest
+import threading
+from math import ceil
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pcbasic import Session
+from pcbasic.compat import queue
+from pcbasic.basic.base import signals
+from pcbasic.basic import sound
+from pcbasic.basic.sound import MMLProgram, compile_mml, NOTES, NOTE_FREQ
+from pcbasic.interface import synthesiser
+from tests.unit.utils import TestCase, run_tests
+
+
+class Interface(object):
+    """Interface that collects the audio signals."""
+
+    def __init__(self):
+        self.queues = queue.Queue(), queue.Queue(), queue.Queue()
+
+    def get_queues(self):
+        return self.queues
+
+    def get_tones(self):
+        """Frequency and duration of the tones played, without gaps."""
+        tones = []
+        while not self.queues[2].empty():
+            signal = self.queues[2].get()
+            if signal.event_type == signals.AUDIO_TONE and signal.params[1]:
+                tones.append((signal.params[1], signal.params[2]))
+        return tones
+
+
+class MMLTest(TestCase):
+    """Unit tests for Music Macro Language."""
+
+    tag = u'sound'
+
+    def _play(self, commands):
+        """Run commands and return the tones played."""
+        iface = Interface()
+        with Session(virtual_clock=True) as s:
+            s.attach(iface)
+            s.execute(commands)
+        return iface.get_tones()
+
+    def test_compile(self):
+        """Compile a string into commands, leaving references to be resolved when played."""
+        program = MMLProgram(b'T120 l4 C#8. N=N; XA$;E', False)
+        assert program.commands == [
+            (b'T', 120), (b'L', 4), (b'C', NOTES[b'C#'], 8, 1), (b'N', b'=N;', 0),
+            (b'X', b'A$;'), (b'E', NOTES[b'E'], None, 0),
+        ]
+        assert program.complete
+        assert not any(program.joins)
+
+    def test_compile_error(self):
+        """Errors are compiled in, to be raised when reached."""
+        program = MMLProgram(b'CV5', False)
+        assert program.commands == [(b'C', NOTES[b'C'], None, 0), (b'error', 5)]
+        assert not program.complete
+        assert MMLProgram(b'CV5', True).complete
+
+    def test_compile_cached(self):
+        """Compiled strings are kept in the cache."""
+        program = compile_mml(b'CDE', False)
+        assert compile_mml(b'CDE', False) is program
+        assert compile_mml(b'CDE', True) is not program
+
+    def test_cache_eviction(self):
+        """Least recently used strings are dropped from the cache."""
+        first = compile_mml(b'O1C', False)
+        second = compile_mml(b'O2C', False)
+        for i in range(sound.MML_CACHE_SIZE - 2):
+            compile_mml(b'L%d' % (i+1,), False)
+        # use the first again, so that the second is least recently used
+        assert compile_mml(b'O1C', False) is first
+        compile_mml(b'O3C', False)
+        assert len(sound._mml_cache) == sound.MML_CACHE_SIZE
+        assert compile_mml(b'O1C', False) is first
+        assert compile_mml(b'O2C', False) is not second
+
+    def test_cache_threads(self):
+        """Sessions on several threads can share the cache."""
+        errors = []
+
+        def compile_all(offset):
+            try:
+                for i in range(2000):
+                    mml = b'L%d' % ((i + offset) % 500 + 1,)
+                    assert compile_mml(mml, False).source == mml
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=compile_all, args=(_i*7,)) for _i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        assert len(sound._mml_cache) <= sound.MML_CACHE_SIZE
+
+    def test_play(self):
+        """Play notes with the default tempo and length."""
+        tones = self._play(b'play "mb c d"')
+        assert [_freq for _freq, _ in tones] == [NOTE_FREQ[48], NOTE_FREQ[50]]
+        # octave 4, quarter notes at 120 beats per minute, music normal
+        assert tones[0][1] == 0.5 * 7 / 8
+
+    def test_play_substring(self):
+        """Insert a substring with the X command."""
+        tones = self._play(b'a$="cd": play "mb xa$;e"')
+        assert [_freq for _freq, _ in tones] == [NOTE_FREQ[48], NOTE_FREQ[50], NOTE_FREQ[52]]
+
+    def test_play_substring_splice(self):
+        """Commands run across the end of a substring."""
+        tones = self._play(b'a$="c": play "mb xa$;8"')
+        assert tones == [(NOTE_FREQ[48], 0.25 * 7 / 8)]
+
+    def test_play_variables(self):
+        """Resolve variable references when played."""
+        tones = self._play(b'n=40: m=41: l=8: play "mb l=l; n=n; n=m;"')
+        assert tones == [(NOTE_FREQ[39], 0.25 * 7 / 8), (NOTE_FREQ[40], 0.25 * 7 / 8)]
+
+    def test_play_variables_changed(self):
+        """References are resolved again when a cached string is played again."""
+        tones = self._play(b'10 for n=40 to 41: play "mb n=n;": next\nrun')
+        assert [_freq for _freq, _ in tones] == [NOTE_FREQ[39], NOTE_FREQ[40]]
+
+
+class _ReferenceSource(object):
+    """Shift register that produces one bit at a time."""
+
+    def __init__(self, feedback, init):
+        self.lfsr, self.feedback = init, feedback
+        self.phase, self.bit = 0., 0
+
+    def next(self):
+        bit = self.lfsr & 1
+        self.lfsr >>= 1
+        if bit:
+            self.lfsr ^= self.feedback
+        self.bit = bit
+        return bit
+
+
+class _ReferenceGenerator(object):
+    """Sound generator that averages each sample over its sub-samples, one by one."""
+
+    def __init__(self, source, frequency, duration, volume):
+        self._source = source
+        self._frequency = frequency
+        self._amplitude = synthesiser._AMPLITUDE[volume]
+        self._count = 0
+        self._num_samples = int(duration * synthesiser.SAMPLE_RATE)
+
+    def build_chunk(self, length):
+        resolution = synthesiser._RESOLUTION
+        if self._count >= self._num_samples:
+            return None
+        length = min(length, self._num_samples - self._count)
+        if self._frequency in (0, 32767):
+            chunk = bytearray(length)
+        else:
+            half_wavelength = synthesiser.SAMPLE_RATE / (2.*self._frequency)
+            first_length = 0
+            if self._source.phase:
+                first_length = int(half_wavelength * self._source.phase)
+                self._source.phase = 0.
+            sub_samples = bytearray([self._source.bit]) * first_length * resolution
+            stretch = int(half_wavelength * resolution)
+            for _ in range(max(0, int(ceil((length - first_length) / half_wavelength)))):
+                sub_samples += bytearray([self._source.next()]) * stretch
+            sums = [
+                sum(sub_samples[_i:_i+resolution])
+                for _i in range(0, len(sub_samples) - len(sub_samples) % resolution, resolution)
+            ]
+            chunk = bytearray(
+                synthesiser._to_sample(_sum, self._amplitude) for _sum in sums
+            )
+        if self._count + len(chunk) < self._num_samples:
+            self._count += len(chunk)
+        else:
+            rest_length = self._num_samples - self._count
+            if self._frequency in (0, 32767):
+                self._source.phase = 0.
+            else:
+                self._source.phase = float(len(chunk) - rest_length) / half_wavelength
+            chunk = chunk[:rest_length]
+            self._count = self._num_samples
+        return chunk
+
+
+class SynthesiserTest(TestCase):
+    """Unit tests for the tone and noise synthesiser."""
+
+    tag = u'sound'
+
+    # frequency, duration, volume; from low to above half the sample rate
+    tones = [
+        (440, 0.1, 15), (37, 0.2, 8), (1000, 0.05, 1), (0, 0.01, 15), (5000, 0.03, 12),
+        (12345, 0.02, 15), (30000, 0.01, 15), (110, 0.1, 15), (32767, 0.01, 15),
+    ]
+
+    def _compare(self, feedback, init, chunk_length):
+        """Generated samples are identical to the reference generator's."""
+        source = synthesiser.SignalSource(feedback, init)
+        reference_source = _ReferenceSource(feedback, init)
+        for frequency, duration, volume in self.tones:
+            generator = synthesiser.SoundGenerator(
+                source, feedback, frequency, duration, False, volume
+            )
+            reference = _ReferenceGenerator(reference_source, frequency, duration, volume)
+            while True:
+                chunk = generator.build_chunk(chunk_length)
+                assert chunk == reference.build_chunk(chunk_length), (frequency, volume)
+                if chunk is None:
+                    break
+
+    def _compare_all(self):
+        """Compare tone, periodic noise and white noise in chunks of various lengths."""
+        for feedback, init in (
+                (synthesiser.FEEDBACK_TONE, synthesiser.INIT_TONE),
+                (synthesiser.FEEDBACK_PERIODIC, synthesiser.INIT_NOISE),
+                (synthesiser.FEEDBACK_NOISE, synthesiser.INIT_NOISE),
+            ):
+            for chunk_length in (4768, 777):
+                self._compare(feedback, init, chunk_length)
+
+    def test_synthesiser(self):
+        """Samples built without NumPy match the reference generator."""
+        numpy_module, synthesiser.numpy = synthesiser.numpy, None
+        try:
+            self._compare_all()
+        finally:
+            synthesiser.numpy = numpy_module
+
+    @unittest.skipIf(numpy is None, 'NumPy not available')
+    def test_synthesiser_numpy(self):
+        """Samples built with NumPy match the reference generator."""
+        numpy_module, synthesiser.numpy = synthesiser.numpy, numpy
+        try:
+            self._compare_all()
+        finally:
+            synthesiser.numpy = numpy_module
+
+    def test_mixer(self):
+        """Mixed samples are the wrapped sums of the voices, as signed 16-bit samples."""
+        rng = random.Random(0)
+        mixer = synthesiser.Mixer(16)
+        voices = [bytearray() for _ in synthesiser.VOICES]
+        output = bytearray()
+        expected = bytearray()
+        for _ in range(50):
+            # voices get different numbers of samples, so the buffers wrap around and grow
+            for voice in synthesiser.VOICES:
+                samples = bytearray(rng.randrange(256) for _ in range(rng.randrange(40)))
+                mixer[voice].write(samples)
+                voices[voice] += samples
+            count = rng.randrange(min(len(_v) for _v in voices) + 1)
+            output += mixer.mix(count)
+            for i in range(count):
+                expected += bytearray((0, sum(_v[i] for _v in voices) & 0xff))
+            voices = [_v[count:] for _v in voices]
+        # voices that have run out are silent
+        count = max(len(_v) for _v in voices)
+        output += mixer.mix(count)
+        for i in range(count):
+            expected += bytearray((0, sum(_v[i] for _v in voices if i < len(_v)) & 0xff))
+        assert output == expected
+        assert all(len(mixer[_voice]) == 0 for _voice in synthesiser.VOICES)
+
+
+if __name__ == '__main__':
+    run_tests()